@@ -23,8 +23,10 @@ Key Components:
 """
 
 import logging
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager, suppress
 from pathlib import Path
-from typing import Sequence, Optional, TypeAlias, Any, Dict, List, Tuple
+from typing import Sequence, Optional, TypeAlias, Any, Dict, List, Tuple, Iterator, Callable
 from mcp.server import Server
 from mcp.server.session import ServerSession
 from mcp.server.sse import SseServerTransport
@@ -39,25 +41,47 @@ from mcp.types import (
 )
 Content: TypeAlias = TextContent | ImageContent | EmbeddedResource # type: ignore
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
 from enum import Enum
 import git # type: ignore
 from git.exc import GitCommandError
 from pydantic import BaseModel, Field
 import asyncio
+import base64
+import contextvars
+import codecs
+import bisect
+import ctypes
 import tempfile
 import os
 import re
+import select
 import difflib
+import functools
+import hashlib
+import itertools
 import shlex
+import signal
+import shutil
 import json
+import sqlite3
+import struct
+import mmap
+import multiprocessing
 import subprocess
+import sys
+import threading
+import time
+import warnings
 import yaml
 
 logging.basicConfig(level=logging.DEBUG)
 
 from starlette.applications import Starlette
 from starlette.routing import Route, Mount
-from starlette.responses import Response
+from starlette.responses import Response, JSONResponse
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -264,17 +288,970 @@ def prepare_aider_command(
     
     return command
 
+REPO_POOL_MAX_SIZE = int(os.getenv("MCP_DEVTOOLS_REPO_POOL_SIZE", "32"))
+REPO_POOL_IDLE_TIMEOUT = float(os.getenv("MCP_DEVTOOLS_REPO_IDLE_TIMEOUT", "300"))
+HOUSEKEEPING_INTERVAL = float(os.getenv("MCP_DEVTOOLS_HOUSEKEEPING_INTERVAL", "30"))
+
+def _repo_key(repo_path: str | Path) -> str:
+    """
+    Normalizes a repository path into the key used by the server's per-repository state.
+
+    Args:
+        repo_path: The path to the repository's working directory.
+
+    Returns:
+        The resolved absolute path as a string.
+    """
+    return str(Path(repo_path).resolve())
+
+def _git_dir_signature(repo_key: str) -> Optional[Tuple[int, int]]:
+    """
+    Returns an identity for the `.git` entry of a repository, used to detect when it is replaced.
+
+    Args:
+        repo_key: The resolved path to the repository's working directory.
+
+    Returns:
+        A (device, inode) tuple, or None if the `.git` entry cannot be stat'ed.
+    """
+    try:
+        st = os.stat(os.path.join(repo_key, ".git"))
+    except OSError:
+        return None
+    return (st.st_dev, st.st_ino)
+
+class _PooledRepo:
+    """
+    An idle `git.Repo` handle held by the `RepoPool`.
+    """
+    __slots__ = ("repo", "signature", "last_used", "trimmed")
+
+    def __init__(self, repo: git.Repo, signature: Optional[Tuple[int, int]]):
+        self.repo = repo
+        self.signature = signature
+        self.last_used = time.monotonic()
+        self.trimmed = False
+
+class RepoPool:
+    """
+    A bounded, LRU-evicted pool of `git.Repo` handles keyed by resolved repository path.
+
+    Handles are leased exclusively, so GitPython's persistent `git cat-file` helpers are
+    never shared between concurrent callers. Handles are dropped when the repository's
+    `.git` entry is replaced, and idle handles have their child processes closed.
+    """
+
+    def __init__(self, max_size: int = REPO_POOL_MAX_SIZE, idle_timeout: float = REPO_POOL_IDLE_TIMEOUT):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._idle: "OrderedDict[str, List[_PooledRepo]]" = OrderedDict()
+        self._signatures: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._leased: Dict[int, Optional[Tuple[int, int]]] = {}
+        self._idle_count = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.idle_closes = 0
+
+    def acquire(self, repo_path: str | Path) -> git.Repo:
+        """
+        Takes a handle for the repository out of the pool, opening a new one on a miss.
+
+        Args:
+            repo_path: The path to the repository's working directory.
+
+        Returns:
+            A `git.Repo` handle that must be given back with `release`.
+        """
+        key = _repo_key(repo_path)
+        signature = _git_dir_signature(key)
+        stale: List[_PooledRepo] = []
+        entry = None
+        with self._lock:
+            if key in self._signatures and self._signatures[key] != signature:
+                stale = self._idle.pop(key, [])
+                self._idle_count -= len(stale)
+                self.invalidations += 1
+            self._signatures[key] = signature
+            handles = self._idle.get(key)
+            if handles:
+                entry = handles.pop()
+                self._idle_count -= 1
+                if not handles:
+                    del self._idle[key]
+                self.hits += 1
+            else:
+                self.misses += 1
+        for pooled in stale:
+            _close_repo_quietly(pooled.repo)
+        repo = entry.repo if entry is not None else git.Repo(key)
+        with self._lock:
+            self._leased[id(repo)] = signature
+        return repo
+
+    def release(self, repo_path: str | Path, repo: git.Repo) -> None:
+        """
+        Returns a leased handle to the pool, closing it if it became stale or the pool is full.
+
+        Args:
+            repo_path: The path the handle was acquired for.
+            repo: The handle returned by `acquire`.
+        """
+        key = _repo_key(repo_path)
+        evicted: List[_PooledRepo] = []
+        with self._lock:
+            signature = self._leased.pop(id(repo), None)
+            if self._signatures.get(key) != signature:
+                evicted.append(_PooledRepo(repo, signature))
+            else:
+                self._idle.setdefault(key, []).append(_PooledRepo(repo, signature))
+                self._idle.move_to_end(key)
+                self._idle_count += 1
+                while self._idle_count > self.max_size:
+                    oldest_key, handles = next(iter(self._idle.items()))
+                    evicted.append(handles.pop(0))
+                    self._idle_count -= 1
+                    self.evictions += 1
+                    if not handles:
+                        del self._idle[oldest_key]
+        for pooled in evicted:
+            _close_repo_quietly(pooled.repo)
+
+    @contextmanager
+    def lease(self, repo_path: str | Path) -> Iterator[git.Repo]:
+        """
+        Context manager that acquires a handle and releases it afterwards.
+        If the caller fails, the handle's persistent helpers are reset before it is pooled again.
+
+        Args:
+            repo_path: The path to the repository's working directory.
+
+        Yields:
+            A `git.Repo` handle.
+        """
+        repo = self.acquire(repo_path)
+        try:
+            yield repo
+        except BaseException:
+            _close_repo_quietly(repo)
+            raise
+        finally:
+            self.release(repo_path, repo)
+
+    def close_idle(self) -> int:
+        """
+        Closes the child `git cat-file` processes of handles idle for longer than `idle_timeout`.
+        The handles themselves stay pooled and restart their helpers lazily on next use.
+
+        Returns:
+            The number of handles that were trimmed.
+        """
+        now = time.monotonic()
+        to_trim: List[_PooledRepo] = []
+        with self._lock:
+            for handles in self._idle.values():
+                for pooled in handles:
+                    if not pooled.trimmed and now - pooled.last_used >= self.idle_timeout:
+                        pooled.trimmed = True
+                        to_trim.append(pooled)
+            self.idle_closes += len(to_trim)
+        for pooled in to_trim:
+            _close_repo_quietly(pooled.repo)
+        return len(to_trim)
+
+    def clear(self) -> None:
+        """
+        Closes every idle handle and forgets all cached repository signatures.
+        """
+        with self._lock:
+            handles = [pooled for entries in self._idle.values() for pooled in entries]
+            self._idle.clear()
+            self._signatures.clear()
+            self._idle_count = 0
+        for pooled in handles:
+            _close_repo_quietly(pooled.repo)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the pool's counters.
+
+        Returns:
+            A dictionary with the pool size, hit/miss counters and eviction counters.
+        """
+        with self._lock:
+            return {
+                "idle_handles": self._idle_count,
+                "leased_handles": len(self._leased),
+                "repositories": len(self._idle),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "idle_closes": self.idle_closes,
+            }
+
+def _close_repo_quietly(repo: git.Repo) -> None:
+    """
+    Closes the persistent child processes of a `git.Repo` handle, logging any failure.
+
+    Args:
+        repo: The handle to close.
+    """
+    try:
+        repo.git.clear_cache()
+    except Exception as e:
+        logger.debug(f"Error closing git handle: {e}")
+
+repo_pool = RepoPool()
+
+BLOB_CACHE_MAX_BYTES = int(os.getenv("MCP_DEVTOOLS_BLOB_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+class _CatFileProcess:
+    """
+    A long-lived `git cat-file --batch` or `--batch-check` process for one repository.
+    """
+
+    def __init__(self, repo_key: str, mode: str):
+        self.repo_key = repo_key
+        self.mode = mode
+        self._process: Optional[subprocess.Popen] = None
+
+    def _start(self) -> subprocess.Popen:
+        if self._process is None or self._process.poll() is not None:
+            self._process = subprocess.Popen(
+                ["git", "cat-file", self.mode],
+                cwd=self.repo_key,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+        return self._process
+
+    def request(self, spec: str) -> Tuple[Optional[Tuple[str, str, int]], Optional[bytes]]:
+        """
+        Sends one object name to the process and reads its reply.
+        A process that died is restarted once.
+
+        Args:
+            spec: An object name such as a SHA or `rev:path`.
+
+        Returns:
+            A tuple of the object's (sha, type, size) header, or None if the object is missing,
+            and the object's content when running in `--batch` mode.
+        """
+        for attempt in range(2):
+            process = self._start()
+            assert process.stdin is not None and process.stdout is not None
+            try:
+                process.stdin.write(spec.encode("utf-8") + b"\n")
+                process.stdin.flush()
+                header = process.stdout.readline()
+            except (BrokenPipeError, OSError):
+                header = b""
+            if not header:
+                self.close()
+                if attempt == 0:
+                    continue
+                raise RuntimeError(f"git cat-file {self.mode} exited unexpectedly in {self.repo_key}")
+            parts = header.decode("utf-8", errors="replace").split()
+            if len(parts) != 3:
+                return None, None
+            sha, obj_type, size = parts[0], parts[1], int(parts[2])
+            content = None
+            if self.mode == "--batch":
+                content = process.stdout.read(size)
+                process.stdout.read(1)
+            return (sha, obj_type, size), content
+        return None, None
+
+    def close(self) -> None:
+        """
+        Terminates the process if it is running.
+        """
+        process, self._process = self._process, None
+        if process is None:
+            return
+        with suppress(Exception):
+            if process.stdin:
+                process.stdin.close()
+            process.terminate()
+            process.wait(timeout=5)
+
+class BlobReader:
+    """
+    Serves object reads for one repository from long-lived `git cat-file` processes:
+    `--batch-check` resolves `rev:path` to a blob SHA and `--batch` returns the content.
+    """
+
+    def __init__(self, repo_key: str):
+        self.repo_key = repo_key
+        self.signature = _git_dir_signature(repo_key)
+        self.last_used = time.monotonic()
+        self._lock = threading.Lock()
+        self._check = _CatFileProcess(repo_key, "--batch-check")
+        self._batch = _CatFileProcess(repo_key, "--batch")
+
+    def resolve(self, spec: str) -> Optional[Tuple[str, str, int]]:
+        """
+        Resolves an object name to its SHA, type and size.
+
+        Args:
+            spec: An object name such as `HEAD:README.md`.
+
+        Returns:
+            A (sha, type, size) tuple, or None if the object does not exist.
+        """
+        with self._lock:
+            self.last_used = time.monotonic()
+            header, _ = self._check.request(spec)
+            return header
+
+    def read(self, sha: str) -> bytes:
+        """
+        Reads the content of an object by SHA.
+
+        Args:
+            sha: The full object SHA.
+
+        Returns:
+            The raw object content.
+        """
+        with self._lock:
+            self.last_used = time.monotonic()
+            header, content = self._batch.request(sha)
+        if header is None or content is None:
+            raise FileNotFoundError(sha)
+        return content
+
+    def close(self) -> None:
+        """
+        Terminates both cat-file processes.
+        """
+        with self._lock:
+            self._check.close()
+            self._batch.close()
+
+class BlobStore:
+    """
+    Per-repository `BlobReader`s in front of a content-addressed LRU cache of blob contents.
+    Because blobs are keyed by SHA, the cache is shared by all repositories and revisions:
+    reading an unchanged file across many commits costs one `--batch-check` round trip.
+    """
+
+    def __init__(self, max_bytes: int = BLOB_CACHE_MAX_BYTES, idle_timeout: float = REPO_POOL_IDLE_TIMEOUT):
+        self.max_bytes = max_bytes
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._readers: Dict[str, BlobReader] = {}
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._cache_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _reader_for(self, repo_key: str) -> BlobReader:
+        stale = None
+        with self._lock:
+            reader = self._readers.get(repo_key)
+            if reader is not None and reader.signature != _git_dir_signature(repo_key):
+                stale, reader = reader, None
+            if reader is None:
+                reader = self._readers[repo_key] = BlobReader(repo_key)
+        if stale is not None:
+            stale.close()
+        return reader
+
+    def read(self, repo_path: str | Path, revision: str, file_path: str) -> bytes:
+        """
+        Reads a file's blob at a revision.
+
+        Args:
+            repo_path: The path to the repository's working directory.
+            revision: A commit-ish to read the file at; an empty string reads the staged (index) version.
+            file_path: The file path relative to the repository root.
+
+        Returns:
+            The blob's raw content.
+
+        Raises:
+            FileNotFoundError: If the path does not name a blob at that revision.
+        """
+        spec = f"{revision}:{Path(file_path).as_posix().removeprefix('./')}"
+        if "\n" in spec:
+            raise ValueError("Revision and file path must not contain newlines")
+        reader = self._reader_for(_repo_key(repo_path))
+        header = reader.resolve(spec)
+        if header is None or header[1] != "blob":
+            raise FileNotFoundError(spec)
+        sha = header[0]
+        with self._lock:
+            content = self._cache.get(sha)
+            if content is not None:
+                self._cache.move_to_end(sha)
+                self.hits += 1
+                return content
+            self.misses += 1
+        content = reader.read(sha)
+        self._store(sha, content)
+        return content
+
+    def _store(self, sha: str, content: bytes) -> None:
+        if len(content) > self.max_bytes:
+            return
+        with self._lock:
+            if sha in self._cache:
+                return
+            self._cache[sha] = content
+            self._cache_bytes += len(content)
+            while self._cache_bytes > self.max_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted)
+                self.evictions += 1
+
+    def close_idle(self) -> int:
+        """
+        Terminates the cat-file processes of repositories not read from within `idle_timeout`.
+
+        Returns:
+            The number of readers that were closed.
+        """
+        now = time.monotonic()
+        with self._lock:
+            idle = [key for key, reader in self._readers.items() if now - reader.last_used >= self.idle_timeout]
+            readers = [self._readers.pop(key) for key in idle]
+        for reader in readers:
+            reader.close()
+        return len(readers)
+
+    def clear(self) -> None:
+        """
+        Terminates every reader and empties the cache.
+        """
+        with self._lock:
+            readers = list(self._readers.values())
+            self._readers.clear()
+            self._cache.clear()
+            self._cache_bytes = 0
+        for reader in readers:
+            reader.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the store's counters.
+
+        Returns:
+            A dictionary with reader and cache counters.
+        """
+        with self._lock:
+            return {
+                "readers": len(self._readers),
+                "cached_blobs": len(self._cache),
+                "cached_bytes": self._cache_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+blob_store = BlobStore()
+
+RESULT_CACHE_MAX_BYTES = int(os.getenv("MCP_DEVTOOLS_RESULT_CACHE_BYTES", str(32 * 1024 * 1024)))
+RESULT_CACHE_DIR = os.getenv("MCP_DEVTOOLS_RESULT_CACHE_DIR") or None
+RESULT_CACHE_DISK_BYTES = int(os.getenv("MCP_DEVTOOLS_RESULT_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+_SPILL_FILE_NAME = re.compile(r"[0-9a-f]{64}\.txt")
+
+class ResultCache:
+    """
+    A byte-bounded LRU cache for tool output computed from immutable Git objects, such as
+    `git_show` of a commit or `git_diff` between two commits, keyed by resolved SHAs and options.
+
+    Entries evicted from memory are spilled to `spill_dir` when one is configured, where they are
+    kept in a second byte-bounded LRU and promoted back to memory on their next hit. Only files named
+    like spilled entries (`<sha256>.txt`) are adopted from the directory, and so only they can be
+    removed on eviction; anything else in it is left alone.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+        spill_dir: Optional[str] = RESULT_CACHE_DIR,
+        max_disk_bytes: int = RESULT_CACHE_DISK_BYTES,
+    ):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.spills = 0
+        self.disk_evictions = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            files = [
+                entry for entry in os.scandir(spill_dir)
+                if _SPILL_FILE_NAME.fullmatch(entry.name) and entry.is_file(follow_symlinks=False)
+            ]
+            for entry in sorted(files, key=lambda e: e.stat().st_mtime):
+                self._disk[entry.name[:-4]] = entry.stat().st_size
+                self._disk_bytes += entry.stat().st_size
+
+    @staticmethod
+    def _digest(key: Tuple[str, ...]) -> str:
+        return hashlib.sha256("\0".join(key).encode("utf-8")).hexdigest()
+
+    def _spill_path(self, digest: str) -> str:
+        assert self.spill_dir is not None
+        return os.path.join(self.spill_dir, f"{digest}.txt")
+
+    def get(self, key: Tuple[str, ...]) -> Optional[str]:
+        """
+        Looks up a cached result.
+
+        Args:
+            key: The cache key; it must only contain resolved SHAs and options.
+
+        Returns:
+            The cached result, or None on a miss.
+        """
+        digest = self._digest(key)
+        with self._lock:
+            value = self._memory.get(digest)
+            if value is not None:
+                self._memory.move_to_end(digest)
+                self.hits += 1
+                return value
+            on_disk = digest in self._disk
+        if on_disk:
+            try:
+                with open(self._spill_path(digest), "r", encoding="utf-8") as f:
+                    value = f.read()
+            except OSError:
+                value = None
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self.put(key, value)
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: Tuple[str, ...], value: str) -> None:
+        """
+        Stores a result, evicting (and possibly spilling) the least recently used entries.
+
+        Args:
+            key: The cache key.
+            value: The result to cache.
+        """
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        digest = self._digest(key)
+        evicted: List[Tuple[str, str]] = []
+        with self._lock:
+            if digest in self._memory:
+                self._memory.move_to_end(digest)
+                return
+            self._memory[digest] = value
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_bytes:
+                old_digest, old_value = self._memory.popitem(last=False)
+                self._memory_bytes -= len(old_value.encode("utf-8"))
+                self.evictions += 1
+                evicted.append((old_digest, old_value))
+        if self.spill_dir:
+            for old_digest, old_value in evicted:
+                self._spill(old_digest, old_value)
+
+    def _spill(self, digest: str, value: str) -> None:
+        data = value.encode("utf-8")
+        if len(data) > self.max_disk_bytes:
+            return
+        with self._lock:
+            if digest in self._disk:
+                self._disk.move_to_end(digest)
+                return
+        path = self._spill_path(digest)
+        try:
+            with tempfile.NamedTemporaryFile("wb", dir=self.spill_dir, delete=False) as f:
+                f.write(data)
+            os.replace(f.name, path)
+        except OSError as e:
+            logger.debug(f"Could not spill cached result to {path}: {e}")
+            return
+        removed: List[str] = []
+        with self._lock:
+            self._disk[digest] = len(data)
+            self._disk_bytes += len(data)
+            self.spills += 1
+            while self._disk_bytes > self.max_disk_bytes:
+                old_digest, old_size = self._disk.popitem(last=False)
+                self._disk_bytes -= old_size
+                self.disk_evictions += 1
+                removed.append(old_digest)
+        for old_digest in removed:
+            with suppress(OSError):
+                os.remove(self._spill_path(old_digest))
+
+    def clear(self) -> None:
+        """
+        Empties the in-memory cache. Spilled entries stay on disk.
+        """
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the cache's counters.
+
+        Returns:
+            A dictionary with size, hit/miss and eviction counters.
+        """
+        with self._lock:
+            return {
+                "entries": len(self._memory),
+                "bytes": self._memory_bytes,
+                "max_bytes": self.max_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "max_disk_bytes": self.max_disk_bytes if self.spill_dir else 0,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "spills": self.spills,
+                "disk_evictions": self.disk_evictions,
+            }
+
+result_cache = ResultCache()
+
+GIT_WORKERS = int(os.getenv("MCP_DEVTOOLS_GIT_WORKERS", "8"))
+_git_executor = ThreadPoolExecutor(max_workers=GIT_WORKERS, thread_name_prefix="mcp-git")
+_git_tool_stats: Dict[str, int] = {"pending": 0, "completed": 0, "failed": 0}
+
+async def _run_git_tool(repo_path: str | Path, func, *args, **kwargs) -> Any:
+    """
+    Runs a blocking GitPython tool function on the git worker thread pool with a pooled repo handle,
+    so slow Git operations don't stall the event loop serving other sessions.
+    Concurrency between tools on the same repository is coordinated by `tool_scheduler` in `call_tool`.
+
+    Args:
+        repo_path: The path to the repository's working directory.
+        func: The tool function; it receives the leased `git.Repo` as its first argument.
+        *args: Positional arguments passed to `func` after the repo.
+        **kwargs: Keyword arguments passed to `func`.
+
+    Returns:
+        The return value of `func`.
+    """
+    def invoke() -> Any:
+        with repo_pool.lease(repo_path) as repo:
+            return func(repo, *args, **kwargs)
+
+    _git_tool_stats["pending"] += 1
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(_git_executor, invoke)
+    except Exception:
+        _git_tool_stats["failed"] += 1
+        raise
+    finally:
+        _git_tool_stats["pending"] -= 1
+    _git_tool_stats["completed"] += 1
+    return result
+
+CPU_WORKERS = int(os.getenv("MCP_DEVTOOLS_CPU_WORKERS", str(min(os.cpu_count() or 1, 8))))
+CPU_OFFLOAD_MIN_BYTES = int(os.getenv("MCP_DEVTOOLS_CPU_OFFLOAD_BYTES", str(256 * 1024)))
+CPU_TASK_TIMEOUT = float(os.getenv("MCP_DEVTOOLS_CPU_TASK_TIMEOUT", "30"))
+
+_cpu_task_started: Any = None
+
+def _init_cpu_worker(starts: Any) -> None:
+    """
+    Initializes a `CpuPool` worker process with the pipe it reports task starts to.
+    """
+    global _cpu_task_started
+    _cpu_task_started = starts
+
+def _timed_call(task_id: int, func, args: Tuple[Any, ...]) -> Tuple[Any, float, float]:
+    """
+    Runs a function in a `CpuPool` worker and measures it. The start is reported to the pool with
+    the worker's PID, so the task's time limit starts now and only this worker is killed on timeout.
+
+    Args:
+        task_id: The pool's ID of the task.
+        func: The function.
+        args: Its positional arguments.
+
+    Returns:
+        The function's result, the wall-clock time it started at, and the seconds it took.
+    """
+    started = time.time()
+    if _cpu_task_started is not None:
+        # A message this small is written to the pipe atomically, so workers need no lock; the pool
+        # stops reading once it retired this worker's executor
+        with suppress(OSError):
+            _cpu_task_started.send((task_id, os.getpid(), started))
+    began = time.perf_counter()
+    result = func(*args)
+    return result, started, time.perf_counter() - began
+
+class CpuPool:
+    """
+    A shared process pool for CPU-heavy tool internals (diffing, regex replacement), so large inputs
+    don't block the event loop serving every SSE session. Inputs smaller than `min_bytes` run inline,
+    where a round trip to a worker would cost more than the work itself. Workers are started with
+    `forkserver` where available, since forking a threaded server is unsafe.
+
+    A task's time limit starts when a worker picks it up, so time spent queued behind other tasks
+    doesn't count. A task that exceeds it raises `TimeoutError` and its worker process is killed.
+    Killing a worker breaks its executor, so the pool moves on to a new one, and the other tasks of
+    the broken executor, queued or running, are submitted again there: they are pure functions.
+    """
+
+    def __init__(self, max_workers: int = CPU_WORKERS, min_bytes: int = CPU_OFFLOAD_MIN_BYTES, timeout: float = CPU_TASK_TIMEOUT):
+        self.max_workers = max(max_workers, 1)
+        self.min_bytes = min_bytes
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._starts_writer: Any = None
+        self._lock = threading.Lock()
+        self._task_ids = itertools.count()
+        # Task ID -> (worker PID, start time), and the event that wakes the waiting caller
+        self._started: Dict[int, Tuple[int, float]] = {}
+        self._waiters: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = {}
+        self.inline = 0
+        self.offloaded = 0
+        self.pending = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.restarts = 0
+        self.resubmitted = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.total_compute_seconds = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            context = multiprocessing.get_context(method)
+            # One pipe per executor, read by its own thread until `_stop_listener` sends None
+            reader, self._starts_writer = context.Pipe(duplex=False)
+            threading.Thread(target=self._listen, args=(reader,), name="cpu-pool-starts", daemon=True).start()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=context,
+                initializer=_init_cpu_worker, initargs=(self._starts_writer,),
+            )
+        return self._executor
+
+    def _listen(self, reader: Any) -> None:
+        try:
+            while True:
+                item = reader.recv()
+                if item is None:
+                    return
+                self._record_start(*item)
+        except (OSError, EOFError):
+            return
+        finally:
+            reader.close()
+
+    def _stop_listener(self) -> None:
+        if self._starts_writer is not None:
+            with suppress(OSError):
+                self._starts_writer.send(None)
+            self._starts_writer.close()
+            self._starts_writer = None
+
+    def _record_start(self, task_id: int, pid: int, started: float) -> None:
+        with self._lock:
+            waiter = self._waiters.get(task_id)
+            if waiter is not None:
+                self._started[task_id] = (pid, started)
+        if waiter is not None:
+            loop, event = waiter
+            with suppress(RuntimeError):
+                loop.call_soon_threadsafe(event.set)
+
+    async def run(self, func, *args, size: Optional[int] = None, timeout: Optional[float] = None) -> Any:
+        """
+        Runs a function, in a worker process unless its input is small.
+
+        Args:
+            func: A picklable (module-level) function without side effects; it may be run again if
+                another task's timeout breaks the executor it was submitted to.
+            *args: Its picklable positional arguments.
+            size: Optional. The size of the input in bytes or characters; below `min_bytes` the function
+                runs inline. If None, the function is always offloaded.
+            timeout: Optional. Seconds the task may run once a worker started it (default `self.timeout`;
+                0 disables it).
+
+        Returns:
+            The function's result.
+
+        Raises:
+            TimeoutError: If the task exceeded its time limit.
+        """
+        if size is not None and size < self.min_bytes:
+            self.inline += 1
+            return func(*args)
+        limit = self.timeout if timeout is None else timeout
+        submitted = time.time()
+        self.offloaded += 1
+        self.pending += 1
+        try:
+            for attempt in range(3):
+                try:
+                    result, started, compute = await self._run_once(func, args, limit)
+                    break
+                except BrokenProcessPool:
+                    # Another task's worker was killed; run this one again on a fresh executor
+                    if attempt == 2:
+                        raise
+                    self.resubmitted += 1
+        except BaseException as e:
+            if not isinstance(e, (asyncio.CancelledError, TimeoutError)):
+                self.errors += 1
+            raise
+        finally:
+            self.pending -= 1
+        wait = max(started - submitted, 0.0)
+        self.total_wait_seconds += wait
+        self.max_wait_seconds = max(self.max_wait_seconds, wait)
+        self.total_compute_seconds += compute
+        return result
+
+    async def _run_once(self, func, args: Tuple[Any, ...], limit: float) -> Tuple[Any, float, float]:
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        task_id = next(self._task_ids)
+        started_event = asyncio.Event()
+        with self._lock:
+            self._waiters[task_id] = (loop, started_event)
+        try:
+            future = loop.run_in_executor(executor, _timed_call, task_id, func, args)
+            # A future abandoned on timeout fails once its worker is killed; don't log that
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            if limit:
+                starter: "asyncio.Future[Any]" = asyncio.ensure_future(started_event.wait())
+                try:
+                    await asyncio.wait([future, starter], return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    starter.cancel()
+                with self._lock:
+                    start = self._started.get(task_id)
+                if not future.done() and start is not None:
+                    pid, started = start
+                    remaining = max(limit - (time.time() - started), 0.0)
+                    try:
+                        return await asyncio.wait_for(asyncio.shield(future), remaining)
+                    except asyncio.TimeoutError:
+                        if future.done():
+                            return future.result()
+                        self.timeouts += 1
+                        self._kill(executor, pid)
+                        raise TimeoutError(f"{getattr(func, '__name__', func)} did not finish within {limit} seconds")
+            return await future
+        finally:
+            with self._lock:
+                self._waiters.pop(task_id, None)
+                self._started.pop(task_id, None)
+
+    def _retire(self, executor: ProcessPoolExecutor) -> None:
+        """
+        Stops submitting to an executor without cancelling the futures submitted to it.
+        """
+        if executor is self._executor:
+            self._executor = None
+            self.restarts += 1
+            self._stop_listener()
+        executor.shutdown(wait=False)
+
+    def _kill(self, executor: ProcessPoolExecutor, pid: int) -> None:
+        """
+        Kills the worker running a timed-out task and retires its executor.
+        """
+        self._retire(executor)
+        with suppress(OSError):
+            os.kill(pid, signal.SIGKILL)
+
+    def shutdown(self) -> None:
+        """
+        Stops the worker processes.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._stop_listener()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the pool's counters, for the /stats endpoint.
+        """
+        return {
+            "max_workers": self.max_workers,
+            "min_bytes": self.min_bytes,
+            "inline": self.inline,
+            "offloaded": self.offloaded,
+            "pending": self.pending,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "restarts": self.restarts,
+            "resubmitted": self.resubmitted,
+            "total_wait_seconds": round(self.total_wait_seconds, 6),
+            "max_wait_seconds": round(self.max_wait_seconds, 6),
+            "total_compute_seconds": round(self.total_compute_seconds, 6),
+        }
+
+cpu_pool = CpuPool()
+
 class GitStatus(BaseModel):
     """
     Represents the input schema for the `git_status` tool.
     """
     repo_path: str = Field(description="The absolute path to the Git repository's working directory.")
 
+class DiffMode(str, Enum):
+    """
+    An enumeration of the output modes of the diff tools.
+    """
+    PATCH = "patch"
+    STAT = "stat"
+    NAME_ONLY = "name-only"
+
+DIFF_PAGE_MAX_FILES = 100
+
 class GitDiffAll(BaseModel):
     """
     Represents the input schema for the `git_diff_all` tool.
     """
     repo_path: str = Field(description="The absolute path to the Git repository's working directory.")
+    paths: Optional[List[str]] = Field(
+        None,
+        description="Optional. Only show changes to these paths (files, directories or git pathspecs, relative to the repository root)."
+    )
+    mode: DiffMode = Field(
+        DiffMode.PATCH,
+        description="Optional. 'patch' for the full diff (default), 'stat' for a `--stat` summary, or 'name-only' for just the changed file names."
+    )
+    cursor: Optional[str] = Field(
+        None,
+        description="Optional. The 'Next cursor' value returned by a previous call, to fetch the following page of files."
+    )
+    max_files: int = Field(
+        DIFF_PAGE_MAX_FILES,
+        description=f"Optional. The maximum number of files per page. Defaults to {DIFF_PAGE_MAX_FILES}."
+    )
 
 class GitDiff(BaseModel):
     """
@@ -282,6 +1259,22 @@ class GitDiff(BaseModel):
     """
     repo_path: str = Field(description="The absolute path to the Git repository's working directory.")
     target: str = Field(description="The target (e.g., branch name, commit hash, tag) to diff against. For example, 'main', 'HEAD~1', or a full commit SHA.")
+    paths: Optional[List[str]] = Field(
+        None,
+        description="Optional. Only show changes to these paths (files, directories or git pathspecs, relative to the repository root)."
+    )
+    mode: DiffMode = Field(
+        DiffMode.PATCH,
+        description="Optional. 'patch' for the full diff (default), 'stat' for a `--stat` summary, or 'name-only' for just the changed file names."
+    )
+    cursor: Optional[str] = Field(
+        None,
+        description="Optional. The 'Next cursor' value returned by a previous call, to fetch the following page of files."
+    )
+    max_files: int = Field(
+        DIFF_PAGE_MAX_FILES,
+        description=f"Optional. The maximum number of files per page. Defaults to {DIFF_PAGE_MAX_FILES}."
+    )
 
 class GitCommit(BaseModel):
     """
@@ -306,6 +1299,22 @@ class GitLog(BaseModel):
     """
     repo_path: str = Field(description="The absolute path to the Git repository's working directory.")
     max_count: int = Field(10, description="The maximum number of commit entries to retrieve. Defaults to 10.")
+    cursor: Optional[str] = Field(
+        None,
+        description="Optional. The 'Next cursor' value returned by a previous `git_log` call, to fetch the following page of history."
+    )
+    path: Optional[str] = Field(
+        None,
+        description="Optional. Only show commits that touch this path (file or directory, relative to the repository root)."
+    )
+    author: Optional[str] = Field(
+        None,
+        description="Optional. Only show commits whose author name or email contains this string (case-sensitive)."
+    )
+    since: Optional[str] = Field(
+        None,
+        description="Optional. Only show commits more recent than this date, in any format accepted by `git log --since` (e.g., '2024-01-01', '2 weeks ago')."
+    )
 
 class GitCreateBranch(BaseModel):
     """
@@ -331,6 +1340,22 @@ class GitShow(BaseModel):
     """
     repo_path: str = Field(description="The absolute path to the Git repository's working directory.")
     revision: str = Field(description="The commit hash or reference (e.g., 'HEAD', 'main', 'abc1234') to show details for.")
+    paths: Optional[List[str]] = Field(
+        None,
+        description="Optional. Only show changes to these paths (files, directories or git pathspecs, relative to the repository root)."
+    )
+    stat_only: bool = Field(
+        False,
+        description="Optional. If true, show a `--stat` summary of the changed files instead of the full patch. Defaults to false."
+    )
+    max_file_bytes: Optional[int] = Field(
+        None,
+        description="Optional. The maximum bytes of patch shown per file; the rest of the file's patch is replaced by a truncation marker."
+    )
+    max_total_bytes: Optional[int] = Field(
+        None,
+        description="Optional. The maximum bytes of diff shown in total; later files are replaced by a truncation marker."
+    )
 
 class GitApplyDiff(BaseModel):
     """
@@ -338,6 +1363,10 @@ class GitApplyDiff(BaseModel):
     """
     repo_path: str = Field(description="The absolute path to the Git repository's working directory.")
     diff_content: str = Field(description="The diff content string to apply to the repository. This should be in a unified diff format.")
+    dry_run: bool = Field(
+        False,
+        description="Optional. If true, only check that the diff applies cleanly and summarize the changes per file, without modifying any files. Defaults to false."
+    )
 
 class GitReadFile(BaseModel):
     """
@@ -345,6 +1374,10 @@ class GitReadFile(BaseModel):
     """
     repo_path: str = Field(description="The absolute path to the Git repository's working directory.")
     file_path: str = Field(description="The path to the file to read, relative to the repository's working directory.")
+    revision: Optional[str] = Field(
+        None,
+        description="Optional. A commit hash or reference (e.g., 'HEAD', 'main', 'HEAD~3') to read the file at. If not provided, the file is read from the working directory."
+    )
 
 class SearchAndReplace(BaseModel):
     """
@@ -364,13 +1397,119 @@ class SearchAndReplace(BaseModel):
         description="Optional. The 1-based ending line number for the search and replace operation (inclusive). If not provided, search continues to the end of the file."
     )
 
+class FileEdit(BaseModel):
+    """
+    Represents one edit of the `multi_edit` tool.
+    """
+    search_string: str = Field(description="The string or regex pattern to search for.")
+    replace_string: str = Field(description="The string to replace all matches of the search string with.")
+    ignore_case: bool = Field(False, description="If true, the search will be case-insensitive. Defaults to false.")
+    use_regex: Optional[bool] = Field(
+        None,
+        description="Optional. If true, the search string is always a regex; if false, it is always matched literally. If not provided, it is matched literally when it occurs within the line range, and as a regex otherwise."
+    )
+    start_line: Optional[int] = Field(
+        None,
+        description="Optional. The 1-based starting line number for this edit (inclusive), counted in the file as left by the previous edits."
+    )
+    end_line: Optional[int] = Field(
+        None,
+        description="Optional. The 1-based ending line number for this edit (inclusive), counted in the file as left by the previous edits."
+    )
+
+class MultiEdit(BaseModel):
+    """
+    Represents the input schema for the `multi_edit` tool.
+    """
+    repo_path: str = Field(description="The absolute path to the Git repository's working directory.")
+    file_path: str = Field(description="The path to the file to modify, relative to the repository's working directory.")
+    edits: List[FileEdit] = Field(description="The edits to apply, in order. Each edit sees the result of the previous ones.")
+
+class SearchAndReplaceFiles(BaseModel):
+    """
+    Represents the input schema for the `search_and_replace_files` tool.
+    """
+    repo_path: str = Field(description="The absolute path to the Git repository's working directory.")
+    search_string: str = Field(description="The string or regex pattern to search for.")
+    replace_string: str = Field(description="The string to replace all matches of the search string with.")
+    paths: Optional[List[str]] = Field(
+        None,
+        description="Optional. Only modify tracked files matching these paths (files, directories, globs such as '*.py', or git pathspecs, relative to the repository root). If not provided, all tracked files are searched."
+    )
+    ignore_case: bool = Field(False, description="If true, the search will be case-insensitive. Defaults to false.")
+    use_regex: Optional[bool] = Field(
+        None,
+        description="Optional. If true, the search string is always a regex; if false, it is always matched literally. If not provided, it is matched literally when it occurs in any of the files, and as a regex otherwise."
+    )
+    max_diff_bytes: Optional[int] = Field(
+        None,
+        description="Optional. The maximum bytes of the aggregated diff returned (default 65536). Per-file change counts are always returned in full."
+    )
+
+class WriteMode(str, Enum):
+    """
+    How `write_to_file` applies its content.
+    """
+    OVERWRITE = "overwrite"
+    REPLACE_LINES = "replace_lines"
+    REPLACE_BYTES = "replace_bytes"
+    APPEND = "append"
+
 class WriteToFile(BaseModel):
     """
     Represents the input schema for the `write_to_file` tool.
     """
     repo_path: str = Field(description="The absolute path to the Git repository's working directory.")
     file_path: str = Field(description="The path to the file to write to, relative to the repository's working directory. The file will be created if it doesn't exist, or overwritten if it does.")
-    content: str = Field(description="The string content to write to the specified file.")
+    content: str = Field(description="The string content to write to the specified file, or the replacement text / chunk for the other modes.")
+    mode: WriteMode = Field(
+        WriteMode.OVERWRITE,
+        description="Optional. 'overwrite' (default) replaces the whole file. 'replace_lines' replaces lines start_line..end_line with the content. 'replace_bytes' replaces bytes start_byte..end_byte with the content. 'append' appends the content to the file (creating it if needed), for uploading large new files in chunks."
+    )
+    start_line: Optional[int] = Field(
+        None,
+        description="For 'replace_lines': the 1-based first line to replace. Use the line count + 1 to insert at the end of the file."
+    )
+    end_line: Optional[int] = Field(
+        None,
+        description="For 'replace_lines': the 1-based last line to replace (inclusive). Defaults to start_line; use start_line - 1 to insert before start_line without replacing anything."
+    )
+    start_byte: Optional[int] = Field(
+        None,
+        description="For 'replace_bytes': the 0-based offset of the first byte to replace."
+    )
+    end_byte: Optional[int] = Field(
+        None,
+        description="For 'replace_bytes': the 0-based offset just past the last byte to replace (exclusive). Defaults to start_byte, which inserts without replacing anything."
+    )
+
+class FileWrite(BaseModel):
+    """
+    Represents one file of the `write_files` tool.
+    """
+    file_path: str = Field(description="The path to the file to write to, relative to the repository's working directory. The file will be created if it doesn't exist, or overwritten if it does.")
+    content: str = Field(description="The full content of the file.")
+
+class WriteFiles(BaseModel):
+    """
+    Represents the input schema for the `write_files` tool.
+    """
+    repo_path: str = Field(description="The absolute path to the Git repository's working directory.")
+    files: List[FileWrite] = Field(description="The files to write. Each path may appear only once.")
+
+class GetValidationResults(BaseModel):
+    """
+    Represents the input schema for the `get_validation_results` tool.
+    """
+    repo_path: str = Field(description="The absolute path to the Git repository's working directory.")
+    wait: bool = Field(
+        True,
+        description="If true, wait for validation of recent edits to finish before returning. Defaults to true."
+    )
+    timeout: float = Field(
+        30.0,
+        description="The maximum number of seconds to wait for pending validation. Defaults to 30."
+    )
 
 class ExecuteCommand(BaseModel):
     """
@@ -437,248 +1576,2511 @@ class GitTools(str, Enum):
     APPLY_DIFF = "git_apply_diff"
     READ_FILE = "git_read_file"
     SEARCH_AND_REPLACE = "search_and_replace"
+    MULTI_EDIT = "multi_edit"
+    SEARCH_AND_REPLACE_FILES = "search_and_replace_files"
     WRITE_TO_FILE = "write_to_file"
+    WRITE_FILES = "write_files"
+    GET_VALIDATION_RESULTS = "get_validation_results"
     EXECUTE_COMMAND = "execute_command"
     AI_EDIT = "ai_edit"
     AIDER_STATUS = "aider_status"
 
-def git_status(repo: git.Repo) -> str:
+class ToolAccess(str, Enum):
     """
-    Gets the status of the Git working tree.
-
-    Args:
-        repo: The Git repository object.
-
-    Returns:
-        A string representing the output of `git status`.
+    How a tool accesses the repository's working tree, used to schedule concurrent calls.
     """
-    return repo.git.status()
-
-def git_diff_all(repo: git.Repo) -> str:
+    READ = "read"
+    WRITE = "write"
+    UNLOCKED = "unlocked"
+
+# Whether `execute_command` and `ai_edit` take the repository's write lock ("write") or run
+# without it ("off"), so that long builds and Aider sessions don't block the read tools.
+COMMAND_LOCK = os.getenv("MCP_DEVTOOLS_COMMAND_LOCK", "off").lower()
+_COMMAND_ACCESS = ToolAccess.WRITE if COMMAND_LOCK == "write" else ToolAccess.UNLOCKED
+
+TOOL_ACCESS: Dict[GitTools, ToolAccess] = {
+    GitTools.STATUS: ToolAccess.READ,
+    GitTools.DIFF_ALL: ToolAccess.READ,
+    GitTools.DIFF: ToolAccess.READ,
+    GitTools.STAGE_AND_COMMIT: ToolAccess.WRITE,
+    GitTools.RESET: ToolAccess.WRITE,
+    GitTools.LOG: ToolAccess.READ,
+    GitTools.CREATE_BRANCH: ToolAccess.WRITE,
+    GitTools.CHECKOUT: ToolAccess.WRITE,
+    GitTools.SHOW: ToolAccess.READ,
+    GitTools.APPLY_DIFF: ToolAccess.WRITE,
+    GitTools.READ_FILE: ToolAccess.READ,
+    GitTools.SEARCH_AND_REPLACE: ToolAccess.WRITE,
+    GitTools.MULTI_EDIT: ToolAccess.WRITE,
+    GitTools.SEARCH_AND_REPLACE_FILES: ToolAccess.WRITE,
+    GitTools.WRITE_TO_FILE: ToolAccess.WRITE,
+    GitTools.WRITE_FILES: ToolAccess.WRITE,
+    GitTools.GET_VALIDATION_RESULTS: ToolAccess.READ,
+    # Arbitrary commands may modify the working tree; see COMMAND_LOCK.
+    GitTools.EXECUTE_COMMAND: _COMMAND_ACCESS,
+    GitTools.AI_EDIT: _COMMAND_ACCESS,
+    GitTools.AIDER_STATUS: ToolAccess.READ,
+}
+
+class _RepoRWLock:
+    """
+    A FIFO reader/writer lock for one repository.
+    Consecutive readers share the lock; writers get exclusive access and are not starved by later readers.
     """
-    Shows all changes in the working directory (staged and unstaged, compared to HEAD).
 
-    Args:
-        repo: The Git repository object.
+    def __init__(self) -> None:
+        self._readers = 0
+        self._writer = False
+        self._waiters: "deque[Tuple[ToolAccess, asyncio.Future[None]]]" = deque()
+        self.acquisitions = 0
+        self.contended = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _can_grant(self, access: ToolAccess) -> bool:
+        if access == ToolAccess.WRITE:
+            return not self._writer and self._readers == 0
+        return not self._writer
+
+    def _grant(self, access: ToolAccess) -> None:
+        if access == ToolAccess.WRITE:
+            self._writer = True
+        else:
+            self._readers += 1
+
+    async def acquire(self, access: ToolAccess) -> None:
+        """
+        Waits until the lock can be held with the given access.
+
+        Args:
+            access: Whether the caller reads or writes the working tree.
+        """
+        self.acquisitions += 1
+        if not self._waiters and self._can_grant(access):
+            self._grant(access)
+            return
+        self.contended += 1
+        started = time.monotonic()
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiters.append((access, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The lock was granted just before cancellation; hand it back.
+                self.release(access)
+            else:
+                with suppress(ValueError):
+                    self._waiters.remove((access, future))
+                self._wake()
+            raise
+        finally:
+            waited = time.monotonic() - started
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    def release(self, access: ToolAccess) -> None:
+        """
+        Releases the lock and wakes the next waiters in FIFO order.
+
+        Args:
+            access: The access the lock was acquired with.
+        """
+        if access == ToolAccess.WRITE:
+            self._writer = False
+        else:
+            self._readers -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters:
+            access, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if not self._can_grant(access):
+                break
+            self._waiters.popleft()
+            self._grant(access)
+            future.set_result(None)
+            if access == ToolAccess.WRITE:
+                break
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the lock's contention counters.
+
+        Returns:
+            A dictionary with the queue depth, active holders and wait times.
+        """
+        return {
+            "queue_depth": sum(1 for _, future in self._waiters if not future.done()),
+            "active_readers": self._readers,
+            "writer_active": self._writer,
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "total_wait_seconds": round(self.total_wait, 6),
+            "max_wait_seconds": round(self.max_wait, 6),
+        }
 
-    Returns:
-        A string representing the output of `git diff HEAD`.
+class _ToolLease:
     """
-    return repo.git.diff("HEAD")
-
-def git_diff(repo: git.Repo, target: str) -> str:
+    A tool call's hold on its repository's lock, released when the call ends or, for tools whose
+    last steps don't touch the working tree, earlier through `release`. `UNLOCKED` calls hold no lock.
     """
-    Shows differences between branches or commits.
 
-    Args:
-        repo: The Git repository object.
-        target: The target (branch, commit hash, etc.) to diff against.
+    def __init__(self, lock: Optional[_RepoRWLock], access: ToolAccess):
+        self._lock = lock
+        self.access = access
+        self.released = False
 
-    Returns:
-        A string representing the output of `git diff <target>`.
-    """
-    return repo.git.diff(target)
+    def release(self) -> None:
+        """
+        Releases the lock, letting queued tools run; later calls do nothing.
+        """
+        if not self.released:
+            self.released = True
+            if self._lock is not None:
+                self._lock.release(self.access)
 
-def git_stage_and_commit(repo: git.Repo, message: str, files: Optional[List[str]] = None) -> str:
+# The lease of the tool call running in the current task, for `_writes_finished`
+_current_lease: contextvars.ContextVar[Optional[_ToolLease]] = contextvars.ContextVar("_current_lease", default=None)
+
+class ToolScheduler:
+    """
+    Coordinates tool calls per repository: reader tools on the same repository run in parallel,
+    writer tools run alone.
     """
-    Stages changes and commits them to the repository.
 
-    Args:
-        repo: The Git repository object.
-        message: The commit message.
-        files: An optional list of specific files to stage. If None, all changes are staged.
+    def __init__(self) -> None:
+        self._locks: Dict[str, _RepoRWLock] = {}
+
+    @asynccontextmanager
+    async def access(self, repo_path: str | Path, tool_name: str):
+        """
+        Holds the repository's lock for the duration of a tool call, unless the call releases it
+        earlier.
+
+        Args:
+            repo_path: The path to the repository's working directory.
+            tool_name: The name of the tool being called (a `GitTools` value).
+
+        Yields:
+            The `_ToolLease` of the call.
+        """
+        access = TOOL_ACCESS[GitTools(tool_name)]
+        lock: Optional[_RepoRWLock] = None
+        if access != ToolAccess.UNLOCKED:
+            lock = self._locks.setdefault(_repo_key(repo_path), _RepoRWLock())
+            await lock.acquire(access)
+        lease = _ToolLease(lock, access)
+        token = _current_lease.set(lease)
+        try:
+            yield lease
+        finally:
+            _current_lease.reset(token)
+            lease.release()
 
-    Returns:
-        A string indicating the success of the staging and commit operation.
-    """
-    if files:
-        repo.index.add(files)
-        staged_message = f"Files {', '.join(files)} staged successfully."
-    else:
-        repo.git.add(A=True)
-        staged_message = "All changes staged successfully."
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the contention counters of every repository seen so far.
 
-    commit = repo.index.commit(message)
-    return f"{staged_message}\nChanges committed successfully with hash {commit.hexsha}"
+        Returns:
+            A dictionary mapping repository paths to their lock counters.
+        """
+        return {key: lock.stats() for key, lock in self._locks.items()}
 
-def git_reset(repo: git.Repo) -> str:
+tool_scheduler = ToolScheduler()
+
+WORKTREE_WATCHER = os.getenv("MCP_DEVTOOLS_WATCHER", "off").lower()
+WATCH_POLL_INTERVAL = float(os.getenv("MCP_DEVTOOLS_WATCH_POLL_INTERVAL", "2"))
+WATCH_DEBOUNCE = float(os.getenv("MCP_DEVTOOLS_WATCH_DEBOUNCE", "0.05"))
+WATCH_MAX_DIRTY_PATHS = int(os.getenv("MCP_DEVTOOLS_WATCH_MAX_DIRTY_PATHS", "10000"))
+
+def _git_check_ignore(repo_key: str, paths: List[str]) -> set[str]:
     """
-    Unstages all staged changes in the repository.
+    Returns the subset of paths that `.gitignore` rules exclude (tracked files are never excluded).
 
     Args:
-        repo: The Git repository object.
+        repo_key: The resolved path to the repository's working directory.
+        paths: Paths relative to the repository root; directories should end with '/'.
 
     Returns:
-        A string indicating that all staged changes have been reset.
+        The ignored paths, as given.
     """
-    repo.index.reset()
-    return "All staged changes reset"
+    if not paths:
+        return set()
+    result = subprocess.run(
+        ["git", "check-ignore", "-z", "--stdin"],
+        cwd=repo_key,
+        input=b"".join(p.encode("utf-8", "surrogateescape") + b"\0" for p in paths),
+        capture_output=True,
+    )
+    if result.returncode not in (0, 1):
+        return set()
+    return {p.decode("utf-8", "surrogateescape") for p in result.stdout.split(b"\0") if p}
 
-def git_log(repo: git.Repo, max_count: int = 10) -> list[str]:
+class _Inotify:
     """
-    Shows the commit logs for the repository.
+    A minimal ctypes binding to the Linux inotify API.
+    """
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_DONT_FOLLOW = 0x02000000
+    IN_EXCL_UNLINK = 0x04000000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    WATCH_MASK = (
+        IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+        | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK
+    )
+    _EVENT = struct.Struct("iIII")
+    _libc: Any = None
+
+    @classmethod
+    def available(cls) -> bool:
+        if not sys.platform.startswith("linux"):
+            return False
+        if cls._libc is None:
+            try:
+                libc = ctypes.CDLL(None, use_errno=True)
+                libc.inotify_init1, libc.inotify_add_watch, libc.inotify_rm_watch
+            except (OSError, AttributeError):
+                return False
+            cls._libc = libc
+        return True
+
+    def __init__(self) -> None:
+        if not self.available():
+            raise OSError("inotify is not available on this platform")
+        self.fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path: str) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), self.WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def read_events(self) -> List[Tuple[int, int, str]]:
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + self._EVENT.size <= len(data):
+            wd, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self) -> None:
+        with suppress(OSError):
+            os.close(self.fd)
+
+class WorktreeWatcher:
+    """
+    Tracks changes to a repository's working tree, outside `.git` and `.gitignore`d paths.
+
+    Each burst of changes (events within `WATCH_DEBOUNCE` seconds of each other, or one polling
+    pass) bumps `generation` once and records the changed paths, so callers can ask which paths
+    changed since a generation they saw. A directory path stands for everything under it. When
+    tracking is lost (inotify queue overflow, a `.gitignore` change, too many dirty paths),
+    `changed_since` returns None for earlier generations.
+
+    The watcher uses inotify on Linux and falls back to polling `git ls-files` otherwise, or
+    when inotify watches run out.
+    """
+
+    _ids = iter(range(1, sys.maxsize))
+
+    def __init__(self, repo_key: str, mode: str = "auto"):
+        self.repo_key = repo_key
+        self.id = next(self._ids)
+        self.mode = "inotify" if mode in ("auto", "inotify") and _Inotify.available() else "poll"
+        self.generation = 0
+        self.last_used = time.monotonic()
+        self.ready = threading.Event()
+        self._lock = threading.Lock()
+        self._changed: Dict[str, int] = {}
+        self._lost_generation = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"mcp-watch-{self.id}", daemon=True)
+        self._thread.start()
+
+    def changed_since(self, generation: int) -> Optional[set[str]]:
+        """
+        Returns the paths changed after a generation.
+
+        Args:
+            generation: A generation previously read from `generation`.
+
+        Returns:
+            The changed paths relative to the repository root, or None if they are unknown.
+        """
+        self.last_used = time.monotonic()
+        with self._lock:
+            if generation < self._lost_generation:
+                return None
+            return {path for path, changed_at in self._changed.items() if changed_at > generation}
+
+    def _record(self, paths: set[str], lost: bool = False, check_ignore: bool = True) -> None:
+        if not lost and any(os.path.basename(p.rstrip("/")) == ".gitignore" for p in paths):
+            lost = True
+        if not lost and check_ignore:
+            ignored = _git_check_ignore(self.repo_key, sorted(paths))
+            paths = {p.rstrip("/") for p in paths - ignored}
+            if not paths:
+                return
+        with self._lock:
+            self.generation += 1
+            if lost or len(self._changed) + len(paths) > WATCH_MAX_DIRTY_PATHS:
+                self._changed.clear()
+                self._lost_generation = self.generation
+            else:
+                for path in paths:
+                    self._changed[path] = self.generation
+
+    def _run(self) -> None:
+        try:
+            if self.mode == "inotify":
+                try:
+                    self._run_inotify()
+                    return
+                except OSError as e:
+                    logger.info(f"inotify unavailable for {self.repo_key} ({e}); polling instead")
+                    self.mode = "poll"
+            self._run_poll()
+        except Exception as e:
+            logger.warning(f"Working tree watcher for {self.repo_key} stopped: {e}")
+        finally:
+            with self._lock:
+                # Nothing is tracked any more, so no generation can vouch for the tree
+                self.generation += 1
+                self._lost_generation = self.generation
+            self.ready.clear()
+
+    def _watch_tree(self, inotify: _Inotify, watches: Dict[int, str], rel_dir: str) -> None:
+        pending = [rel_dir]
+        while pending and not self._stop.is_set():
+            level, pending = pending, []
+            for rel in level:
+                wd = inotify.add_watch(os.path.join(self.repo_key, rel))
+                watches[wd] = rel
+                try:
+                    entries = [e for e in os.scandir(os.path.join(self.repo_key, rel)) if e.is_dir(follow_symlinks=False)]
+                except OSError:
+                    continue
+                subdirs = [os.path.join(rel, e.name) if rel else e.name for e in entries]
+                subdirs = [d for d in subdirs if d != ".git"]
+                ignored = _git_check_ignore(self.repo_key, [d + "/" for d in subdirs])
+                pending += [d for d in subdirs if d + "/" not in ignored]
+
+    def _run_inotify(self) -> None:
+        inotify = _Inotify()
+        watches: Dict[int, str] = {}
+        try:
+            self._watch_tree(inotify, watches, "")
+            self.ready.set()
+            while not self._stop.is_set():
+                readable, _, _ = select.select([inotify.fd], [], [], 0.5)
+                if not readable:
+                    continue
+                paths: set[str] = set()
+                lost = False
+                deadline = time.monotonic() + WATCH_DEBOUNCE
+                while True:
+                    for wd, mask, name in inotify.read_events():
+                        if mask & _Inotify.IN_Q_OVERFLOW:
+                            lost = True
+                            continue
+                        rel_dir = watches.get(wd)
+                        if rel_dir is None:
+                            continue
+                        if mask & _Inotify.IN_IGNORED:
+                            del watches[wd]
+                            continue
+                        if not name:
+                            if mask & (_Inotify.IN_DELETE_SELF | _Inotify.IN_MOVE_SELF):
+                                paths.add(rel_dir + "/")
+                            continue
+                        rel = os.path.join(rel_dir, name) if rel_dir else name
+                        if rel == ".git" or rel.startswith(".git/"):
+                            continue
+                        if mask & _Inotify.IN_ISDIR:
+                            paths.add(rel + "/")
+                            if mask & (_Inotify.IN_CREATE | _Inotify.IN_MOVED_TO):
+                                with suppress(FileNotFoundError, NotADirectoryError):
+                                    self._watch_tree(inotify, watches, rel)
+                        else:
+                            paths.add(rel)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not select.select([inotify.fd], [], [], remaining)[0]:
+                        break
+                if paths or lost:
+                    self._record(paths, lost)
+        finally:
+            inotify.close()
+
+    def _snapshot(self) -> Dict[str, Optional[Tuple[int, int, int]]]:
+        listing = subprocess.run(
+            ["git", "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+            cwd=self.repo_key, capture_output=True, check=True,
+        ).stdout
+        snapshot: Dict[str, Optional[Tuple[int, int, int]]] = {}
+        for raw in listing.split(b"\0"):
+            if raw:
+                path = raw.decode("utf-8", "surrogateescape")
+                try:
+                    st = os.lstat(os.path.join(self.repo_key, path))
+                    snapshot[path] = (st.st_mtime_ns, st.st_size, st.st_mode)
+                except OSError:
+                    snapshot[path] = None
+        return snapshot
+
+    def _run_poll(self) -> None:
+        previous = self._snapshot()
+        self.ready.set()
+        while not self._stop.wait(WATCH_POLL_INTERVAL):
+            current = self._snapshot()
+            changed = {p for p in previous.keys() | current.keys() if previous.get(p) != current.get(p)}
+            previous = current
+            if changed:
+                # ls-files already applied the ignore rules
+                self._record(changed, check_ignore=False)
+
+    def stop(self) -> None:
+        """
+        Stops the watcher thread.
+        """
+        self._stop.set()
+        self.ready.clear()
+
+class WorktreeWatchers:
+    """
+    The working tree watchers of the repositories served, started lazily on first use when
+    `MCP_DEVTOOLS_WATCHER` is not `off`, and stopped after `idle_timeout` seconds without use.
+    """
+
+    def __init__(self, mode: str = WORKTREE_WATCHER, idle_timeout: float = REPO_POOL_IDLE_TIMEOUT):
+        self.mode = mode
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._watchers: Dict[str, WorktreeWatcher] = {}
+
+    def get(self, repo_path: str | Path) -> Optional[WorktreeWatcher]:
+        """
+        Returns the repository's watcher once it is tracking changes, starting it if needed.
+
+        Args:
+            repo_path: The path to the repository's working directory.
+
+        Returns:
+            The ready watcher, or None if watching is disabled or still starting up.
+        """
+        if self.mode == "off":
+            return None
+        key = _repo_key(repo_path)
+        with self._lock:
+            watcher = self._watchers.get(key)
+            if watcher is None or not watcher._thread.is_alive():
+                watcher = self._watchers[key] = WorktreeWatcher(key, self.mode)
+        watcher.last_used = time.monotonic()
+        return watcher if watcher.ready.is_set() else None
+
+    def close_idle(self) -> int:
+        """
+        Stops watchers not used within `idle_timeout`.
+
+        Returns:
+            The number of watchers stopped.
+        """
+        now = time.monotonic()
+        with self._lock:
+            idle = [key for key, w in self._watchers.items() if now - w.last_used >= self.idle_timeout]
+            watchers = [self._watchers.pop(key) for key in idle]
+        for watcher in watchers:
+            watcher.stop()
+        return len(watchers)
+
+    def clear(self) -> None:
+        """
+        Stops every watcher.
+        """
+        with self._lock:
+            watchers = list(self._watchers.values())
+            self._watchers.clear()
+        for watcher in watchers:
+            watcher.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the watchers' state.
+
+        Returns:
+            A dictionary with the configured mode and each repository's watcher mode and generation.
+        """
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "repositories": {
+                    key: {"mode": w.mode, "ready": w.ready.is_set(), "generation": w.generation}
+                    for key, w in self._watchers.items()
+                },
+            }
+
+worktree_watchers = WorktreeWatchers()
+
+# Without a watcher, edits made outside the server are only seen through `_worktree_signature`,
+# which can miss edits to clean files, so results are only cached when a TTL is set explicitly
+STATE_CACHE_TTL = float(os.getenv("MCP_DEVTOOLS_STATE_CACHE_TTL", "0" if WORKTREE_WATCHER == "off" else "2"))
+_WORKTREE_SIGNATURE_MAX_PATHS = 256
+
+def _read_text_quietly(path: str) -> Optional[str]:
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def _stat_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def _repo_state_fingerprint(repo_key: str) -> Optional[Tuple[Any, ...]]:
+    """
+    Computes a cheap fingerprint of a repository's HEAD and index from a few file reads and stats,
+    without running git.
+
+    Args:
+        repo_key: The resolved path to the repository's working directory.
+
+    Returns:
+        A tuple that changes whenever HEAD moves or the index is rewritten, or None if the
+        repository layout could not be read.
+    """
+    git_dir = os.path.join(repo_key, ".git")
+    if os.path.isfile(git_dir):
+        pointer = _read_text_quietly(git_dir) or ""
+        if not pointer.startswith("gitdir:"):
+            return None
+        git_dir = os.path.join(repo_key, pointer[len("gitdir:"):].strip())
+    head = _read_text_quietly(os.path.join(git_dir, "HEAD"))
+    if head is None:
+        return None
+    common_dir = git_dir
+    common_pointer = _read_text_quietly(os.path.join(git_dir, "commondir"))
+    if common_pointer:
+        common_dir = os.path.join(git_dir, common_pointer)
+    ref_value = None
+    if head.startswith("ref:"):
+        ref_value = _read_text_quietly(os.path.join(common_dir, head[len("ref:"):].strip()))
+    return (
+        head,
+        ref_value,
+        _stat_signature(os.path.join(common_dir, "packed-refs")) if ref_value is None else None,
+        _stat_signature(os.path.join(git_dir, "index")),
+    )
+
+_STATUS_PATH_RE = re.compile(r"^\t(?:[a-z ]+:\s+)?(?:.* -> )?(.+)$", re.MULTILINE)
+_DIFF_PATH_RE = re.compile(r"^diff --git a/.* b/(.+)$", re.MULTILINE)
+
+def _result_paths(result: Any) -> Optional[List[str]]:
+    """
+    Extracts the paths a `git_status` or `git_diff_all_page` output lists.
+
+    Args:
+        result: The tool output: the long `git status` text, or a (diff, cursor) pair.
+
+    Returns:
+        The paths, or None if there are more than `_WORKTREE_SIGNATURE_MAX_PATHS`.
+    """
+    if isinstance(result, tuple):
+        paths = _DIFF_PATH_RE.findall(result[0]) if isinstance(result[0], str) else []
+    else:
+        paths = _STATUS_PATH_RE.findall(str(result))
+    paths = [path.strip().strip('"') for path in paths]
+    return paths if len(paths) <= _WORKTREE_SIGNATURE_MAX_PATHS else None
+
+def _worktree_signature(repo_key: str, paths: List[str]) -> Tuple[Any, ...]:
+    """
+    A cheap signal of working tree changes for a cache entry without a watcher: the stat data of the
+    paths its result listed and of the directories containing them (including the top directory,
+    where new untracked files usually appear).
+
+    Args:
+        repo_key: The resolved path to the repository's working directory.
+        paths: The paths listed by the cached result.
+
+    Returns:
+        The signature.
+    """
+    directories = {""} | {os.path.dirname(path.rstrip("/")) for path in paths}
+    return tuple(
+        (name, _stat_signature(os.path.join(repo_key, name)))
+        for name in sorted(set(paths) | directories)
+    )
+
+class StateCache:
+    """
+    Caches the output of `git_status` and `git_diff_all` per repository, keyed by a fingerprint of
+    HEAD and the index plus a write generation that is bumped whenever a writer tool of this server
+    finishes on the repository. When the repository has a `WorktreeWatcher`, its generation is part
+    of the key too. Otherwise an entry is also checked against `_worktree_signature` of the paths its
+    result listed, and expires after `ttl` seconds, since edits to other files outside the server
+    are not visible.
+    """
+
+    def __init__(self, ttl: float = STATE_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._generations: Dict[str, int] = {}
+        # (repo, tool) -> (token, time stored, result, worktree paths and signature without a watcher)
+        self._entries: Dict[Tuple[str, str], Tuple[Tuple[Any, ...], float, Any, Optional[Tuple[List[str], Tuple[Any, ...]]]]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def token(self, repo_path: str | Path) -> Optional[Tuple[Any, ...]]:
+        """
+        Captures the repository's current state.
+
+        Args:
+            repo_path: The path to the repository's working directory.
+
+        Returns:
+            The state token, or None if the state can't be fingerprinted (results are then not cached).
+        """
+        if self.ttl <= 0:
+            return None
+        key = _repo_key(repo_path)
+        watcher = worktree_watchers.get(key)
+        # Read the watcher's generation first, so changes made while the state is read are not missed
+        watch_state = (watcher.id, watcher.generation) if watcher is not None else None
+        fingerprint = _repo_state_fingerprint(key)
+        if fingerprint is None:
+            return None
+        with self._lock:
+            return (self._generations.get(key, 0), fingerprint, watch_state)
+
+    def get(self, repo_path: str | Path, tool_name: str, token: Optional[Tuple[Any, ...]]) -> Any:
+        """
+        Returns a cached result computed in the same repository state, if it has not expired.
+
+        Args:
+            repo_path: The path to the repository's working directory.
+            tool_name: The name (and arguments) of the tool whose output is cached.
+            token: The current state token from `token`.
+
+        Returns:
+            The cached output, or None on a miss.
+        """
+        if token is None:
+            return None
+        key = _repo_key(repo_path)
+        with self._lock:
+            entry = self._entries.get((key, tool_name))
+        if entry is not None and entry[0] == token and token[2] is None:
+            # Without a watcher, the paths the result listed must be unchanged too
+            fresh = time.monotonic() - entry[1] < self.ttl
+            if not fresh or entry[3] is None or _worktree_signature(key, entry[3][0]) != entry[3][1]:
+                entry = None
+        with self._lock:
+            if entry is not None and entry[0] == token:
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            return None
+
+    def previous(self, repo_path: str | Path, tool_name: str, token: Optional[Tuple[Any, ...]]) -> Optional[Tuple[Any, int]]:
+        """
+        Returns a cached result that differs from the current state only by working tree changes
+        seen by the same watcher, so it can be updated for just the changed paths.
+
+        Args:
+            repo_path: The path to the repository's working directory.
+            tool_name: The name (and arguments) of the tool whose output is cached.
+            token: The current state token from `token`.
+
+        Returns:
+            A tuple of the cached output and the watcher generation it was computed at, or None.
+        """
+        if token is None or token[2] is None:
+            return None
+        with self._lock:
+            entry = self._entries.get((_repo_key(repo_path), tool_name))
+        if entry is None or entry[0][:2] != token[:2] or entry[0][2] is None or entry[0][2][0] != token[2][0]:
+            return None
+        return entry[2], entry[0][2][1]
+
+    def put(self, repo_path: str | Path, tool_name: str, token: Optional[Tuple[Any, ...]], result: Any) -> None:
+        """
+        Stores a result computed in the state captured by `token`.
+
+        Args:
+            repo_path: The path to the repository's working directory.
+            tool_name: The name (and arguments) of the tool whose output is cached.
+            token: The state token taken once the result was computed.
+            result: The tool output.
+        """
+        if token is None:
+            return
+        key = _repo_key(repo_path)
+        worktree = None
+        if token[2] is None:
+            paths = _result_paths(result)
+            if paths is None:
+                return
+            worktree = (paths, _worktree_signature(key, paths))
+        with self._lock:
+            if self._generations.get(key, 0) == token[0]:
+                self._entries[(key, tool_name)] = (token, time.monotonic(), result, worktree)
+
+    def invalidate(self, repo_path: str | Path) -> None:
+        """
+        Drops every cached result of a repository and bumps its write generation.
+
+        Args:
+            repo_path: The path to the repository's working directory.
+        """
+        key = _repo_key(repo_path)
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            for entry_key in [k for k in self._entries if k[0] == key]:
+                del self._entries[entry_key]
+            self.invalidations += 1
+
+    @asynccontextmanager
+    async def invalidating(self, repo_path: str | Path, tool_name: str):
+        """
+        Invalidates the repository's cached results when a writer or unlocked tool call finishes.
+
+        Args:
+            repo_path: The path to the repository's working directory.
+            tool_name: The name of the tool being called (a `GitTools` value).
+        """
+        try:
+            yield
+        finally:
+            # A writer that released its lease early (`_writes_finished`) has already invalidated
+            lease = _current_lease.get()
+            if TOOL_ACCESS[GitTools(tool_name)] != ToolAccess.READ and not (lease is not None and lease.released):
+                self.invalidate(repo_path)
+
+    def clear(self) -> None:
+        """
+        Drops every cached result.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the cache's counters.
+
+        Returns:
+            A dictionary with entry and hit/miss counters.
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+state_cache = StateCache()
+
+def _writes_finished(repo_path: str | Path) -> None:
+    """
+    Called by the edit tools once their files are written: invalidates the repository's cached state
+    and releases the calling tool's write lock, so that queued tools don't wait for the diffs and
+    validators that follow, which only read the files. Does nothing outside a writer tool call.
+
+    Args:
+        repo_path: The path to the repository's working directory.
+    """
+    lease = _current_lease.get()
+    if lease is not None and lease.access == ToolAccess.WRITE and not lease.released:
+        state_cache.invalidate(repo_path)
+        lease.release()
+
+async def _run_state_tool(repo_path: str | Path, tool_name: str, func, *args) -> Any:
+    """
+    Runs a working tree state tool (`git_status`, `git_diff_all_page`) through `_run_git_tool`,
+    reusing the previous output for the same arguments while the repository state is unchanged.
+    When a watcher reports that only some working tree paths changed, a complete (single page)
+    `git_diff_all_page` patch is updated by re-diffing just those paths. `git_status` is always run in
+    full on a miss: its long format can't be updated per path.
+
+    Args:
+        repo_path: The path to the repository's working directory.
+        tool_name: The name of the tool, used as part of the cache key.
+        func: The tool function.
+        *args: Arguments passed to `func` after the repo.
+
+    Returns:
+        The tool output.
+    """
+    cache_key = f"{tool_name}:{json.dumps(args, default=str)}" if args else str(tool_name)
+    token = state_cache.token(repo_path)
+    cached = state_cache.get(repo_path, cache_key, token)
+    if cached is not None:
+        return cached
+    result = None
+    previous = None
+    if tool_name == GitTools.DIFF_ALL and len(args) == 4 and args[0] is None and args[1] == DiffMode.PATCH and args[2] is None:
+        previous = state_cache.previous(repo_path, cache_key, token)
+    watcher = worktree_watchers.get(repo_path) if previous is not None else None
+    if previous is not None and watcher is not None and token is not None and watcher.id == token[2][0]:
+        previous_diff, previous_cursor = previous[0]
+        changed = watcher.changed_since(previous[1])
+        if previous_cursor is None and changed is not None and len(changed) <= _DIFF_SPLICE_MAX_PATHS:
+            spliced = await _run_git_tool(repo_path, git_diff_all_update, previous_diff, sorted(changed), args[3])
+            if spliced is not None:
+                result = (spliced, None)
+    if result is None:
+        result = await _run_git_tool(repo_path, func, *args)
+    # `git status` may refresh the index's stat data, so the state is captured again afterwards,
+    # keeping the watcher generation read before the tool ran
+    after = state_cache.token(repo_path)
+    if token is not None and after is not None:
+        state_cache.put(repo_path, cache_key, (after[0], after[1], token[2]), result)
+    return result
+
+def git_status(repo: git.Repo) -> str:
+    """
+    Gets the status of the Git working tree.
 
     Args:
         repo: The Git repository object.
-        max_count: The maximum number of commits to retrieve.
 
     Returns:
-        A list of strings, where each string represents a formatted commit entry.
+        A string representing the output of `git status`.
     """
-    commits = list(repo.iter_commits(max_count=max_count))
-    log = []
-    for commit in commits:
-        log.append(
-            f"Commit: {commit.hexsha}\n"
-            f"Author: {commit.author}\n"
-            f"Date: {commit.authored_datetime}\n"
-            f"Message: {str(commit.message)}\n"
-        )
-    return log
+    return repo.git.status()
 
-def git_create_branch(repo: git.Repo, branch_name: str, base_branch: str | None = None) -> str:
+def git_diff_all(repo: git.Repo) -> str:
     """
-    Creates a new branch in the repository.
+    Shows all changes in the working directory (staged and unstaged, compared to HEAD).
 
     Args:
         repo: The Git repository object.
-        branch_name: The name of the new branch.
-        base_branch: Optional. The name of the branch to base the new branch on.
-                     If None, the new branch is based on the current active branch.
 
     Returns:
-        A string indicating the successful creation of the branch.
+        A string representing the output of `git diff HEAD`.
     """
-    if base_branch:
-        base = repo.refs[base_branch]
-    else:
-        base = repo.active_branch
+    return repo.git.diff("HEAD")
 
-    repo.create_head(branch_name, base)
-    return f"Created branch '{branch_name}' from '{base.name}'"
+_DIFF_SPLICE_MAX_PATHS = 256
 
-def git_checkout(repo: git.Repo, branch_name: str) -> str:
+def _split_diff_sections(diff: str) -> Optional[Dict[str, str]]:
     """
-    Switches the current branch to the specified branch.
+    Splits `git diff` output into per-file sections keyed by path.
+
+    Args:
+        diff: The diff output.
+
+    Returns:
+        A dictionary mapping each path to its section, or None if a section can't be attributed to
+        a single unquoted path (renames, copies, quoted names).
+    """
+    sections: Dict[str, str] = {}
+    if not diff:
+        return sections
+    if not diff.startswith("diff --git "):
+        return None
+    for section in re.split(r"\n(?=diff --git )", diff):
+        header = section.split("\n", 1)[0][len("diff --git "):]
+        length = (len(header) - 5) // 2
+        path = header[2:2 + length]
+        if header != f"a/{path} b/{path}" or path.startswith('"'):
+            return None
+        sections[path] = section
+    return sections
+
+def git_diff_all_update(repo: git.Repo, previous: str, paths: List[str], max_files: Optional[int] = None) -> Optional[str]:
+    """
+    Updates a previous `git_diff_all` result after only some working tree paths changed,
+    by diffing just those paths and splicing their sections into the previous output.
 
     Args:
         repo: The Git repository object.
-        branch_name: The name of the branch to checkout.
+        previous: The previous `git_diff_all` output, computed at the same HEAD and index.
+        paths: The changed paths (files or directories) relative to the repository root.
+        max_files: Optional. The page size; if the updated diff has more files, it must be paged instead.
 
     Returns:
-        A string indicating the successful checkout of the branch.
+        The updated diff, or None if the output can't be spliced and must be recomputed in full.
     """
-    repo.git.checkout(branch_name)
-    return f"Switched to branch '{branch_name}'"
+    sections = _split_diff_sections(previous)
+    if sections is None:
+        return None
+    if paths:
+        updated = _split_diff_sections(repo.git.execute(["git", "--literal-pathspecs", "diff", "HEAD", "--", *paths]))
+        if updated is None:
+            return None
+        prefixes = tuple(path.rstrip("/") + "/" for path in paths)
+        for path in [p for p in sections if p in paths or p.startswith(prefixes)]:
+            del sections[path]
+        sections.update(updated)
+    if max_files is not None and len(sections) > max_files:
+        return None
+    return "\n".join(sections[path] for path in sorted(sections, key=lambda p: p.encode("utf-8", "surrogateescape")))
+
+_REVISION_RANGE = re.compile(r"(\S*?)(\.\.\.?)(\S*)")
+
+def _resolve_revision_range(repo: git.Repo, target: str) -> Optional[str]:
+    """
+    Resolves an `A..B` or `A...B` diff target to commit SHAs.
+
+    Args:
+        repo: The Git repository object.
+        target: The diff target.
 
-def git_show(repo: git.Repo, revision: str) -> str:
+    Returns:
+        The target with both ends replaced by commit SHAs, or None if it is not a range of commits
+        (for example a single revision, whose diff involves the working tree).
     """
-    Shows the contents (metadata and diff) of a specific commit.
+    match = _REVISION_RANGE.fullmatch(target.strip())
+    if not match or target.startswith("-"):
+        return None
+    left, separator, right = match.groups()
+    try:
+        shas = repo.git.rev_parse(f"{left or 'HEAD'}^{{commit}}", f"{right or 'HEAD'}^{{commit}}").split()
+    except GitCommandError:
+        return None
+    return f"{shas[0]}{separator}{shas[1]}" if len(shas) == 2 else None
+
+def git_diff(repo: git.Repo, target: str) -> str:
+    """
+    Shows differences between branches or commits.
+    Diffs between two revisions (`A..B` or `A...B`) are cached in `result_cache` by resolved SHAs.
 
     Args:
         repo: The Git repository object.
-        revision: The commit hash or reference to show.
+        target: The target (branch, commit hash, etc.) to diff against.
 
     Returns:
-        A string containing the commit details and its diff.
+        A string representing the output of `git diff <target>`.
     """
-    commit = repo.commit(revision)
-    output = [
-        f"Commit: {commit.hexsha}\n"
-        f"Author: {commit.author}\n"
-        f"Date: {commit.authored_datetime}\n"
-        f"Message: {str(commit.message)}\n"
-    ]
-    if commit.parents:
-        parent = commit.parents[0]
-        diff = parent.diff(commit, create_patch=True)
-    else:
-        diff = commit.diff(git.NULL_TREE, create_patch=True)
-    for d in diff:
-        output.append(f"\n--- {d.a_path}\n+++ {d.b_path}\n")
-        if d.diff is not None:
-            if isinstance(d.diff, bytes):
-                output.append(d.diff.decode('utf-8'))
-            else:
-                output.append(str(d.diff))
-    return "".join(output)
+    resolved = _resolve_revision_range(repo, target)
+    if resolved is not None:
+        # Both ends resolve to commits, so the output can never change
+        key = ("diff", _repo_key(str(repo.working_dir)), resolved)
+        cached = result_cache.get(key)
+        if cached is not None:
+            return cached
+        diff = repo.git.diff(resolved)
+        result_cache.put(key, diff)
+        return diff
+    return repo.git.diff(target)
 
-async def git_apply_diff(repo: git.Repo, diff_content: str) -> str:
+def _run_git_output(repo_path: str, args: List[str], max_files: Optional[int] = None) -> str:
     """
-    Applies a given diff content to the working directory of the repository.
-    Includes a check for successful application and generates a new diff output.
-    Also runs TSC if applicable after applying the diff.
+    Runs a git command and reads its output from the pipe as it is produced.
+
+    Args:
+        repo_path: The path to the repository's working directory.
+        args: The git arguments (without the leading `git`).
+        max_files: Optional. For patch output, the number of file sections to read; the process is
+            stopped at the header of the next one.
+
+    Returns:
+        The decoded output, without its final newline.
+    """
+    process = _git_popen(repo_path, args)
+    lines: List[bytes] = []
+    sections = 0
+    stopped = False
+    try:
+        assert process.stdout is not None
+        for line in _iter_git_records(process.stdout, b"\n"):
+            if max_files is not None and line.startswith(b"diff --git "):
+                sections += 1
+                if sections > max_files:
+                    stopped = True
+                    break
+            lines.append(line)
+    finally:
+        _finish_git_process(process, args, stop_early=stopped)
+    return b"\n".join(lines).decode("utf-8", errors="replace")
+
+def git_diff_page(
+    repo: git.Repo,
+    target: str,
+    paths: Optional[List[str]] = None,
+    mode: DiffMode = DiffMode.PATCH,
+    cursor: Optional[str] = None,
+    max_files: int = DIFF_PAGE_MAX_FILES,
+) -> Tuple[str, Optional[str]]:
+    """
+    Shows one page of `git diff <target>`, by file.
+
+    The changed file names are streamed from `git diff --name-only` until the page is full (the
+    listing process is stopped there), and the patch or stat is then generated for just the page's
+    files, with the same rename handling (`--no-renames`) so both list the same files; the patch is
+    streamed and stopped after the page's last file. Pages of diffs between two commits are cached in
+    `result_cache`.
 
     Args:
         repo: The Git repository object.
-        diff_content: The diff string to apply.
+        target: The diff target, e.g. 'HEAD' for all uncommitted changes, a branch, or 'A..B'.
+        paths: Optional. Only include changes to these pathspecs.
+        mode: The output mode: a patch, a `--stat` summary or the changed file names.
+        cursor: Optional. The cursor returned by a previous call, to fetch the next page.
+        max_files: The maximum number of files per page.
 
     Returns:
-        A string indicating the result of the diff application, including
-        any new diff generated and TSC output if applicable, or an error message.
+        A tuple of the page's output and the cursor for the next page (None on the last page).
+
+    Raises:
+        ValueError: If the cursor is invalid or was produced for a different diff.
+    """
+    mode = DiffMode(mode)
+    max_files = max(1, max_files)
+    filters = [target, paths or [], mode.value]
+    after = None
+    if cursor:
+        state = _decode_cursor(cursor)
+        if state.get("filters") != filters:
+            raise ValueError("Cursor was produced for a different target, paths or mode.")
+        after = state.get("after")
+        if not isinstance(after, str):
+            raise ValueError(f"Invalid cursor: {cursor!r}")
+
+    resolved = _resolve_revision_range(repo, target)
+    key = None
+    if resolved is not None:
+        key = ("diff-page", _repo_key(str(repo.working_dir)), resolved, json.dumps([paths, mode.value, after, max_files]))
+        cached = result_cache.get(key)
+        if cached is not None:
+            text, _, cached_cursor = cached.partition("\0")
+            return text, cached_cursor or None
+    revision = resolved or target
+
+    repo_path = str(repo.working_dir)
+    pathspecs = ["--", *(paths or [])]
+    diff_args = ["diff", "--no-renames", revision]
+    list_args = [*diff_args, "--name-only", "-z", *pathspecs]
+    page: List[str] = []
+    has_more = False
+    process = _git_popen(repo_path, list_args)
+    try:
+        assert process.stdout is not None
+        for record in _iter_git_records(process.stdout, b"\0"):
+            name = record.decode("utf-8", errors="surrogateescape")
+            if after is not None and name.encode("utf-8", "surrogateescape") <= after.encode("utf-8", "surrogateescape"):
+                continue
+            if len(page) == max_files:
+                has_more = True
+                break
+            page.append(name)
+    finally:
+        _finish_git_process(process, list_args, stop_early=has_more)
+
+    if page and (after is not None or has_more):
+        # Limit the diff to this page's files
+        pathspecs = ["--", *(f":(literal){name}" for name in page)]
+    if not page:
+        text = ""
+    elif mode == DiffMode.NAME_ONLY:
+        text = "\n".join(page)
+    elif mode == DiffMode.STAT:
+        text = _run_git_output(repo_path, [*diff_args, "--stat", *pathspecs])
+    else:
+        text = _run_git_output(repo_path, [*diff_args, *pathspecs], max_files=len(page))
+    next_cursor = _encode_cursor({"after": page[-1], "filters": filters}) if has_more else None
+    if key is not None:
+        result_cache.put(key, f"{text}\0{next_cursor or ''}")
+    return text, next_cursor
+
+def git_diff_all_page(
+    repo: git.Repo,
+    paths: Optional[List[str]] = None,
+    mode: DiffMode = DiffMode.PATCH,
+    cursor: Optional[str] = None,
+    max_files: int = DIFF_PAGE_MAX_FILES,
+) -> Tuple[str, Optional[str]]:
+    """
+    Shows one page of all changes in the working directory (staged and unstaged, compared to HEAD).
+
+    Args:
+        repo: The Git repository object.
+        paths: Optional. Only include changes to these pathspecs.
+        mode: The output mode: a patch, a `--stat` summary or the changed file names.
+        cursor: Optional. The cursor returned by a previous call, to fetch the next page.
+        max_files: The maximum number of files per page.
+
+    Returns:
+        A tuple of the page's output and the cursor for the next page (None on the last page).
+    """
+    return git_diff_page(repo, "HEAD", paths, mode, cursor, max_files)
+
+def git_stage_and_commit(repo: git.Repo, message: str, files: Optional[List[str]] = None) -> str:
     """
-    tmp_file_path = None
-    affected_file_path = None
-    original_content = ""
+    Stages changes and commits them to the repository.
+
+    Args:
+        repo: The Git repository object.
+        message: The commit message.
+        files: An optional list of specific files to stage. If None, all changes are staged.
 
-    # Attempt to extract affected file path from the diff content
-    match = re.search(r"--- a/(.+)", diff_content)
-    if match:
-        affected_file_path = match.group(1).strip()
+    Returns:
+        A string indicating the success of the staging and commit operation.
+    """
+    if files:
+        repo.index.add(files)
+        staged_message = f"Files {', '.join(files)} staged successfully."
     else:
-        match = re.search(r"\+\+\+ b/(.+)", diff_content)
-        if match:
-            affected_file_path = match.group(1).strip()
+        repo.git.add(A=True)
+        staged_message = "All changes staged successfully."
 
-    if affected_file_path:
-        full_affected_path = Path(repo.working_dir) / affected_file_path
-        if full_affected_path.exists():
-            with open(full_affected_path, 'r') as f:
-                original_content = f.read()
+    commit = repo.index.commit(message)
+    return f"{staged_message}\nChanges committed successfully with hash {commit.hexsha}"
 
-    try:
-        with tempfile.NamedTemporaryFile(mode='w', delete=False) as tmp:
-            tmp.write(diff_content)
-            tmp_file_path = tmp.name
-        
-        repo.git.apply(
-            '--check',
-            '-3',
-            '--whitespace=fix',
-            '--allow-overlap',
-            tmp_file_path
-        )
-            
-        result_message = "Diff applied successfully"
+def git_reset(repo: git.Repo) -> str:
+    """
+    Unstages all staged changes in the repository.
 
-        if affected_file_path:
-            with open(full_affected_path, 'r') as f:
-                new_content = f.read()
+    Args:
+        repo: The Git repository object.
 
-            result_message += await _generate_diff_output(original_content, new_content, affected_file_path)
-            result_message += await _run_tsc_if_applicable(str(repo.working_dir), affected_file_path)
+    Returns:
+        A string indicating that all staged changes have been reset.
+    """
+    repo.index.reset()
+    return "All staged changes reset"
 
-        return result_message
-    except GitCommandError as gce:
-        return f"GIT_COMMAND_FAILED: Failed to apply diff. Details: {gce.stderr}. AI_HINT: Check if the diff is valid and applies cleanly to the current state of the repository."
+_LOG_FORMAT = "%x1e%H%x1f%P%x1f%ct%x1f%an%x1f%ae%x1f%aI%x1f%B%x1f"
+_LOG_MAX_FRONTIER = 32
+
+def _git_popen(repo_path: str | Path, args: List[str], stdin: Optional[int] = None) -> subprocess.Popen:
+    """
+    Starts a git process in the repository with its stdout piped, for incremental parsing.
+
+    Args:
+        repo_path: The path to the repository's working directory.
+        args: The git arguments (without the leading `git`).
+        stdin: Optional. The stdin setting passed to `subprocess.Popen`.
+
+    Returns:
+        The running process.
+    """
+    return subprocess.Popen(
+        ["git", *args],
+        cwd=str(repo_path),
+        stdin=stdin,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+
+def _iter_git_records(stream, separator: bytes, chunk_size: int = 65536) -> Iterator[bytes]:
+    """
+    Splits a git output stream into separator-terminated records as it is read.
+
+    Args:
+        stream: A binary file object, typically a process's stdout.
+        separator: The record terminator.
+        chunk_size: The number of bytes read at a time.
+
+    Yields:
+        Each record, without its separator.
+    """
+    buffer = b""
+    while True:
+        chunk = stream.read1(chunk_size) if hasattr(stream, "read1") else stream.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        *records, buffer = buffer.split(separator)
+        yield from records
+    if buffer.strip():
+        yield buffer
+
+def _finish_git_process(process: subprocess.Popen, args: List[str], stop_early: bool) -> None:
+    """
+    Closes a streamed git process, raising if it failed.
+
+    Args:
+        process: The process started by `_git_popen`.
+        args: The git arguments, used in the error.
+        stop_early: True if the caller stopped reading before the end of the output.
+
+    Raises:
+        GitCommandError: If git exited with an error while its output was read to the end.
+    """
+    if stop_early:
+        process.kill()
+    _, stderr = process.communicate()
+    if not stop_early and process.returncode != 0:
+        raise GitCommandError(["git", *args], process.returncode, stderr)
+
+def _encode_cursor(state: Dict[str, Any]) -> str:
+    """
+    Encodes pagination state as an opaque cursor string.
+
+    Args:
+        state: The JSON-serializable pagination state.
+
+    Returns:
+        A URL-safe cursor string.
+    """
+    raw = json.dumps(state, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor: str) -> Dict[str, Any]:
+    """
+    Decodes a cursor produced by `_encode_cursor`.
+
+    Args:
+        cursor: The cursor string.
+
+    Returns:
+        The pagination state.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
     except Exception as e:
-        return f"UNEXPECTED_ERROR: An unexpected error occurred while applying diff: {e}. AI_HINT: Check the server logs for more details or review your input."
-    finally:
-        if tmp_file_path and os.path.exists(tmp_file_path):
-            os.unlink(tmp_file_path)
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    if not isinstance(state, dict):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return state
+
+def _format_log_entry(sha: str, author: str, date: str, message: str) -> str:
+    return (
+        f"Commit: {sha}\n"
+        f"Author: {author}\n"
+        f"Date: {date}\n"
+        f"Message: {message}\n"
+    )
 
-def git_read_file(repo: git.Repo, file_path: str) -> str:
+COMMIT_INDEX_ENABLED = os.getenv("MCP_DEVTOOLS_COMMIT_INDEX", "true").lower() in ("true", "1", "t")
+_INDEX_FORMAT = "%x1e%H%x1f%P%x1f%an <%ae>%x1f%an%x1f%aI%x1f%ct%x1f%B%x1f"
+_INDEX_BATCH_SIZE = 1000
+# Bumped when the meaning of stored rows changes; an index of another version is rebuilt
+_INDEX_VERSION = "3"
+_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS commits (
+    sha TEXT PRIMARY KEY,
+    parents TEXT NOT NULL,
+    author_ident TEXT NOT NULL,
+    author_name TEXT NOT NULL,
+    author_date TEXT NOT NULL,
+    commit_time INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    gen INTEGER NOT NULL,
+    pos INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS commits_walk_order ON commits (gen DESC, pos);
+CREATE TABLE IF NOT EXISTS paths (path TEXT NOT NULL, sha TEXT NOT NULL, PRIMARY KEY (path, sha)) WITHOUT ROWID;
+"""
+
+class CommitIndex:
     """
-    Reads the content of a specified file within the repository.
+    An on-disk SQLite index of the commits reachable from HEAD (SHA, parents, author, dates,
+    message and touched paths), stored per repository under `<git dir>/mcp-devtools/`.
+
+    Commits are stored with their position in `git log`'s walk from HEAD (`gen DESC, pos`), so
+    queries return them in exactly the order `git log` would. Path queries are only answered for a
+    history without merges, where the commits touching a path are exactly those `git log -- <path>`
+    shows; history simplification at merges is left to git. The index is refreshed on a background
+    thread: when HEAD has moved forward by commits without merges, only the new commits
+    (`git log HEAD ^<indexed head>`) are added, as they come first in the walk without changing the
+    order of the rest; otherwise it is rebuilt. Queries are only answered while the index is at the
+    requested HEAD, so callers fall back to `git log` when it is stale or still being built.
+    """
+
+    def __init__(self, enabled: bool = COMMIT_INDEX_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mcp-commit-index")
+        self._scheduled: set[str] = set()
+        self._db_paths: Dict[str, str] = {}
+        self.hits = 0
+        self.fallbacks = 0
+        self.incremental_updates = 0
+        self.rebuilds = 0
+        self.indexed_commits = 0
+
+    def _db_path(self, repo_key: str) -> str:
+        with self._lock:
+            path = self._db_paths.get(repo_key)
+        if path is None:
+            git_dir = subprocess.run(
+                ["git", "rev-parse", "--absolute-git-dir"],
+                cwd=repo_key, capture_output=True, text=True, check=True,
+            ).stdout.strip()
+            path = os.path.join(git_dir, "mcp-devtools", "commit-index.sqlite3")
+            with self._lock:
+                self._db_paths[repo_key] = path
+        return path
+
+    def _connect(self, repo_key: str, create: bool = False) -> Optional[sqlite3.Connection]:
+        path = self._db_path(repo_key)
+        if not create and not os.path.exists(path):
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        if create:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_INDEX_SCHEMA)
+        return conn
+
+    @staticmethod
+    def _meta(conn: sqlite3.Connection, key: str) -> Optional[str]:
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def schedule(self, repo_path: str | Path) -> None:
+        """
+        Queues a background refresh of a repository's index, unless one is already queued.
+
+        Args:
+            repo_path: The path to the repository's working directory.
+        """
+        if not self.enabled:
+            return
+        key = _repo_key(repo_path)
+        with self._lock:
+            if key in self._scheduled:
+                return
+            self._scheduled.add(key)
+
+        def run() -> None:
+            with self._lock:
+                self._scheduled.discard(key)
+            try:
+                self.refresh(key)
+            except Exception as e:
+                logger.warning(f"Failed to refresh commit index for {key}: {e}")
+
+        try:
+            self._executor.submit(run)
+        except RuntimeError:
+            with self._lock:
+                self._scheduled.discard(key)
+
+    def refresh(self, repo_path: str | Path) -> int:
+        """
+        Brings a repository's index up to date with its current HEAD.
+
+        Args:
+            repo_path: The path to the repository's working directory.
+
+        Returns:
+            The number of commits added to the index.
+        """
+        key = _repo_key(repo_path)
+        head_result = subprocess.run(
+            ["git", "rev-parse", "--verify", "--quiet", "HEAD^{commit}"],
+            cwd=key, capture_output=True, text=True,
+        )
+        head = head_result.stdout.strip()
+        if head_result.returncode != 0 or not head:
+            return 0  # No commits yet
+        conn = self._connect(key, create=True)
+        assert conn is not None
+        try:
+            indexed_head = self._meta(conn, "head")
+            if self._meta(conn, "version") != _INDEX_VERSION:
+                indexed_head = None
+            elif indexed_head == head:
+                return 0
+            # New merges could interleave the new commits with the indexed ones in the walk
+            incremental = indexed_head is not None and subprocess.run(
+                ["git", "merge-base", "--is-ancestor", indexed_head, head],
+                cwd=key, capture_output=True,
+            ).returncode == 0 and not subprocess.run(
+                ["git", "rev-list", "--merges", "--max-count=1", head, f"^{indexed_head}"],
+                cwd=key, capture_output=True, text=True,
+            ).stdout.strip()
+            revs = [head, f"^{indexed_head}"] if incremental else [head]
+            gen = int(self._meta(conn, "gen") or 0) + 1
+            added = self._index_commits(conn, key, revs, gen, replace=not incremental)
+        finally:
+            conn.close()
+        with self._lock:
+            if incremental:
+                self.incremental_updates += 1
+            else:
+                self.rebuilds += 1
+            self.indexed_commits += added
+        return added
+
+    def _index_commits(self, conn: sqlite3.Connection, repo_key: str, revs: List[str], gen: int, replace: bool) -> int:
+        args = ["log", "-z", "--no-renames", "--name-only", f"--format={_INDEX_FORMAT}", *revs, "--"]
+        process = _git_popen(repo_key, args)
+        commits: List[Tuple[Any, ...]] = []
+        paths: List[Tuple[str, str]] = []
+        added = 0
+        merges = False
+        try:
+            with conn:
+                if replace:
+                    conn.execute("DELETE FROM commits")
+                    conn.execute("DELETE FROM paths")
+                assert process.stdout is not None
+                for record in _iter_git_records(process.stdout, b"\x1e"):
+                    fields = record.decode("utf-8", errors="replace").split("\x1f", 7)
+                    if len(fields) != 8:
+                        continue
+                    sha, parents, ident, name, date, commit_time, message, names = fields
+                    commits.append((sha, parents, ident, name, date, int(commit_time), message, gen, added))
+                    merges = merges or " " in parents.strip()
+                    paths.extend((p.strip("\n"), sha) for p in names.split("\0") if p.strip("\n"))
+                    added += 1
+                    if len(commits) >= _INDEX_BATCH_SIZE:
+                        self._flush(conn, commits, paths)
+                self._flush(conn, commits, paths)
+                _finish_git_process(process, args, stop_early=False)
+                meta = [("head", revs[0]), ("gen", str(gen)), ("version", _INDEX_VERSION)]
+                if replace:
+                    # Incremental updates only add commits without merges
+                    meta.append(("merges", "1" if merges else "0"))
+                conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", meta)
+        except BaseException:
+            if process.poll() is None:
+                process.kill()
+                process.communicate()
+            raise
+        return added
+
+    @staticmethod
+    def _flush(conn: sqlite3.Connection, commits: List[Tuple[Any, ...]], paths: List[Tuple[str, str]]) -> None:
+        conn.executemany("INSERT OR REPLACE INTO commits VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", commits)
+        conn.executemany("INSERT OR IGNORE INTO paths (path, sha) VALUES (?, ?)", paths)
+        commits.clear()
+        paths.clear()
+
+    def query(
+        self,
+        repo_path: str | Path,
+        head: str,
+        limit: int,
+        after: Optional[str] = None,
+        path: Optional[str] = None,
+        author: Optional[str] = None,
+    ) -> Optional[List[Tuple[str, str, str, str]]]:
+        """
+        Looks up commits by touched path and/or author, in `git log` order. Path queries are only
+        answered when the indexed history has no merges, where they match `git log -- <path>`.
+
+        Args:
+            repo_path: The path to the repository's working directory.
+            head: The commit SHA the history is walked from; the index must be at this commit.
+            limit: The maximum number of commits to return.
+            after: Optional. Only return commits that come after this commit in the walk.
+            path: Optional. Only return commits touching this file, or any file under this directory.
+            author: Optional. Only return commits whose "Name <email>" contains this string.
+
+        Returns:
+            (sha, author name, ISO author date, message) tuples, or None if the index can't answer
+            the query (disabled, stale, unsupported path, a path query on a history with merges, or
+            unknown `after` commit); a refresh is scheduled if the index is stale.
+        """
+        if not self.enabled:
+            return None
+        if path is not None:
+            path = Path(path).as_posix().removeprefix("./").rstrip("/")
+            if not path or path == "." or path.startswith("/") or any(c in path for c in "*?[:"):
+                return None
+        key = _repo_key(repo_path)
+        conn = self._connect(key)
+        if conn is None:
+            self._record_fallback(key)
+            return None
+        try:
+            if self._meta(conn, "head") != head or self._meta(conn, "version") != _INDEX_VERSION:
+                self._record_fallback(key)
+                return None
+            if path and self._meta(conn, "merges") != "0":
+                return None
+            sql = "SELECT sha, author_name, author_date, message FROM commits WHERE 1"
+            params: List[Any] = []
+            if after is not None:
+                position = conn.execute("SELECT gen, pos FROM commits WHERE sha = ?", (after,)).fetchone()
+                if position is None:
+                    return None
+                sql += " AND (gen < ? OR (gen = ? AND pos > ?))"
+                params += [position[0], position[0], position[1]]
+            if author:
+                sql += " AND instr(author_ident, ?) > 0"
+                params.append(author)
+            if path:
+                # '0' is the character after '/', so this range holds every path under the directory.
+                sql += " AND sha IN (SELECT sha FROM paths WHERE path = ? OR (path > ? AND path < ?))"
+                params += [path, path + "/", path + "0"]
+            sql += " ORDER BY gen DESC, pos LIMIT ?"
+            params.append(limit)
+            rows = conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Commit index query failed for {key}: {e}")
+            return None
+        finally:
+            conn.close()
+        with self._lock:
+            self.hits += 1
+        return rows
+
+    def _record_fallback(self, repo_key: str) -> None:
+        with self._lock:
+            self.fallbacks += 1
+        self.schedule(repo_key)
+
+    def shutdown(self) -> None:
+        """
+        Stops the background refresh thread, abandoning queued refreshes.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the index's counters.
+
+        Returns:
+            A dictionary with query and refresh counters.
+        """
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "repositories": len(self._db_paths),
+                "pending_refreshes": len(self._scheduled),
+                "hits": self.hits,
+                "fallbacks": self.fallbacks,
+                "incremental_updates": self.incremental_updates,
+                "rebuilds": self.rebuilds,
+                "indexed_commits": self.indexed_commits,
+            }
+
+commit_index = CommitIndex()
+
+def _walk_log_page(
+    repo: git.Repo,
+    start: List[str],
+    after: Optional[str],
+    resume: Optional[Tuple[List[str], int, set[str]]],
+    max_count: int,
+    path: Optional[str],
+    author: Optional[str],
+    since: Optional[str],
+) -> Optional[Tuple[List[str], Optional[Dict[str, Any]]]]:
+    """
+    Walks one page of `git_log_page`, from the start of the walk (skipping to the commit after
+    `after`) or resumed from a previous page's frontier.
+
+    git lists every commit its walk visits; the author filter, and with a path the choice of the
+    commits `git log -- <path>` would show, are applied here, so the frontier (the queue of commits
+    the walk has reached but not visited) is followed exactly. A resumed walk doesn't know which
+    commits earlier pages visited, so it can reach one of them again through a newer parent. Those
+    commits have a commit date no older than the oldest commit visited so far: one dated exactly that
+    is recognized by its SHA (`resume` keeps them), and one dated after it, which only happens when
+    parents are dated after their children, stops the resumed walk.
 
     Args:
         repo: The Git repository object.
-        file_path: The path to the file relative to the repository's working directory.
+        start: The commits the walk starts from.
+        after: The last commit shown so far, if any.
+        resume: Optional. The previous page's frontier, the oldest commit date visited and the SHAs of
+            the commits visited with that date.
+        max_count: The maximum number of commits to return.
+        path: Optional. Only show commits touching this path.
+        author: Optional. Only show commits whose author name or email contains this string.
+        since: Optional. Only show commits more recent than this date.
 
     Returns:
-        A string containing the file's content, or an error message if the file
-        is not found or cannot be read.
+        The formatted entries and the state for the next page's cursor (None on the last page), or
+        None if the resumed walk stopped and the page has to be walked from the start.
+
+    Raises:
+        ValueError: If `after` is not in the walk.
     """
+    args = ["log", f"--format={_LOG_FORMAT}"]
+    if since:
+        args.append(f"--since={since}")
+    if path:
+        # --sparse visits the same commits (with the same history simplification) but lists them
+        # all; of those, git shows the ones changing the path (listed by --name-only) and the merges
+        # still having several parents after the simplification
+        args += ["--sparse", "--no-renames", "--root", "--name-only", "-z"]
+    if resume is None:
+        revs, min_date, ties = start, None, set()
+    else:
+        revs, min_date, ties = resume[0], resume[1], set(resume[2])
+    args += revs + ["--"] + ([path] if path else [])
+
+    entries: List[str] = []
+    frontier = dict.fromkeys(revs)
+    visited: set[str] = set()
+    has_more = False
+    stopped = False
+    last_sha = after or ""
+    found = after is None or resume is not None
+    process = _git_popen(str(repo.working_dir), args)
+    try:
+        assert process.stdout is not None
+        for record in _iter_git_records(process.stdout, b"\x1e"):
+            fields = record.decode("utf-8", errors="replace").split("\x1f", 7)
+            if len(fields) != 8:
+                continue
+            sha, parents, commit_time, author_name, author_email, date, message, names = fields
+            parent_list = parents.split()
+            timestamp = int(commit_time)
+            if resume is not None and min_date is not None:
+                if timestamp > min_date:
+                    stopped = True
+                    break
+                if timestamp == min_date and sha in ties:
+                    # An earlier page visited it already; the original walk skipped it here
+                    frontier.pop(sha, None)
+                    continue
+            shown = (
+                found
+                and (not path or len(parent_list) > 1 or any(name.strip("\n") for name in names.split("\0")))
+                and (not author or author in f"{author_name} <{author_email}>")
+            )
+            if shown and len(entries) == max_count:
+                has_more = True
+                break
+            visited.add(sha)
+            frontier.pop(sha, None)
+            frontier.update(dict.fromkeys(parent for parent in parent_list if parent not in visited))
+            if min_date is None or timestamp < min_date:
+                min_date, ties = timestamp, {sha}
+            elif timestamp == min_date:
+                ties.add(sha)
+            if not found:
+                # Resume after the cursor's commit, which the same walk reaches first
+                found = sha == after
+            elif shown:
+                entries.append(_format_log_entry(sha, author_name, str(datetime.fromisoformat(date)), message))
+                last_sha = sha
+    finally:
+        _finish_git_process(process, args, stop_early=has_more or stopped)
+
+    if stopped:
+        return None
+    if not found:
+        raise ValueError(f"Invalid cursor: commit {after} is not in the history it was produced for.")
+    if not has_more:
+        return entries, None
+    state: Dict[str, Any] = {"after": last_sha}
+    if min_date is not None and len(frontier) <= _LOG_MAX_FRONTIER and len(ties) <= _LOG_MAX_FRONTIER:
+        state.update({"frontier": list(frontier), "date": min_date, "ties": sorted(ties)})
+    return entries, state
+
+def git_log_page(
+    repo: git.Repo,
+    max_count: int = 10,
+    cursor: Optional[str] = None,
+    path: Optional[str] = None,
+    author: Optional[str] = None,
+    since: Optional[str] = None,
+) -> Tuple[List[str], Optional[str]]:
+    """
+    Shows one page of the commit log, streamed from a single `git log --format` process.
+
+    The returned cursor records the walk's starting commit, the last commit shown and, normally, the
+    walk's frontier (the commits reached but not yet visited), so the next page resumes from there
+    instead of re-walking from HEAD (see `_walk_log_page`). When the frontier is too wide, or when
+    commit dates run backwards and the resumed walk can't be trusted, the page is walked from the
+    start and skips to the commit after the last one shown. Path and author queries are answered from
+    `commit_index` when it is up to date with HEAD; it returns commits in the same order as
+    `git log`, so pages from the index and from git can follow each other. Path filters keep
+    `git log -- <path>`'s history simplification.
+
+    Args:
+        repo: The Git repository object.
+        max_count: The maximum number of commits to return.
+        cursor: Optional. The cursor returned by a previous call, to fetch the next page.
+        path: Optional. Only show commits touching this path.
+        author: Optional. Only show commits whose author name or email contains this string.
+        since: Optional. Only show commits more recent than this date (any format `git log --since` accepts).
+
+    Returns:
+        A tuple of the formatted commit entries and the cursor for the next page (None on the last page).
+
+    Raises:
+        ValueError: If the cursor is invalid or was produced with different filters.
+    """
+    filters = [path, author, since]
+    after: Optional[str] = None
+    resume: Optional[Tuple[List[str], int, set[str]]] = None
+    if cursor:
+        state = _decode_cursor(cursor)
+        if state.get("filters") != filters:
+            raise ValueError("Cursor was produced with different path/author/since filters.")
+        try:
+            revs = [str(rev) for rev in state["revs"]]
+            after = state["after"]
+            if not isinstance(after, str) or not re.fullmatch(r"[0-9a-f]{40,64}", after):
+                raise ValueError(after)
+            if "frontier" in state:
+                resume = ([str(rev) for rev in state["frontier"]], int(state["date"]), {str(sha) for sha in state["ties"]})
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    else:
+        try:
+            revs = [git.SymbolicReference.dereference_recursive(repo, "HEAD")]
+        except ValueError:
+            return [], None  # No commits yet
+
+    if (path or author) and not since and len(revs) == 1:
+        rows = commit_index.query(str(repo.working_dir), revs[0], max_count + 1, after, path, author)
+        if rows is not None:
+            page = [
+                _format_log_entry(sha, author_name, str(datetime.fromisoformat(date)), message)
+                for sha, author_name, date, message in rows[:max_count]
+            ]
+            if len(rows) <= max_count:
+                return page, None
+            return page, _encode_cursor({"revs": revs, "after": rows[max_count - 1][0], "filters": filters})
+
+    result = _walk_log_page(repo, revs, after, resume, max_count, path, author, since)
+    if result is None:
+        result = _walk_log_page(repo, revs, after, None, max_count, path, author, since)
+    assert result is not None
+    entries, next_state = result
+    if next_state is None:
+        return entries, None
+    return entries, _encode_cursor({"revs": revs, **next_state, "filters": filters})
+
+def git_log(
+    repo: git.Repo,
+    max_count: int = 10,
+    cursor: Optional[str] = None,
+    path: Optional[str] = None,
+    author: Optional[str] = None,
+    since: Optional[str] = None,
+) -> list[str]:
+    """
+    Shows the commit logs for the repository.
+
+    Args:
+        repo: The Git repository object.
+        max_count: The maximum number of commits to retrieve.
+        cursor: Optional. A cursor returned by `git_log_page`, to continue from a previous page.
+        path: Optional. Only show commits touching this path.
+        author: Optional. Only show commits whose author name or email contains this string.
+        since: Optional. Only show commits more recent than this date.
+
+    Returns:
+        A list of strings, where each string represents a formatted commit entry.
+    """
+    entries, _ = git_log_page(repo, max_count, cursor, path, author, since)
+    return entries
+
+def git_create_branch(repo: git.Repo, branch_name: str, base_branch: str | None = None) -> str:
+    """
+    Creates a new branch in the repository.
+
+    Args:
+        repo: The Git repository object.
+        branch_name: The name of the new branch.
+        base_branch: Optional. The name of the branch to base the new branch on.
+                     If None, the new branch is based on the current active branch.
+
+    Returns:
+        A string indicating the successful creation of the branch.
+    """
+    if base_branch:
+        base = repo.refs[base_branch]
+    else:
+        base = repo.active_branch
+
+    repo.create_head(branch_name, base)
+    return f"Created branch '{branch_name}' from '{base.name}'"
+
+def git_checkout(repo: git.Repo, branch_name: str) -> str:
+    """
+    Switches the current branch to the specified branch.
+
+    Args:
+        repo: The Git repository object.
+        branch_name: The name of the branch to checkout.
+
+    Returns:
+        A string indicating the successful checkout of the branch.
+    """
+    repo.git.checkout(branch_name)
+    return f"Switched to branch '{branch_name}'"
+
+SHOW_MAX_FILE_BYTES = int(os.getenv("MCP_DEVTOOLS_SHOW_MAX_FILE_BYTES", str(64 * 1024)))
+SHOW_MAX_TOTAL_BYTES = int(os.getenv("MCP_DEVTOOLS_SHOW_MAX_TOTAL_BYTES", str(512 * 1024)))
+_SHOW_FORMAT = "%H%x1f%an%x1f%aI%x1f%B%x1e"
+
+def git_show(
+    repo: git.Repo,
+    revision: str,
+    paths: Optional[List[str]] = None,
+    stat_only: bool = False,
+    max_file_bytes: Optional[int] = None,
+    max_total_bytes: Optional[int] = None,
+) -> str:
+    """
+    Shows the contents (metadata and diff) of a specific commit.
+
+    The output comes from a single `git show -M -C` process (merges are diffed against their first
+    parent), read as it is produced. A file's patch is cut off after `max_file_bytes`, and reading
+    stops after `max_total_bytes`, each with a marker saying what was left out.
+    Results are cached in `result_cache` by commit SHA and options, since a commit never changes.
+
+    Args:
+        repo: The Git repository object.
+        revision: The commit hash or reference to show.
+        paths: Optional. Only show changes to these pathspecs.
+        stat_only: If True, show a `--stat` summary instead of the patch.
+        max_file_bytes: Optional. The maximum patch bytes shown per file.
+        max_total_bytes: Optional. The maximum diff bytes shown in total.
+
+    Returns:
+        A string containing the commit details and its diff.
+    """
+    max_file_bytes = SHOW_MAX_FILE_BYTES if max_file_bytes is None else max_file_bytes
+    max_total_bytes = SHOW_MAX_TOTAL_BYTES if max_total_bytes is None else max_total_bytes
+    commit = repo.commit(revision)
+    key = (
+        "show", _repo_key(str(repo.working_dir)), commit.hexsha,
+        json.dumps([paths, stat_only, max_file_bytes, max_total_bytes]),
+    )
+    cached = result_cache.get(key)
+    if cached is not None:
+        return cached
+
+    args = [
+        "show", "--no-color", "-M", "-C", "--diff-merges=first-parent", f"--format={_SHOW_FORMAT}",
+        *(["--stat"] if stat_only else []), commit.hexsha, "--", *(paths or []),
+    ]
+    process = _git_popen(str(repo.working_dir), args)
+    assert process.stdout is not None
+    output: List[str] = []
+    stop_early = False
+    try:
+        header = b""
+        for line in process.stdout:
+            header += line
+            if b"\x1e" in line:
+                break
+        header_text = header.decode("utf-8", errors="replace").partition("\x1e")[0]
+        sha, author, date, message = header_text.split("\x1f", 3)
+        output.append(
+            f"Commit: {sha}\n"
+            f"Author: {author}\n"
+            f"Date: {datetime.fromisoformat(date)}\n"
+            f"Message: {message}\n"
+        )
+
+        total = 0
+        file_bytes = 0
+        file_skipped = 0
+        files_seen = 0
+        in_hunks = False
+
+        def end_file() -> None:
+            if file_skipped:
+                output.append(f"[... {file_skipped} more bytes of this file's diff truncated ...]\n")
+
+        for raw in process.stdout:
+            line = raw.decode("utf-8", errors="replace")
+            if not output[1:] and not line.strip():
+                continue  # Blank lines between the header and the diff
+            if line.startswith("diff --git "):
+                end_file()
+                file_bytes = file_skipped = 0
+                files_seen += 1
+                in_hunks = False
+            elif line.startswith("@@"):
+                in_hunks = True
+            # A file's header lines (paths, rename/copy info, modes) are always kept
+            if in_hunks and file_bytes + len(raw) > max_file_bytes and not stat_only:
+                file_skipped += len(raw)
+                continue
+            if total + len(raw) > max_total_bytes:
+                end_file()
+                output.append(
+                    f"[... output truncated after {total} bytes ({files_seen} files started); "
+                    "use paths or stat_only to see the rest ...]\n"
+                )
+                stop_early = True
+                break
+            if len(output) == 1:
+                output.append("\n")
+            output.append(line)
+            file_bytes += len(raw)
+            total += len(raw)
+        else:
+            end_file()
+    finally:
+        _finish_git_process(process, args, stop_early)
+    result = "".join(output)
+    result_cache.put(key, result)
+    return result
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+class PatchHunk:
+    """
+    One hunk of a unified diff: its header ranges and its ' ', '-', '+' and '\\' lines.
+    """
+    __slots__ = ("old_start", "old_count", "new_start", "new_count", "lines")
+
+    def __init__(self, old_start: int, old_count: int, new_start: int, new_count: int):
+        self.old_start = old_start
+        self.old_count = old_count
+        self.new_start = new_start
+        self.new_count = new_count
+        self.lines: List[str] = []
+
+class PatchFile:
+    """
+    The changes a unified diff makes to one file. `old_path` is None for new files and
+    `new_path` is None for deleted files.
+    """
+    __slots__ = ("old_path", "new_path", "hunks", "binary")
+
+    def __init__(self, old_path: Optional[str], new_path: Optional[str]):
+        self.old_path = old_path
+        self.new_path = new_path
+        self.hunks: List[PatchHunk] = []
+        self.binary = False
+
+    @property
+    def path(self) -> str:
+        return self.new_path or self.old_path or ""
+
+def _patch_path(raw: str) -> Optional[str]:
+    path = raw.rstrip("\r\n").split("\t", 1)[0].strip()
+    if path.startswith('"') and path.endswith('"') and len(path) > 1:
+        # git quotes unusual names C-style, with octal escapes for non-ASCII bytes
+        with suppress(UnicodeError):
+            path = path[1:-1].encode("utf-8").decode("unicode_escape").encode("latin-1").decode("utf-8")
+    if path == "/dev/null":
+        return None
+    if path.startswith(("a/", "b/")):
+        path = path[2:]
+    return path
+
+def _parse_patch(diff_content: str) -> List[PatchFile]:
+    """
+    Parses a unified diff (plain or git-style) into per-file hunks, in a single pass.
+
+    Args:
+        diff_content: The diff text.
+
+    Returns:
+        The files changed by the diff, in order. Text outside file sections is ignored.
+    """
+    files: List[PatchFile] = []
+    current: Optional[PatchFile] = None
+    hunk: Optional[PatchHunk] = None
+    old_left = new_left = 0
+    seen_old_header = False
+    for line in diff_content.splitlines(keepends=True):
+        if hunk is not None and (old_left > 0 or new_left > 0 or line.startswith("\\")):
+            if line.startswith("\\"):
+                hunk.lines.append(line)
+                continue
+            if line[:1] in (" ", "-", "+") or line in ("\n", "\r\n"):
+                if line in ("\n", "\r\n"):
+                    line = " " + line  # Some editors strip the space of empty context lines
+                hunk.lines.append(line)
+                if line[0] != "+":
+                    old_left -= 1
+                if line[0] != "-":
+                    new_left -= 1
+                continue
+        hunk = None
+        if line.startswith("diff --git "):
+            old, _, new = line[len("diff --git "):].rstrip("\r\n").rpartition(" b/")
+            current = PatchFile(_patch_path(old), new or None)
+            files.append(current)
+            seen_old_header = False
+        elif line.startswith("--- "):
+            if current is None or current.hunks or seen_old_header:
+                current = PatchFile(None, None)
+                files.append(current)
+            current.old_path = _patch_path(line[4:])
+            seen_old_header = True
+        elif line.startswith("+++ ") and current is not None:
+            current.new_path = _patch_path(line[4:])
+        elif current is not None and line.startswith("rename from "):
+            current.old_path = line[len("rename from "):].rstrip("\r\n")
+        elif current is not None and line.startswith("rename to "):
+            current.new_path = line[len("rename to "):].rstrip("\r\n")
+        elif current is not None and line.startswith("new file mode"):
+            current.old_path = None
+        elif current is not None and line.startswith("deleted file mode"):
+            current.new_path = None
+        elif current is not None and (line.startswith("Binary files ") or line.startswith("GIT binary patch")):
+            current.binary = True
+        elif current is not None and (match := _HUNK_HEADER.match(line)):
+            old_start, old_count, new_start, new_count = match.groups()
+            hunk = PatchHunk(
+                int(old_start), 1 if old_count is None else int(old_count),
+                int(new_start), 1 if new_count is None else int(new_count),
+            )
+            current.hunks.append(hunk)
+            old_left, new_left = hunk.old_count, hunk.new_count
+    return [f for f in files if f.old_path or f.new_path]
+
+def _read_text_or_none(path: Path) -> Optional[str]:
+    try:
+        return path.read_text(encoding="utf-8", errors="replace")
+    except (FileNotFoundError, IsADirectoryError):
+        return None
+
+def _decode_patch_target(data: bytes, label: str) -> str:
+    """
+    Decodes a file for the fuzzy hunk applier, which must write back exactly what it read.
+
+    Raises:
+        PatchApplyError: If the content is not valid UTF-8.
+    """
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise PatchApplyError(
+            f"{label}: the file is not valid UTF-8 (byte {e.start}), so it can only be patched by git apply"
+        ) from e
+
+def _read_patch_target(path: Path, label: str) -> Optional[str]:
+    """
+    Reads a file for the fuzzy hunk applier, keeping its line endings.
+
+    Returns:
+        The content, or None if the file doesn't exist.
+
+    Raises:
+        PatchApplyError: If the content is not valid UTF-8.
+    """
+    try:
+        data = path.read_bytes()
+    except (FileNotFoundError, IsADirectoryError):
+        return None
+    return _decode_patch_target(data, label)
+
+PATCH_FUZZ_WINDOW = int(os.getenv("MCP_DEVTOOLS_PATCH_FUZZ_WINDOW", "200"))
+PATCH_MAX_FUZZ = int(os.getenv("MCP_DEVTOOLS_PATCH_MAX_FUZZ", "2"))
+
+class PatchApplyError(Exception):
+    """
+    Raised when the fuzzy hunk applier cannot place a hunk.
+    """
+
+def _normalize_whitespace(line: str) -> str:
+    return " ".join(line.split())
+
+def _hunk_lines(hunk: PatchHunk) -> List[Tuple[str, str]]:
+    """
+    Returns a hunk's lines as (tag, text) pairs, with '\\ No newline at end of file' markers
+    folded into the preceding line.
+    """
+    lines: List[Tuple[str, str]] = []
+    for line in hunk.lines:
+        if line.startswith("\\"):
+            if lines:
+                tag, text = lines[-1]
+                lines[-1] = (tag, text.rstrip("\r\n"))
+            continue
+        lines.append((line[0], line[1:]))
+    return lines
+
+def _find_hunk(
+    file_lines: List[str], old: List[str], expected: int, window: int, ignore_whitespace: bool
+) -> Optional[int]:
+    """
+    Finds where a hunk's old lines occur in a file, searching outwards from the expected line.
+
+    Returns:
+        The 0-based line index of the match closest to `expected`, or None.
+    """
+    def key(line: str) -> str:
+        line = line.rstrip("\r\n")
+        return _normalize_whitespace(line) if ignore_whitespace else line
+
+    wanted = [key(line) for line in old]
+    last_start = len(file_lines) - len(wanted)
+    if last_start < 0:
+        return None
+    for distance in range(window + 1):
+        for start in ((expected,) if distance == 0 else (expected - distance, expected + distance)):
+            if 0 <= start <= last_start and all(
+                key(file_lines[start + i]) == wanted[i] for i in range(len(wanted))
+            ):
+                return start
+    return None
+
+def _apply_hunks(content: str, hunks: List[PatchHunk], window: int, max_fuzz: int) -> Tuple[str, List[str]]:
+    """
+    Applies hunks to a file's content, tolerating drifted line numbers, whitespace differences and
+    (with fuzz) mismatched outer context lines, in the manner of GNU patch.
+
+    Args:
+        content: The file's current content.
+        hunks: The hunks to apply, in order.
+        window: How many lines around the expected position are searched.
+        max_fuzz: The maximum number of leading/trailing context lines that may be ignored.
+
+    Returns:
+        A tuple of the new content and a note for each hunk that needed an offset, fuzz or
+        whitespace tolerance.
+
+    Raises:
+        PatchApplyError: If a hunk cannot be placed.
+    """
+    file_lines = content.splitlines(keepends=True)
+    notes: List[str] = []
+    delta = 0
+    for number, hunk in enumerate(hunks, 1):
+        lines = _hunk_lines(hunk)
+        expected = max(hunk.old_start - 1 if hunk.old_count else hunk.old_start, 0) + delta
+        placed = None
+        for fuzz in range(max_fuzz + 1):
+            lead = 0
+            while lead < fuzz and lead < len(lines) and lines[lead][0] == " ":
+                lead += 1
+            trail = 0
+            while trail < fuzz and trail < len(lines) - lead and lines[len(lines) - 1 - trail][0] == " ":
+                trail += 1
+            if fuzz and lead + trail == 0:
+                break
+            trimmed = lines[lead:len(lines) - trail]
+            old = [text for tag, text in trimmed if tag != "+"]
+            for ignore_whitespace in (False, True):
+                start = _find_hunk(file_lines, old, expected + lead, window, ignore_whitespace)
+                if start is not None:
+                    placed = (start, trimmed, fuzz, ignore_whitespace)
+                    break
+            if placed is not None:
+                break
+        if placed is None:
+            raise PatchApplyError(f"hunk #{number} (@@ -{hunk.old_start},{hunk.old_count} @@): context not found within {window} lines")
+        start, trimmed, fuzz, ignore_whitespace = placed
+        replacement: List[str] = []
+        cursor = start
+        for tag, text in trimmed:
+            if tag == " ":
+                replacement.append(file_lines[cursor])  # Keep the file's own version of context lines
+                cursor += 1
+            elif tag == "-":
+                cursor += 1
+            else:
+                replacement.append(text)
+        for i in range(len(replacement) - 1):
+            if not replacement[i].endswith("\n"):
+                replacement[i] += "\n"
+        if replacement and cursor < len(file_lines) and not replacement[-1].endswith("\n"):
+            replacement[-1] += "\n"
+        if start > 0 and not file_lines[start - 1].endswith("\n") and replacement:
+            file_lines[start - 1] += "\n"
+        file_lines[start:cursor] = replacement
+        offset = start - (expected + lead)
+        delta += len(replacement) - (cursor - start)
+        if offset or fuzz or ignore_whitespace:
+            details = [f"offset {offset:+d} lines"] if offset else []
+            if fuzz:
+                details.append(f"fuzz {fuzz}")
+            if ignore_whitespace:
+                details.append("whitespace ignored")
+            notes.append(f"hunk #{number} applied with {', '.join(details)}")
+    return "".join(file_lines), notes
+
+def _merge_file(current: str, base: str, patched: str) -> Tuple[str, int]:
+    """
+    Three-way merges a patched base version into the current content with `git merge-file`.
+
+    Returns:
+        A tuple of the merged content and the number of conflicts (marked in the content).
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        names = []
+        for name, text in (("current", current), ("base", base), ("patched", patched)):
+            path = os.path.join(tmpdir, name)
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                f.write(text)
+            names.append(path)
+        result = subprocess.run(
+            ["git", "merge-file", "-p", "-L", "current", "-L", "index", "-L", "patch", *names],
+            capture_output=True,
+        )
+    if result.returncode < 0 or result.returncode > 127:
+        raise PatchApplyError(f"git merge-file failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+    return result.stdout.decode("utf-8", "replace"), result.returncode
+
+def _patch_target(working_dir: Path, path: str, label: str) -> Path:
+    """
+    Resolves a path named by a patch inside the working directory.
+
+    Raises:
+        PatchApplyError: If the path (after following `..` and symlinks) is outside the working tree
+            or inside `.git`.
+    """
+    root = working_dir.resolve()
+    target = (root / path).resolve()
+    if Path(path).is_absolute() or root not in target.parents or target.relative_to(root).parts[0] == ".git":
+        raise PatchApplyError(f"{label}: {path!r} is outside the working tree")
+    return target
+
+def _fuzzy_apply_patch(working_dir: Path, patch_files: List[PatchFile], write: bool = True) -> Tuple[List[str], int]:
+    """
+    Applies a parsed patch with the built-in hunk applier, for patches `git apply` rejected.
+
+    Each file's hunks are placed with `_apply_hunks`. If a file's hunks don't fit its working tree
+    content, they are applied to the file's staged (index) version instead and the result is
+    three-way merged into the working tree content. Files are read and written as exact UTF-8 (files
+    that aren't valid UTF-8 are refused), and nothing is written unless every file succeeds; the
+    results are then written together through `_atomic_write_many`. Every path is checked to be
+    inside the working tree (`_patch_target`) before anything is read.
+
+    Args:
+        working_dir: The repository's working directory.
+        patch_files: The parsed patch.
+        write: If False, only check that the patch can be applied.
+
+    Returns:
+        Notes describing the offsets, fuzz, whitespace tolerance and merges that were needed, and the
+        number of merge conflicts marked in the files.
+
+    Raises:
+        PatchApplyError: If a file cannot be patched or a path is outside the working tree.
+    """
+    targets = {
+        path: _patch_target(working_dir, path, patch_file.path)
+        for patch_file in patch_files
+        for path in (patch_file.old_path, patch_file.new_path, patch_file.path)
+        if path is not None
+    }
+    results: List[Tuple[PatchFile, Optional[str]]] = []
+    notes: List[str] = []
+    total_conflicts = 0
+    for patch_file in patch_files:
+        label = patch_file.path
+        if patch_file.binary:
+            raise PatchApplyError(f"{label}: binary patches can only be applied by git apply")
+        if patch_file.old_path is None:
+            if targets[patch_file.path].exists():
+                raise PatchApplyError(f"{label}: file already exists")
+            current = ""
+        else:
+            current_or_none = _read_patch_target(targets[patch_file.old_path], label)
+            if current_or_none is None:
+                raise PatchApplyError(f"{label}: file does not exist")
+            current = current_or_none
+        try:
+            new_content, file_notes = _apply_hunks(current, patch_file.hunks, PATCH_FUZZ_WINDOW, PATCH_MAX_FUZZ)
+        except PatchApplyError as e:
+            if patch_file.old_path is None:
+                raise PatchApplyError(f"{label}: {e}") from e
+            try:
+                base = _decode_patch_target(blob_store.read(working_dir, "", patch_file.old_path), f"{label} (staged version)")
+                patched, file_notes = _apply_hunks(base, patch_file.hunks, PATCH_FUZZ_WINDOW, PATCH_MAX_FUZZ)
+            except (FileNotFoundError, PatchApplyError):
+                raise PatchApplyError(f"{label}: {e}, and the patch does not apply to the staged version either") from e
+            new_content, conflicts = _merge_file(current, base, patched)
+            total_conflicts += conflicts
+            file_notes.append(
+                f"three-way merged with the staged version ({conflicts} conflict(s) marked in the file)"
+                if conflicts else "three-way merged with the staged version"
+            )
+        if patch_file.new_path is None and new_content.strip():
+            raise PatchApplyError(f"{label}: file is not empty after removing the deleted lines")
+        results.append((patch_file, None if patch_file.new_path is None else new_content))
+        notes += [f"{label}: {note}" for note in file_notes]
+    if write:
+        _atomic_write_many({
+            targets[patch_file.path]: result.encode("utf-8") for patch_file, result in results if result is not None
+        })
+        for patch_file, result in results:
+            if result is None:
+                os.remove(targets[patch_file.path])
+            elif patch_file.old_path and patch_file.old_path != patch_file.new_path:
+                with suppress(FileNotFoundError):
+                    os.remove(targets[patch_file.old_path])
+    return notes, total_conflicts
+
+async def _run_git_apply(repo_path: str, diff_content: str, *options: str) -> str:
+    """
+    Runs `git apply` with the patch fed through stdin.
+
+    Args:
+        repo_path: The path to the repository's working directory.
+        diff_content: The patch.
+        *options: Extra `git apply` options.
+
+    Returns:
+        The command's stdout.
+
+    Raises:
+        GitCommandError: If `git apply` fails.
+    """
+    command = ["git", "apply", "--whitespace=fix", "--allow-overlap", *options, "-"]
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        cwd=repo_path,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await process.communicate(diff_content.encode("utf-8"))
+    if process.returncode != 0:
+        raise GitCommandError(command, process.returncode, stderr.decode("utf-8", "replace").strip())
+    return stdout.decode("utf-8", "replace")
+
+class _FuzzyApplyFailed(Exception):
+    def __init__(self, git_error: GitCommandError, reason: PatchApplyError):
+        super().__init__(str(reason))
+        self.git_error = git_error
+        self.reason = reason
+
+async def _fuzzy_apply_fallback(
+    working_dir: Path, patch_files: List[PatchFile], git_error: GitCommandError, write: bool
+) -> Tuple[List[str], int]:
+    try:
+        return await asyncio.to_thread(_fuzzy_apply_patch, working_dir, patch_files, write)
+    except PatchApplyError as e:
+        raise _FuzzyApplyFailed(git_error, e) from e
+
+def _format_fuzzy_notes(notes: List[str]) -> str:
+    if not notes:
+        return "\nAll hunks matched exactly."
+    return "".join(f"\n- {note}" for note in notes)
+
+async def git_apply_diff(repo: git.Repo, diff_content: str, dry_run: bool = False) -> str:
+    """
+    Applies a given diff content to the working directory of the repository.
+    The diff is parsed once into per-file hunks and fed to `git apply` through stdin. If git rejects
+    it, the built-in fuzzy hunk applier (`_fuzzy_apply_patch`) is tried, and the offset, fuzz and
+    merges it needed are reported; a merge that left conflicts is reported as `MERGE_CONFLICT`.
+    Diffs naming paths outside the working tree are refused. Afterwards a diff is generated for every touched file
+    (concurrently), and the post-edit validators are run once for all of them (`_run_validators`).
+
+    Args:
+        repo: The Git repository object.
+        diff_content: The diff string to apply.
+        dry_run: If True, only check that the diff applies and summarize it, without changing files.
+
+    Returns:
+        A string indicating the result of the diff application, including
+        the new diff of each touched file and validator output if applicable, or an error message.
+    """
+    try:
+        patch_files = _parse_patch(diff_content)
+        if not patch_files:
+            return "INVALID_DIFF: Error applying diff: no file changes were found in the diff content. AI_HINT: Provide a unified diff with '--- a/<path>' and '+++ b/<path>' headers followed by '@@' hunks."
+        working_dir = Path(repo.working_dir)
+        try:
+            for patch_file in patch_files:
+                for path in (patch_file.old_path, patch_file.new_path):
+                    if path is not None:
+                        _patch_target(working_dir, path, patch_file.path)
+        except PatchApplyError as e:
+            return f"INVALID_DIFF: Error applying diff: {e}. AI_HINT: Diff paths must be relative to the repository root and stay inside the working tree."
+
+        fuzzy_notes: Optional[List[str]] = None
+        conflicts = 0
+        if dry_run:
+            try:
+                await _run_git_apply(str(working_dir), diff_content, "--check")
+            except GitCommandError as gce:
+                fuzzy_notes, conflicts = await _fuzzy_apply_fallback(working_dir, patch_files, gce, write=False)
+            summary = []
+            for patch_file in patch_files:
+                added = sum(1 for h in patch_file.hunks for line in h.lines if line.startswith("+"))
+                removed = sum(1 for h in patch_file.hunks for line in h.lines if line.startswith("-"))
+                action = "create" if patch_file.old_path is None else "delete" if patch_file.new_path is None else "modify"
+                if patch_file.old_path and patch_file.new_path and patch_file.old_path != patch_file.new_path:
+                    action = f"rename from {patch_file.old_path}"
+                summary.append(f"\n{patch_file.path}: {action}, {len(patch_file.hunks)} hunk(s), +{added} -{removed}")
+            if conflicts:
+                return f"MERGE_CONFLICT: Dry run: the diff applies only with {conflicts} merge conflict(s) (no files were changed)." + "".join(summary) + _format_fuzzy_notes(fuzzy_notes or [])
+            if fuzzy_notes is not None:
+                return "Dry run: diff applies with the fuzzy hunk applier (no files were changed)" + "".join(summary) + _format_fuzzy_notes(fuzzy_notes)
+            return "Dry run: diff applies cleanly (no files were changed)" + "".join(summary)
+
+        originals = await asyncio.gather(*(
+            asyncio.to_thread(_read_text_or_none, working_dir / f.old_path) if f.old_path else asyncio.sleep(0, None)
+            for f in patch_files
+        ))
+        try:
+            await _run_git_apply(str(working_dir), diff_content)
+        except GitCommandError as gce:
+            fuzzy_notes, conflicts = await _fuzzy_apply_fallback(working_dir, patch_files, gce, write=True)
+
+        async def report(patch_file: PatchFile, original: Optional[str]) -> str:
+            if patch_file.new_path is None:
+                return f"\nDeleted {patch_file.old_path}."
+            new_content = await asyncio.to_thread(_read_text_or_none, working_dir / patch_file.new_path)
+            return await _generate_diff_output(original or "", new_content or "", patch_file.new_path)
+
+        reports = await asyncio.gather(*(report(f, original) for f, original in zip(patch_files, originals)))
+        _writes_finished(working_dir)
+        validation = await _validate_after_edit(
+            str(working_dir), [f.new_path for f in patch_files if f.new_path is not None]
+        )
+        if conflicts:
+            return (
+                f"MERGE_CONFLICT: The diff was applied with {conflicts} merge conflict(s), marked in the files below. "
+                "AI_HINT: Resolve the '<<<<<<< current' / '>>>>>>> patch' sections before continuing."
+                + _format_fuzzy_notes(fuzzy_notes or []) + "".join(reports) + validation
+            )
+        if fuzzy_notes is not None:
+            return "Diff applied successfully with the fuzzy hunk applier" + _format_fuzzy_notes(fuzzy_notes) + "".join(reports) + validation
+        return "Diff applied successfully" + "".join(reports) + validation
+    except _FuzzyApplyFailed as failure:
+        return f"GIT_COMMAND_FAILED: Failed to apply diff. Details: {failure.git_error.stderr}. AI_HINT: Check if the diff is valid and applies cleanly to the current state of the repository. The fuzzy hunk applier also failed: {failure.reason}."
+    except GitCommandError as gce:
+        return f"GIT_COMMAND_FAILED: Failed to apply diff. Details: {gce.stderr}. AI_HINT: Check if the diff is valid and applies cleanly to the current state of the repository."
+    except Exception as e:
+        return f"UNEXPECTED_ERROR: An unexpected error occurred while applying diff: {e}. AI_HINT: Check the server logs for more details or review your input."
+
+def git_read_file(repo: git.Repo, file_path: str, revision: Optional[str] = None) -> str:
+    """
+    Reads the content of a specified file within the repository.
+    When a revision is given, the file is read from that revision through the shared `blob_store`
+    instead of the working directory.
+
+    Args:
+        repo: The Git repository object.
+        file_path: The path to the file relative to the repository's working directory.
+        revision: Optional. The commit hash or reference to read the file at.
+
+    Returns:
+        A string containing the file's content, or an error message if the file
+        is not found or cannot be read.
+    """
+    if revision:
+        try:
+            content_bytes = blob_store.read(str(repo.working_dir), revision, file_path)
+            return f"Content of {file_path} at {revision}:\n{content_bytes.decode('utf-8', errors='replace')}"
+        except FileNotFoundError:
+            return f"Error: file wasn't found at revision {revision}: {file_path}"
+        except Exception as e:
+            return f"UNEXPECTED_ERROR: Failed to read file '{file_path}' at revision '{revision}': {e}. AI_HINT: Check that the revision exists and the path is relative to the repository root. Review server logs for more details."
     try:
         full_path = Path(repo.working_dir) / file_path
         with open(full_path, 'r') as f:
@@ -687,290 +4089,2195 @@ def git_read_file(repo: git.Repo, file_path: str) -> str:
     except FileNotFoundError:
         return f"Error: file wasn't found or out of cwd: {file_path}"
     except Exception as e:
-        return f"UNEXPECTED_ERROR: Failed to read file '{file_path}': {e}. AI_HINT: Check if the file exists, is accessible, and not corrupted. Review server logs for more details."
+        return f"UNEXPECTED_ERROR: Failed to read file '{file_path}': {e}. AI_HINT: Check if the file exists, is accessible, and not corrupted. Review server logs for more details."
+
+DIFF_TIME_BUDGET = float(os.getenv("MCP_DEVTOOLS_DIFF_TIME_BUDGET", "1"))
+DIFF_MAX_LINES = 1000
+_HISTOGRAM_MAX_CHAIN = 64
+_SMALL_REGION_CELLS = 250_000
+
+def _unique_line_anchors(
+    a_ids: List[int], b_ids: List[int], positions: Dict[int, List[int]], blo: int, bhi: int
+) -> List[Tuple[int, int]]:
+    """
+    Finds the longest increasing sequence of lines that occur exactly once in both regions.
+
+    Args:
+        a_ids: The interned original lines.
+        b_ids: The interned new lines.
+        positions: The positions of each line in the original region.
+        blo: The start of the new region.
+        bhi: The end of the new region.
+
+    Returns:
+        `(i, j)` pairs of matching unique lines, increasing in both `i` and `j`.
+    """
+    b_counts: Dict[int, int] = {}
+    for j in range(blo, bhi):
+        b_counts[b_ids[j]] = b_counts.get(b_ids[j], 0) + 1
+    pairs = [
+        (positions[line][0], j)
+        for j in range(blo, bhi)
+        if b_counts[line := b_ids[j]] == 1 and len(positions.get(line, ())) == 1
+    ]
+    if not pairs:
+        return []
+    # Patience sorting: tails[k] is the index in pairs ending the best sequence of length k + 1
+    tails: List[int] = []
+    tail_values: List[int] = []
+    previous = [-1] * len(pairs)
+    for index, (i, _) in enumerate(pairs):
+        k = bisect.bisect_left(tail_values, i)
+        if k:
+            previous[index] = tails[k - 1]
+        if k == len(tails):
+            tails.append(index)
+            tail_values.append(i)
+        else:
+            tails[k] = index
+            tail_values[k] = i
+    sequence = []
+    index = tails[-1]
+    while index != -1:
+        sequence.append(pairs[index])
+        index = previous[index]
+    sequence.reverse()
+    return sequence
+
+def _diff_matching_blocks(a: Sequence[str], b: Sequence[str], time_budget: float) -> List[Tuple[int, int, int]]:
+    """
+    Finds the lines two sequences have in common with a histogram diff, the algorithm behind
+    `git diff --histogram`, combined with patience-diff anchoring.
+
+    Lines are interned to integers first, so every comparison is an integer comparison. Each region
+    is trimmed of its common prefix and suffix, then split at every line that is unique on both sides
+    (as a patience diff does) or, if there is none, around the longest run of matching lines that
+    contains the region's least frequent common line; the pieces are processed the same way.
+    Small regions without a usable anchor are handed to `difflib.SequenceMatcher`. Once
+    `time_budget` seconds have passed, remaining regions are reported as replaced wholesale, which
+    keeps the diff correct but less minimal.
+
+    Args:
+        a: The original lines.
+        b: The new lines.
+        time_budget: Seconds after which the remaining regions are no longer refined.
+
+    Returns:
+        Sorted `(i, j, n)` triples meaning `a[i:i+n] == b[j:j+n]`, as in `SequenceMatcher.get_matching_blocks`
+        (without the final sentinel).
+    """
+    ids: Dict[str, int] = {}
+    a_ids = [ids.setdefault(line, len(ids)) for line in a]
+    b_ids = [ids.setdefault(line, len(ids)) for line in b]
+    deadline = time.monotonic() + time_budget
+    blocks: List[Tuple[int, int, int]] = []
+    regions = [(0, len(a_ids), 0, len(b_ids))]
+    while regions:
+        alo, ahi, blo, bhi = regions.pop()
+        start_a, start_b = alo, blo
+        while alo < ahi and blo < bhi and a_ids[alo] == b_ids[blo]:
+            alo += 1
+            blo += 1
+        if alo > start_a:
+            blocks.append((start_a, start_b, alo - start_a))
+        end_a = ahi
+        while alo < ahi and blo < bhi and a_ids[ahi - 1] == b_ids[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+        if ahi < end_a:
+            blocks.append((ahi, bhi, end_a - ahi))
+        if alo == ahi or blo == bhi or time.monotonic() > deadline:
+            continue
+
+        positions: Dict[int, List[int]] = {}
+        for i in range(alo, ahi):
+            positions.setdefault(a_ids[i], []).append(i)
+        anchors = _unique_line_anchors(a_ids, b_ids, positions, blo, bhi)
+        if anchors:
+            # Split at every line that is unique on both sides at once, as a patience diff does
+            previous_i, previous_j = alo, blo
+            for i, j in anchors:
+                blocks.append((i, j, 1))
+                regions.append((previous_i, i, previous_j, j))
+                previous_i, previous_j = i + 1, j + 1
+            regions.append((previous_i, ahi, previous_j, bhi))
+            continue
+
+        best: Optional[Tuple[int, int, int]] = None
+        best_count = _HISTOGRAM_MAX_CHAIN + 1
+        j = blo
+        while j < bhi:
+            occurrences = positions.get(b_ids[j])
+            next_j = j + 1
+            if occurrences is not None and len(occurrences) <= best_count:
+                for i in occurrences:
+                    start_i, start_j = i, j
+                    while start_i > alo and start_j > blo and a_ids[start_i - 1] == b_ids[start_j - 1]:
+                        start_i -= 1
+                        start_j -= 1
+                    end_i, end_j = i + 1, j + 1
+                    while end_i < ahi and end_j < bhi and a_ids[end_i] == b_ids[end_j]:
+                        end_i += 1
+                        end_j += 1
+                    length = end_i - start_i
+                    if best is None or length > best[2] or (length == best[2] and len(occurrences) < best_count):
+                        best = (start_i, start_j, length)
+                        best_count = len(occurrences)
+                    next_j = max(next_j, end_j)
+            j = next_j
+
+        if best is not None:
+            i, j, length = best
+            blocks.append(best)
+            regions.append((alo, i, blo, j))
+            regions.append((i + length, ahi, j + length, bhi))
+        elif (ahi - alo) * (bhi - blo) <= _SMALL_REGION_CELLS:
+            matcher = difflib.SequenceMatcher(None, a_ids[alo:ahi], b_ids[blo:bhi], autojunk=False)
+            blocks.extend((alo + i, blo + j, n) for i, j, n in matcher.get_matching_blocks() if n)
+    blocks.sort()
+    merged: List[Tuple[int, int, int]] = []
+    for i, j, n in blocks:
+        if merged and merged[-1][0] + merged[-1][2] == i and merged[-1][1] + merged[-1][2] == j:
+            merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + n)
+        else:
+            merged.append((i, j, n))
+    return merged
+
+def _diff_opcodes(a: Sequence[str], b: Sequence[str], time_budget: float = DIFF_TIME_BUDGET) -> List[Tuple[str, int, int, int, int]]:
+    """
+    Computes `SequenceMatcher.get_opcodes`-style opcodes with `_diff_matching_blocks`.
+
+    Args:
+        a: The original lines.
+        b: The new lines.
+        time_budget: See `_diff_matching_blocks`.
+
+    Returns:
+        `(tag, i1, i2, j1, j2)` tuples with tags `equal`, `replace`, `delete` and `insert`.
+    """
+    opcodes: List[Tuple[str, int, int, int, int]] = []
+    i = j = 0
+    for ai, bj, size in [*_diff_matching_blocks(a, b, time_budget), (len(a), len(b), 0)]:
+        if i < ai or j < bj:
+            tag = "replace" if i < ai and j < bj else "delete" if i < ai else "insert"
+            opcodes.append((tag, i, ai, j, bj))
+        if size:
+            opcodes.append(("equal", ai, ai + size, bj, bj + size))
+        i, j = ai + size, bj + size
+    return opcodes
+
+def _group_opcodes(opcodes: List[Tuple[str, int, int, int, int]], context: int) -> List[List[Tuple[str, int, int, int, int]]]:
+    """
+    Groups opcodes into hunks with `context` lines of context, as `SequenceMatcher.get_grouped_opcodes` does.
+
+    Args:
+        opcodes: The opcodes from `_diff_opcodes`.
+        context: The number of context lines around each change.
+
+    Returns:
+        The opcodes of each hunk; empty if the sequences are equal.
+    """
+    if not opcodes or (len(opcodes) == 1 and opcodes[0][0] == "equal"):
+        return []
+    codes = list(opcodes)
+    tag, i1, i2, j1, j2 = codes[0]
+    if tag == "equal":
+        codes[0] = (tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2)
+    tag, i1, i2, j1, j2 = codes[-1]
+    if tag == "equal":
+        codes[-1] = (tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context))
+    groups: List[List[Tuple[str, int, int, int, int]]] = []
+    group: List[Tuple[str, int, int, int, int]] = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > context * 2:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        groups.append(group)
+    return groups
+
+def _format_hunk_range(start: int, length: int) -> str:
+    """
+    Formats one side of a unified diff hunk header, as `difflib.unified_diff` does.
+    """
+    beginning = start + 1
+    if length == 1:
+        return str(beginning)
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+def _unified_diff(
+    original_lines: Sequence[str],
+    new_lines: Sequence[str],
+    file_path: str,
+    first_line: int = 1,
+    context: int = 3,
+    max_lines: Optional[int] = None,
+) -> Tuple[Optional[str], int, int, int]:
+    """
+    Renders a git-style unified diff with the histogram diff engine (`_diff_opcodes`).
+    Rendering stops as soon as the output would exceed `max_lines`; the hunk and line counts are
+    still computed from the opcodes, so callers can summarize a diff that is too large to show.
+
+    Args:
+        original_lines: The original lines, with their line endings.
+        new_lines: The new lines, with their line endings.
+        file_path: The path of the file, used for diff headers.
+        first_line: The line number of the first line in the file, used to number hunks.
+        context: The number of context lines around each change.
+        max_lines: Optional. The maximum number of diff lines to render.
+
+    Returns:
+        A tuple of the diff (an empty string if there are no changes, None if it exceeds `max_lines`),
+        the number of hunks, and the numbers of lines added and removed.
+    """
+    groups = _group_opcodes(_diff_opcodes(original_lines, new_lines), context)
+    added = removed = 0
+    for group in groups:
+        for tag, i1, i2, j1, j2 in group:
+            if tag != "equal":
+                removed += i2 - i1
+                added += j2 - j1
+    if not groups:
+        return "", 0, 0, 0
+
+    offset = first_line - 1
+    out = [f"--- a/{file_path}\n", f"+++ b/{file_path}\n"]
+
+    def emit(prefix: str, line: str) -> None:
+        out.append(prefix + line if line.endswith("\n") else prefix + line + "\n\\ No newline at end of file\n")
+
+    for group in groups:
+        first, last = group[0], group[-1]
+        old_range = _format_hunk_range(first[1] + offset, last[2] - first[1])
+        new_range = _format_hunk_range(first[3] + offset, last[4] - first[3])
+        out.append(f"@@ -{old_range} +{new_range} @@\n")
+        for tag, i1, i2, j1, j2 in group:
+            # Stop before rendering lines that would not be shown anyway
+            if max_lines is not None and len(out) + (i2 - i1) + (0 if tag == "equal" else j2 - j1) > max_lines:
+                return None, len(groups), added, removed
+            if tag == "equal":
+                for line in original_lines[i1:i2]:
+                    emit(" ", line)
+                continue
+            for line in original_lines[i1:i2]:
+                emit("-", line)
+            for line in new_lines[j1:j2]:
+                emit("+", line)
+    return "".join(out), len(groups), added, removed
+
+def _render_diff_output(original_content: str, new_content: str, file_path: str) -> str:
+    """
+    Builds the diff section of an edit tool's result; see `_generate_diff_output`.
+    """
+    diff_output, hunks, added, removed = _unified_diff(
+        original_content.splitlines(keepends=True),
+        new_content.splitlines(keepends=True),
+        file_path,
+        max_lines=DIFF_MAX_LINES,
+    )
+    if diff_output is None:
+        return f"\nDiff was too large (over {DIFF_MAX_LINES} lines): {hunks} hunks, +{added} -{removed} lines."
+    return f"\nDiff:\n{diff_output}" if diff_output else "\nNo changes detected (file content was identical)."
+
+async def _generate_diff_output(original_content: str, new_content: str, file_path: str) -> str:
+    """
+    Generates a unified diff string between two versions of file content, with the histogram diff
+    engine in `_unified_diff`. Diffs longer than `DIFF_MAX_LINES` lines are summarized instead.
+    Large contents are diffed on the shared `cpu_pool` so the event loop stays responsive.
+
+    Args:
+        original_content: The original content of the file.
+        new_content: The new content of the file.
+        file_path: The path of the file, used for diff headers.
+
+    Returns:
+        A string containing the unified diff, or a message indicating no changes
+        or summarizing a diff that was too large.
+    """
+    try:
+        return await cpu_pool.run(
+            _render_diff_output, original_content, new_content, file_path,
+            size=len(original_content) + len(new_content),
+        )
+    except TimeoutError:
+        return f"\nDiff was not computed: it took longer than {cpu_pool.timeout} seconds."
+
+TSSERVER = os.getenv("MCP_DEVTOOLS_TSSERVER", "auto")
+TSSERVER_IDLE_TIMEOUT = float(os.getenv("MCP_DEVTOOLS_TSSERVER_IDLE_TIMEOUT", "600"))
+TSSERVER_TIMEOUT = float(os.getenv("MCP_DEVTOOLS_TSSERVER_TIMEOUT", "120"))
+_TS_EXTENSIONS = ('.ts', '.js', '.mjs')
+
+class TsServer:
+    """
+    A long-lived `tsserver` process for one repository. The TypeScript language service keeps its
+    program between requests, so checking a file after an edit only rebuilds what changed instead of
+    starting the compiler and building the program from scratch. Requests are serialized; messages
+    are read from the process's stdout with a deadline so a hung server cannot block a tool forever.
+    """
+
+    def __init__(self, repo_path: str, command: List[str]):
+        self.repo_path = repo_path
+        self.process = subprocess.Popen(
+            command, cwd=repo_path, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.checks = 0
+        self._seq = 0
+        self._buffer = b""
+        self._open_files: set[str] = set()
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def _send(self, command: str, arguments: Dict[str, Any]) -> int:
+        self._seq += 1
+        message = {"seq": self._seq, "type": "request", "command": command, "arguments": arguments}
+        assert self.process.stdin is not None
+        self.process.stdin.write(json.dumps(message).encode("utf-8") + b"\n")
+        self.process.stdin.flush()
+        return self._seq
+
+    def _read_exactly(self, size: int, deadline: float) -> bytes:
+        assert self.process.stdout is not None
+        fd = self.process.stdout.fileno()
+        while len(self._buffer) < size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise TimeoutError("tsserver did not answer in time")
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise OSError("tsserver exited")
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def _read_message(self, deadline: float) -> Dict[str, Any]:
+        # Messages are framed as "Content-Length: N\r\n\r\n" followed by N bytes of JSON
+        header = b""
+        while not header.endswith(b"\r\n\r\n"):
+            header += self._read_exactly(1, deadline)
+        match = re.search(rb"Content-Length: (\d+)", header)
+        if match is None:
+            raise OSError(f"unexpected tsserver output: {header!r}")
+        return json.loads(self._read_exactly(int(match.group(1)), deadline))
+
+    def _request(self, command: str, arguments: Dict[str, Any], deadline: float) -> Any:
+        seq = self._send(command, arguments)
+        while True:
+            message = self._read_message(deadline)
+            if message.get("type") == "response" and message.get("request_seq") == seq:
+                if not message.get("success", False):
+                    raise OSError(f"tsserver {command} failed: {message.get('message')}")
+                return message.get("body")
+
+    def diagnostics(self, file_path: str, timeout: float) -> List[str]:
+        """
+        Returns the syntactic and semantic diagnostics of one file, as re-read from disk.
+
+        Args:
+            file_path: The file, relative to the repository.
+            timeout: Seconds to wait for the diagnostics.
+
+        Returns:
+            One line per diagnostic, formatted like tsc's output.
+
+        Raises:
+            TimeoutError: If tsserver did not answer in time.
+            OSError: If tsserver exited or failed the request.
+        """
+        full_path = str(Path(self.repo_path, file_path).resolve())
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            self.last_used = time.monotonic()
+            self.checks += 1
+            # Reopening makes tsserver re-read the file from disk; the rest of the program is reused
+            if full_path in self._open_files:
+                self._send("close", {"file": full_path})
+            self._send("open", {"file": full_path})
+            self._open_files.add(full_path)
+            lines = []
+            for command in ("syntacticDiagnosticsSync", "semanticDiagnosticsSync"):
+                for diagnostic in self._request(command, {"file": full_path, "includeLinePosition": False}, deadline) or []:
+                    start = diagnostic.get("start", {})
+                    lines.append(
+                        f"{file_path}({start.get('line', 0)},{start.get('offset', 0)}): "
+                        f"{diagnostic.get('category', 'error')} TS{diagnostic.get('code', '')}: {diagnostic.get('text', '')}"
+                    )
+            return lines
+
+    def close(self) -> None:
+        """
+        Stops the tsserver process.
+        """
+        with suppress(Exception):
+            self._send("exit", {})
+        with suppress(Exception):
+            self.process.wait(timeout=2)
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+def _find_tsserver(repo_path: str) -> Optional[List[str]]:
+    """
+    Finds the tsserver command for a repository: the project's own `node_modules/.bin/tsserver`
+    first, then one on PATH, unless `MCP_DEVTOOLS_TSSERVER` names a command or is `off`.
+
+    Args:
+        repo_path: The path to the repository's working directory.
+
+    Returns:
+        The command, or None if tsserver is disabled or not installed.
+    """
+    if TSSERVER == "off":
+        return None
+    if TSSERVER != "auto":
+        return shlex.split(TSSERVER)
+    local = Path(repo_path) / "node_modules" / ".bin" / "tsserver"
+    if local.is_file():
+        return [str(local), "--disableAutomaticTypingAcquisition"]
+    found = shutil.which("tsserver")
+    return [found, "--disableAutomaticTypingAcquisition"] if found else None
+
+class TsServerPool:
+    """
+    Per-repository `TsServer`s, started on first use and stopped after `idle_timeout` seconds
+    without a check. When tsserver is unavailable or fails, callers fall back to running `tsc`.
+    """
+
+    def __init__(self, idle_timeout: float = TSSERVER_IDLE_TIMEOUT, timeout: float = TSSERVER_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._servers: Dict[str, TsServer] = {}
+        self.starts = 0
+        self.fallbacks = 0
+
+    def get(self, repo_path: str) -> Optional[TsServer]:
+        """
+        Returns the repository's running tsserver, starting it if needed.
+
+        Args:
+            repo_path: The path to the repository's working directory.
+
+        Returns:
+            The server, or None if tsserver is disabled or not installed.
+        """
+        key = _repo_key(repo_path)
+        with self._lock:
+            server = self._servers.get(key)
+            if server is not None and server.alive():
+                return server
+            command = _find_tsserver(key)
+            if command is None:
+                return None
+            try:
+                server = self._servers[key] = TsServer(key, command)
+            except OSError as e:
+                logger.warning(f"Could not start tsserver for {key}: {e}")
+                return None
+            self.starts += 1
+            return server
+
+    def discard(self, repo_path: str) -> None:
+        """
+        Stops a repository's tsserver after it failed, so the next check starts a fresh one.
+        """
+        with self._lock:
+            server = self._servers.pop(_repo_key(repo_path), None)
+        if server is not None:
+            server.close()
+
+    async def check(self, repo_path: str, file_paths: List[str]) -> Optional[str]:
+        """
+        Checks files with the repository's tsserver.
+
+        Args:
+            repo_path: The path to the repository's working directory.
+            file_paths: The files to check, relative to the repository.
+
+        Returns:
+            The diagnostics, or None if tsserver is unavailable or failed (the caller should run tsc).
+        """
+        server = self.get(repo_path)
+        if server is None:
+            return None
+
+        def run() -> List[str]:
+            return [line for path in file_paths for line in server.diagnostics(path, self.timeout)]
+
+        try:
+            lines = await asyncio.get_running_loop().run_in_executor(None, run)
+        except (OSError, ValueError) as e:
+            logger.warning(f"tsserver check failed for {repo_path}, falling back to tsc: {e}")
+            self.fallbacks += 1
+            self.discard(repo_path)
+            return None
+        return "\n".join(lines) if lines else "No errors reported by tsserver."
+
+    def close_idle(self) -> int:
+        """
+        Stops servers not used within `idle_timeout`.
+
+        Returns:
+            The number of servers stopped.
+        """
+        now = time.monotonic()
+        with self._lock:
+            idle = [key for key, server in self._servers.items() if now - server.last_used >= self.idle_timeout]
+            servers = [self._servers.pop(key) for key in idle]
+        for server in servers:
+            server.close()
+        return len(servers)
+
+    def clear(self) -> None:
+        """
+        Stops every server.
+        """
+        with self._lock:
+            servers = list(self._servers.values())
+            self._servers.clear()
+        for server in servers:
+            server.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the pool's counters and each repository's server state.
+        """
+        with self._lock:
+            return {
+                "starts": self.starts,
+                "fallbacks": self.fallbacks,
+                "servers": {
+                    key: {"pid": server.process.pid, "checks": server.checks, "open_files": len(server._open_files)}
+                    for key, server in self._servers.items()
+                },
+            }
+
+tsserver_pool = TsServerPool()
+
+async def _tsc_output(repo_path: str, file_paths: List[str]) -> str:
+    """
+    Type-checks files with the repository's persistent tsserver (`tsserver_pool`) when available,
+    and otherwise with one tsc --noEmit run.
+
+    Args:
+        repo_path: The path to the repository's working directory.
+        file_paths: The files to check, relative to the repository.
+
+    Returns:
+        The diagnostics or tsc's output.
+    """
+    tsc_output = await tsserver_pool.check(repo_path, file_paths)
+    if tsc_output is None:
+        tsc_command = " tsc --noEmit --allowJs " + " ".join(shlex.quote(path) for path in file_paths)
+        tsc_output = await execute_custom_command(repo_path, tsc_command)
+    return tsc_output
+
+async def _run_tsc_if_applicable(repo_path: str, file_path: str) -> str:
+    """
+    Type-checks the file if it has a .ts, .js, or .mjs extension, with the repository's persistent
+    tsserver (`tsserver_pool`) when available, and otherwise by running tsc with --noEmit.
+
+    Args:
+        repo_path: The path to the repository's working directory.
+        file_path: The path to the file that was modified.
+
+    Returns:
+        A string containing the TSC output, or an empty string if TSC is not applicable.
+    """
+    file_extension = os.path.splitext(file_path)[1]
+    if file_extension in _TS_EXTENSIONS:
+        tsc_output = await _tsc_output(repo_path, [file_path])
+        return f"\n\nTSC Output for {file_path}:\n{tsc_output}"
+    return ""
+
+VALIDATOR_CONFIG_FILE = ".mcp-devtools.yml"
+VALIDATION_CACHE_BYTES = int(os.getenv("MCP_DEVTOOLS_VALIDATION_CACHE_BYTES", str(8 * 1024 * 1024)))
+
+def _check_python_source(path: str, data: bytes) -> str:
+    """
+    Compiles Python source without running it, reporting the first syntax error.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            compile(data, path, "exec", dont_inherit=True)
+    except SyntaxError as e:
+        return f"{path}({e.lineno},{e.offset}): error SyntaxError: {e.msg}"
+    except ValueError as e:
+        return f"{path}: error: {e}"
+    return ""
+
+def _check_json_source(path: str, data: bytes) -> str:
+    """
+    Parses a JSON document, reporting the first syntax error.
+    """
+    try:
+        json.loads(data)
+    except json.JSONDecodeError as e:
+        return f"{path}({e.lineno},{e.colno}): error: {e.msg}"
+    except UnicodeDecodeError as e:
+        return f"{path}: error: {e}"
+    return ""
+
+def _check_yaml_source(path: str, data: bytes) -> str:
+    """
+    Parses every document of a YAML file, reporting the first syntax error.
+    """
+    try:
+        for _ in yaml.safe_load_all(data):
+            pass
+    except yaml.YAMLError as e:
+        mark = getattr(e, "problem_mark", None)
+        location = f"({mark.line + 1},{mark.column + 1})" if mark is not None else ""
+        problem = getattr(e, "problem", None) or str(e)
+        return f"{path}{location}: error: {problem}"
+    return ""
+
+_BUILTIN_VALIDATORS: Dict[str, Tuple[Tuple[str, ...], Any]] = {
+    "tsc": (_TS_EXTENSIONS, None),
+    "python": ((".py", ".pyi"), _check_python_source),
+    "json": ((".json",), _check_json_source),
+    "yaml": ((".yml", ".yaml"), _check_yaml_source),
+}
+
+class Validator:
+    """
+    A post-edit check for files with given extensions: one of `_BUILTIN_VALIDATORS`, or a shell
+    command run in the repository with `{file}` (run once per file) or `{files}` (run once for all
+    the edited files) replaced by the quoted paths.
+    """
+    __slots__ = ("name", "extensions", "builtin", "command")
+
+    def __init__(self, name: str, extensions: Sequence[str], builtin: Optional[str] = None, command: Optional[str] = None):
+        self.name = name
+        self.extensions = tuple(extensions)
+        self.builtin = builtin
+        self.command = command
+
+    @property
+    def batched(self) -> bool:
+        """
+        Whether one run checks all the edited files at once.
+        """
+        if self.builtin is not None:
+            return self.builtin == "tsc"
+        return "{file}" not in (self.command or "")
+
+    @property
+    def cacheable(self) -> bool:
+        """
+        Whether the result depends only on the checked files' content. Only the in-process built-ins
+        qualify; tsc and commands may read any file of the project (imports, configuration).
+        """
+        return self.builtin is not None and self.builtin != "tsc"
+
+    def applies_to(self, file_path: str) -> bool:
+        return os.path.splitext(file_path)[1].lower() in self.extensions
+
+    async def run(self, repo_path: str, files: List[Tuple[str, bytes]]) -> str:
+        """
+        Runs the check.
+
+        Args:
+            repo_path: The path to the repository's working directory.
+            files: The checked files, relative to the repository, with their current content.
+
+        Returns:
+            The check's output, or "No problems found." for a clean in-process check.
+        """
+        paths = [path for path, _ in files]
+        if self.builtin == "tsc":
+            return await _tsc_output(repo_path, paths)
+        if self.builtin is not None:
+            check = _BUILTIN_VALIDATORS[self.builtin][1]
+            problems = [
+                await cpu_pool.run(check, path, data, size=len(data)) for path, data in files
+            ]
+            return "\n".join(problem for problem in problems if problem) or "No problems found."
+        command = self.command or ""
+        quoted = " ".join(shlex.quote(path) for path in paths)
+        if "{file}" in command or "{files}" in command:
+            command = command.replace("{files}", quoted).replace("{file}", quoted)
+        else:
+            command = f"{command} {quoted}"
+        return await execute_custom_command(repo_path, command)
+
+def _default_validators() -> List[Validator]:
+    """
+    The validators used without a configuration: tsc, as before validators were configurable (with
+    the project's `tsconfig.json` if it has one, otherwise `tsc --noEmit --allowJs <files>`). The other
+    built-ins have to be enabled in the configuration.
+    """
+    return [Validator("tsc", _BUILTIN_VALIDATORS["tsc"][0], builtin="tsc")]
+
+def _parse_validators(config: Any, source: str) -> Optional[List[Validator]]:
+    """
+    Builds the validator list from the `validators` key of a configuration file. Entries are either
+    the name of a built-in validator, or a mapping with a `name`, `extensions`, and either `builtin`
+    or `command`. Invalid entries are logged and skipped.
+
+    Args:
+        config: The parsed configuration.
+        source: The configuration file, for log messages.
+
+    Returns:
+        The validators, in order, or None if the file doesn't set `validators`.
+    """
+    if not isinstance(config, dict) or "validators" not in config:
+        return None
+    validators: List[Validator] = []
+    for entry in config.get("validators") or []:
+        if isinstance(entry, str):
+            entry = {"builtin": entry}
+        if not isinstance(entry, dict):
+            logger.warning(f"Ignoring invalid validator {entry!r} in {source}")
+            continue
+        builtin = entry.get("builtin")
+        command = entry.get("command")
+        if (builtin is None) == (command is None) or (builtin is not None and builtin not in _BUILTIN_VALIDATORS):
+            logger.warning(f"Ignoring validator {entry!r} in {source}: it needs either a known 'builtin' or a 'command'")
+            continue
+        extensions = entry.get("extensions")
+        if extensions is None and builtin is not None:
+            extensions = _BUILTIN_VALIDATORS[builtin][0]
+        if isinstance(extensions, str):
+            extensions = [extensions]
+        if not extensions:
+            logger.warning(f"Ignoring validator {entry!r} in {source}: it has no 'extensions'")
+            continue
+        extensions = [ext.lower() if ext.startswith(".") else f".{ext.lower()}" for ext in extensions]
+        validators.append(Validator(str(entry.get("name") or builtin or command), extensions, builtin, command))
+    return validators
+
+_validator_configs: Dict[str, Tuple[Optional[Tuple[int, int]], Optional[List[Validator]]]] = {}
+_validator_configs_lock = threading.Lock()
+
+def load_validators(repo_path: str) -> List[Validator]:
+    """
+    Loads a repository's post-edit validators from `.mcp-devtools.yml` in the working directory or,
+    failing that, the git root. Parsed files are reused until their mtime or size changes.
+
+    Args:
+        repo_path: The path to the repository's working directory.
+
+    Returns:
+        The configured validators, or the defaults (`_default_validators`) if no file configures them.
+    """
+    repo_path = os.path.abspath(repo_path)
+    candidates = [os.path.join(repo_path, VALIDATOR_CONFIG_FILE)]
+    git_root = find_git_root(repo_path)
+    if git_root and git_root != repo_path:
+        candidates.append(os.path.join(git_root, VALIDATOR_CONFIG_FILE))
+    for path in candidates:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        signature = (st.st_mtime_ns, st.st_size)
+        with _validator_configs_lock:
+            cached = _validator_configs.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1] if cached[1] is not None else _default_validators()
+        try:
+            with open(path, "r") as f:
+                config = yaml.safe_load(f)
+        except Exception as e:
+            logger.warning(f"Error loading validator config from {path}: {e}")
+            config = None
+        validators = _parse_validators(config, path)
+        with _validator_configs_lock:
+            _validator_configs[path] = (signature, validators)
+        return validators if validators is not None else _default_validators()
+    return _default_validators()
+
+validation_cache = ResultCache(max_bytes=VALIDATION_CACHE_BYTES, spill_dir=None)
+
+async def _run_validators(repo_path: str, file_paths: List[str]) -> str:
+    """
+    Runs the repository's post-edit validators (see `load_validators`) on the edited files, all
+    checks concurrently. Results of the single-file built-ins (`Validator.cacheable`) are cached in
+    `validation_cache` by validator and content hash, so a file whose content didn't change since its
+    last check isn't checked again; tsc and command validators always run, as their result can depend
+    on other files of the project.
+
+    Args:
+        repo_path: The path to the repository's working directory.
+        file_paths: The paths of the files that were modified, relative to the repository.
+
+    Returns:
+        One "<NAME> Output for <files>:" section per check, or an empty string if no validator applies.
+    """
+    validators = [v for v in load_validators(repo_path) if any(v.applies_to(path) for path in file_paths)]
+    if not validators:
+        return ""
+    wanted = list(dict.fromkeys(path for path in file_paths if any(v.applies_to(path) for v in validators)))
+
+    def read_all() -> Dict[str, bytes]:
+        contents = {}
+        for path in wanted:
+            with suppress(OSError):
+                contents[path] = (Path(repo_path) / path).read_bytes()
+        return contents
+
+    contents = await asyncio.to_thread(read_all)
+    digests = {path: hashlib.sha256(data).hexdigest() for path, data in contents.items()}
+    repo_key = _repo_key(repo_path)
+
+    async def check(validator: Validator, paths: List[str]) -> str:
+        key = ("validate", repo_key, validator.name, validator.builtin or validator.command or "",
+               *(f"{path}\0{digests[path]}" for path in paths))
+        output = validation_cache.get(key) if validator.cacheable else None
+        if output is None:
+            output = await validator.run(repo_path, [(path, contents[path]) for path in paths])
+            if validator.cacheable and not output.startswith("UNEXPECTED_ERROR"):
+                validation_cache.put(key, output)
+        return f"\n\n{validator.name.upper()} Output for {', '.join(paths)}:\n{output}"
+
+    checks = []
+    for validator in validators:
+        paths = [path for path in contents if validator.applies_to(path)]
+        if not paths:
+            continue
+        if validator.batched:
+            checks.append(check(validator, paths))
+        else:
+            checks.extend(check(validator, [path]) for path in paths)
+    return "".join(await asyncio.gather(*checks))
+
+VALIDATION_MODE = os.getenv("MCP_DEVTOOLS_VALIDATION_MODE", "sync")
+VALIDATION_DEBOUNCE = float(os.getenv("MCP_DEVTOOLS_VALIDATION_DEBOUNCE", "0.5"))
+VALIDATION_MAX_DELAY = float(os.getenv("MCP_DEVTOOLS_VALIDATION_MAX_DELAY", "5"))
+
+class _RepoValidation:
+    """
+    The deferred validation state of one repository in the `ValidationScheduler`.
+    """
+    __slots__ = ("edits", "first_edit", "timer", "running", "idle", "report", "report_edits",
+                 "report_time", "unreported", "runs")
+
+    def __init__(self) -> None:
+        # Edited files not yet reported, with the edit generation that last touched each of them
+        self.edits: Dict[str, int] = {}
+        self.first_edit: Optional[float] = None
+        self.timer: Optional["asyncio.Task[None]"] = None
+        self.running: Optional["asyncio.Task[None]"] = None
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.report: Optional[str] = None
+        self.report_edits: Dict[str, int] = {}
+        self.report_time = 0.0
+        self.unreported = False
+        self.runs = 0
+
+class ValidationScheduler:
+    """
+    Deferred post-edit validation, used when `MCP_DEVTOOLS_VALIDATION_MODE` is `deferred`. Edits
+    return without waiting for the validators; a repository's edited files are validated together
+    once no edit arrived for `debounce` seconds (or `max_delay` seconds after the first of a burst of
+    edits), so a burst of edits costs one run that checks the latest state of every file. Each run
+    covers all the files edited since results were last reported, which the content-hash cache of
+    `_run_validators` makes cheap for built-in checks of files that didn't change again. The latest results are
+    attached to the next edit's response, or fetched with the `get_validation_results` tool.
+    """
+
+    def __init__(self, debounce: float = VALIDATION_DEBOUNCE, max_delay: float = VALIDATION_MAX_DELAY):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._repos: Dict[str, _RepoValidation] = {}
+        self._generation = 0
+        self.scheduled = 0
+        self.runs = 0
+        self.errors = 0
+
+    def schedule(self, repo_path: str, file_paths: List[str]) -> None:
+        """
+        Queues edited files for validation and restarts the repository's debounce timer.
+
+        Args:
+            repo_path: The path to the repository's working directory.
+            file_paths: The edited files, relative to the repository.
+        """
+        state = self._repos.setdefault(_repo_key(repo_path), _RepoValidation())
+        self._generation += 1
+        for path in file_paths:
+            state.edits[path] = self._generation
+        self.scheduled += 1
+        if state.first_edit is None:
+            state.first_edit = time.monotonic()
+        state.idle.clear()
+        if state.timer is not None:
+            state.timer.cancel()
+        state.timer = asyncio.create_task(self._debounce(repo_path, state))
+
+    async def _debounce(self, repo_path: str, state: _RepoValidation) -> None:
+        assert state.first_edit is not None
+        delay = min(self.debounce, max(0.0, state.first_edit + self.max_delay - time.monotonic()))
+        await asyncio.sleep(delay)
+        state.timer = None
+        # A run in progress picks up the new edits when it finishes
+        if state.running is None:
+            state.running = asyncio.create_task(self._run(repo_path, state))
+
+    async def _run(self, repo_path: str, state: _RepoValidation) -> None:
+        try:
+            while True:
+                edits = dict(state.edits)
+                state.first_edit = None
+                try:
+                    report = await _run_validators(repo_path, list(edits))
+                except Exception as e:
+                    logger.warning(f"Deferred validation failed for {repo_path}: {e}")
+                    self.errors += 1
+                    report = f"\n\nUNEXPECTED_ERROR: Validation failed: {e}. AI_HINT: Check the validator configuration and review server logs for more details."
+                self.runs += 1
+                state.runs += 1
+                state.report, state.report_edits = report, edits
+                state.report_time = time.monotonic()
+                state.unreported = True
+                # Rerun only for files edited during the run; files whose results were taken
+                # meanwhile are gone from `state.edits` and don't need another run
+                if state.timer is not None or all(edits.get(path) == generation for path, generation in state.edits.items()):
+                    break
+        finally:
+            state.running = None
+            if state.timer is None:
+                state.idle.set()
+
+    def _take_report(self, state: _RepoValidation) -> str:
+        # Files not edited again since the reported run are done
+        for path, generation in state.report_edits.items():
+            if state.edits.get(path) == generation:
+                del state.edits[path]
+        state.unreported = False
+        report = state.report or ""
+        files = ", ".join(state.report_edits)
+        age = time.monotonic() - state.report_time
+        if not report:
+            return f"No validators apply to {files} (checked {age:.1f}s ago)."
+        return f"Validation results for {files} (checked {age:.1f}s ago):{report}"
+
+    def take_unreported(self, repo_path: str) -> str:
+        """
+        Returns the results of a finished run that weren't reported yet, marking them reported.
+
+        Args:
+            repo_path: The path to the repository's working directory.
+
+        Returns:
+            The results, or an empty string if there are none.
+        """
+        state = self._repos.get(_repo_key(repo_path))
+        if state is None or not state.unreported:
+            return ""
+        return self._take_report(state)
+
+    async def results(self, repo_path: str, wait: bool = True, timeout: float = 30.0) -> str:
+        """
+        Returns the latest validation results of a repository.
+
+        Args:
+            repo_path: The path to the repository's working directory.
+            wait: Whether to wait for pending validation first.
+            timeout: The maximum number of seconds to wait.
+
+        Returns:
+            The results of the latest run, followed by the files whose validation is still pending.
+        """
+        state = self._repos.get(_repo_key(repo_path))
+        if state is None:
+            return "No deferred validation results: no files were edited in deferred validation mode."
+        if wait:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(state.idle.wait(), timeout)
+        pending = [path for path, generation in state.edits.items() if state.report_edits.get(path) != generation]
+        parts = []
+        # A report already returned is repeated only while it is still the latest
+        if state.report is not None and (state.unreported or not pending):
+            parts.append(self._take_report(state))
+        if pending:
+            parts.append(f"Validation is still pending for: {', '.join(pending)}.")
+        return "\n\n".join(parts) or "No deferred validation results yet."
+
+    def clear(self) -> None:
+        """
+        Cancels all timers and runs and forgets every repository's state.
+        """
+        for state in self._repos.values():
+            for task in (state.timer, state.running):
+                if task is not None:
+                    task.cancel()
+        self._repos.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the scheduler's counters; `scheduled - runs` edits were coalesced into other runs.
+        """
+        return {
+            "mode": VALIDATION_MODE,
+            "scheduled": self.scheduled,
+            "runs": self.runs,
+            "errors": self.errors,
+            "pending_repos": sum(1 for state in self._repos.values() if not state.idle.is_set()),
+        }
+
+validation_scheduler = ValidationScheduler()
+
+async def _validate_after_edit(repo_path: str, file_paths: List[str]) -> str:
+    """
+    Validates edited files: right away with `_run_validators`, or, in deferred validation mode,
+    by queuing them in `validation_scheduler` and returning any earlier results not yet reported.
+
+    Args:
+        repo_path: The path to the repository's working directory.
+        file_paths: The paths of the files that were modified, relative to the repository.
+
+    Returns:
+        The validator output, or a note on the deferred validation.
+    """
+    if not file_paths:
+        return ""
+    if VALIDATION_MODE != "deferred":
+        return await _run_validators(repo_path, file_paths)
+    earlier = validation_scheduler.take_unreported(repo_path)
+    validation_scheduler.schedule(repo_path, file_paths)
+    result = f"\n\nValidation of {', '.join(file_paths)} is deferred; call get_validation_results for the results."
+    if earlier:
+        result += f"\n\nEarlier edits: {earlier}"
+    return result
+
+@functools.lru_cache(maxsize=256)
+def _compile_search_pattern(pattern: str, flags: int) -> "re.Pattern[str]":
+    """
+    Compiles a search pattern, keeping recently used patterns so repeated edits skip compilation.
+
+    Args:
+        pattern: The regular expression.
+        flags: The `re` flags to compile with.
+
+    Returns:
+        The compiled pattern.
+    """
+    return re.compile(pattern, flags)
+
+def _replace_in_lines(
+    lines: List[str],
+    search_string: str,
+    replace_string: str,
+    ignore_case: bool,
+    start_line: Optional[int],
+    end_line: Optional[int],
+    use_regex: Optional[bool] = None,
+) -> Tuple[List[str], int, str]:
+    """
+    Replaces matches of a search string within a line range, in a single pass over the range.
+
+    Args:
+        lines: The file's lines, with their line endings.
+        search_string: The string or regex pattern to search for.
+        replace_string: The string to replace matches with.
+        ignore_case: If True, the search is case-insensitive.
+        start_line: Optional. The 1-based starting line number for the search.
+        end_line: Optional. The 1-based ending line number for the search.
+        use_regex: If True, always search for a regex; if False, always search literally. If None,
+            the search string is treated literally if it occurs within the range, and as a regex otherwise.
+
+    Returns:
+        A tuple of the new lines, the number of replacements made, and the search type used
+        (`"literal"` or `"regex"`).
+
+    Raises:
+        re.error: If the search string is not a valid regex.
+    """
+    flags = re.IGNORECASE if ignore_case else 0
+    first = max((start_line or 1) - 1, 0)
+    last = len(lines) if end_line is None else min(end_line, len(lines))
+    in_range = lines[first:last]
+
+    if use_regex:
+        pattern = _compile_search_pattern(search_string, flags)
+        search_type = "regex"
+    else:
+        # Decide between literal and regex search with one scan of the range
+        pattern = _compile_search_pattern(re.escape(search_string), flags)
+        search_type = "literal"
+        if use_regex is None and pattern.search("".join(in_range)) is None:
+            logging.info(f"Literal search failed. Attempting regex search with: {search_string}")
+            pattern = _compile_search_pattern(search_string, flags)
+            search_type = "regex"
+
+    changes_made = 0
+    replaced = []
+    for line in in_range:
+        new_line, num_subs = pattern.subn(replace_string, line)
+        if new_line != line:
+            changes_made += num_subs
+        replaced.append(new_line)
+    return lines[:first] + replaced + lines[last:], changes_made, search_type
+
+WRITE_FSYNC = os.getenv("MCP_DEVTOOLS_FSYNC", "never").lower()
+_COPY_CHUNK_BYTES = 1024 * 1024
+
+def _stage_temp_file(path: Path, data: bytes) -> str:
+    """
+    Writes new content for a file to a temporary file next to it, ready to be renamed over it.
+    Symlinks are resolved first, so the temporary file sits next to the file the link points to.
+    The temporary file gets the target's permissions and is fsynced according to `WRITE_FSYNC`.
+
+    Args:
+        path: The file the content is for.
+        data: The new content.
+
+    Returns:
+        The temporary file's path.
+
+    Raises:
+        OSError: If the content cannot be written completely; the temporary file is removed.
+    """
+    # Stage next to the real file, so a symlinked target is updated rather than replaced
+    path = path.resolve()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            # Checking the size is enough to catch short writes without reading the file back
+            if os.fstat(f.fileno()).st_size != len(data):
+                raise OSError(f"short write to {path}")
+            if WRITE_FSYNC in ("file", "always"):
+                os.fsync(f.fileno())
+        with suppress(FileNotFoundError):
+            os.chmod(tmp_name, os.stat(path).st_mode & 0o7777)
+    except BaseException:
+        with suppress(OSError):
+            os.unlink(tmp_name)
+        raise
+    return tmp_name
+
+def _replace_with_temp_file(tmp_name: str, path: Path) -> None:
+    """
+    Moves a staged temporary file's content to its target. The target's symlinks are resolved, so the
+    file they point to is replaced and the links are kept. A file with other hard links is
+    overwritten in place instead, since renaming over it would detach it from them.
+
+    Args:
+        tmp_name: The temporary file, which is consumed.
+        path: The target.
+    """
+    target = path.resolve()
+    with suppress(FileNotFoundError):
+        if os.stat(target).st_nlink > 1:
+            with open(tmp_name, 'rb') as src, open(target, 'r+b') as dst:
+                shutil.copyfileobj(src, dst, _COPY_CHUNK_BYTES)
+                dst.truncate()
+                if WRITE_FSYNC in ("file", "always"):
+                    dst.flush()
+                    os.fsync(dst.fileno())
+            os.unlink(tmp_name)
+            return
+    os.replace(tmp_name, target)
+
+class PartialWriteError(OSError):
+    """
+    Raised when renaming staged files over their targets failed after some targets were replaced.
+    `written` lists the replaced targets and `failed` the target whose rename failed; it and the
+    targets after it are unchanged.
+    """
+
+    def __init__(self, written: List[Path], failed: Path, error: OSError):
+        super().__init__(f"{failed}: {error}")
+        self.written = written
+        self.failed = failed
+        self.error = error
+
+def _commit_temp_files(staged: List[Tuple[str, Path]]) -> None:
+    """
+    Renames staged temporary files over their targets, then fsyncs the directories if `WRITE_FSYNC`
+    is `always`. If a rename fails, the temporary files not yet renamed are removed.
+
+    Args:
+        staged: Pairs of a temporary file and its target.
+
+    Raises:
+        OSError: If the first rename failed; no target was changed.
+        PartialWriteError: If a later rename failed; the targets before it were replaced.
+    """
+    for index, (tmp_name, path) in enumerate(staged):
+        try:
+            _replace_with_temp_file(tmp_name, path)
+        except OSError as e:
+            _discard_temp_files(staged[index:])
+            if index == 0:
+                raise
+            raise PartialWriteError([target for _, target in staged[:index]], path, e) from e
+    if WRITE_FSYNC == "always":
+        for directory in {path.resolve().parent for _, path in staged}:
+            dir_fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+def _discard_temp_files(staged: List[Tuple[str, Path]]) -> None:
+    """
+    Removes staged temporary files that will not be committed.
+
+    Args:
+        staged: Pairs of a temporary file and its target.
+    """
+    for tmp_name, _ in staged:
+        with suppress(OSError):
+            os.unlink(tmp_name)
+
+def _atomic_write_many(files: Dict[Path, bytes]) -> None:
+    """
+    Replaces the content of several files as one batch. Every new content is first written to a
+    temporary file next to its target, and only once all of them were written are they renamed over
+    their targets, so an error or interruption never leaves a partially written file.
+    File permissions are preserved. Durability follows `WRITE_FSYNC`: `never` leaves flushing to the
+    OS, `file` fsyncs each temporary file before it is renamed, and `always` also fsyncs the
+    directories after the renames.
+
+    Args:
+        files: The new content of each file.
+
+    Raises:
+        PartialWriteError: If renaming a staged file failed after earlier targets were replaced.
+        OSError: If a file cannot be written completely or the first rename failed; no target is
+            changed in that case.
+    """
+    staged: List[Tuple[str, Path]] = []
+    try:
+        for path, data in files.items():
+            staged.append((_stage_temp_file(path, data), path))
+    except BaseException:
+        _discard_temp_files(staged)
+        raise
+    _commit_temp_files(staged)
+
+def _partial_write_message(repo_path: str, error: PartialWriteError) -> str:
+    """
+    Describes a batch write that stopped partway, listing the files that were replaced.
+    """
+    written = ", ".join(os.path.relpath(path, repo_path) for path in error.written)
+    failed = os.path.relpath(error.failed, repo_path)
+    return (
+        f"UNEXPECTED_ERROR: Failed to write {failed}: {error.error}. Only some files were changed: {written} "
+        f"were written; {failed} and the files after it were left unchanged. "
+        "AI_HINT: Check file permissions and disk space, then review the written files with git_diff_all before retrying."
+    )
+
+def _read_lines_exact(path: Path) -> List[str]:
+    """
+    Reads a UTF-8 text file's lines with their line endings as they are in the file (CRLF and CR
+    included), so that writing the joined lines back changes nothing but the edits.
+
+    Args:
+        path: The file to read.
+
+    Returns:
+        The file's lines, each with its line ending.
+    """
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return f.readlines()
+
+def _atomic_write_text(path: Path, content: str) -> None:
+    """
+    Replaces a file's content by writing a temporary file next to it and renaming it over the file,
+    so readers never see a partially written file. The file's permissions are preserved.
+
+    Args:
+        path: The file to write.
+        content: The new content.
+    """
+    _atomic_write_many({path: content.encode('utf-8')})
+
+async def _search_and_replace_python_logic(
+    repo_path: str,
+    search_string: str,
+    replace_string: str,
+    file_path: str,
+    ignore_case: bool,
+    start_line: Optional[int],
+    end_line: Optional[int]
+) -> str:
+    """
+    Performs search and replace in a file using Python's re module.
+    The search string is treated literally if it occurs within the line range, and as a regex otherwise.
+    The file is read once (keeping its line endings), only the lines in the range are substituted,
+    in a single pass, and the file is written once.
+
+    Args:
+        repo_path: The path to the repository's working directory.
+        search_string: The string or regex pattern to search for.
+        replace_string: The string to replace matches with.
+        file_path: The path to the file to modify.
+        ignore_case: If True, the search is case-insensitive.
+        start_line: Optional. The 1-based starting line number for the search.
+        end_line: Optional. The 1-based ending line number for the search.
+
+    Returns:
+        A string indicating the result of the operation, including diff and validator output,
+        or an error message.
+    """
+    try:
+        full_file_path = Path(repo_path) / file_path
+        lines = _read_lines_exact(full_file_path)
+
+        new_lines, changes_made, search_type = await cpu_pool.run(
+            _replace_in_lines, lines, search_string, replace_string, ignore_case, start_line, end_line,
+            size=sum(map(len, lines)),
+        )
+        if changes_made == 0:
+            return f"No changes made. '{search_string}' not found in {file_path} within the specified range using either literal or regex search."
+
+        original_content = "".join(lines)
+        modified_content = "".join(new_lines)
+        _atomic_write_text(full_file_path, modified_content)
+        _writes_finished(repo_path)
+
+        result_message = f"Successfully replaced '{search_string}' with '{replace_string}' in {file_path} using {search_type} search. Total changes: {changes_made}."
+        result_message += await _generate_diff_output(original_content, modified_content, file_path)
+        result_message += await _validate_after_edit(repo_path, [file_path])
+        return result_message
+
+    except FileNotFoundError:
+        return f"Error: File not found at {full_file_path}"
+    except re.error as e:
+        return f"Error: Invalid regex pattern '{search_string}': {e}"
+    except TimeoutError as e:
+        return f"TIMEOUT: Search and replace in {file_path} was stopped: {e}. No changes were made. AI_HINT: Simplify the pattern or restrict it with start_line/end_line."
+    except Exception as e:
+        return f"UNEXPECTED_ERROR: An unexpected error occurred during search and replace: {e}. AI_HINT: Check your search/replace patterns and review server logs for more details."
+
+async def search_and_replace_in_file(
+    repo_path: str,
+    search_string: str,
+    replace_string: str,
+    file_path: str,
+    ignore_case: bool,
+    start_line: Optional[int],
+    end_line: Optional[int]
+) -> str:
+    """
+    Searches for a string or regex pattern in a file and replaces it with another string.
+    The replacement runs in-process through `_search_and_replace_python_logic`.
+
+    Args:
+        repo_path: The path to the repository's working directory.
+        search_string: The string or regex pattern to search for.
+        replace_string: The string to replace matches with.
+        file_path: The path to the file to modify.
+        ignore_case: If True, the search is case-insensitive.
+        start_line: Optional. The 1-based starting line number for the search.
+        end_line: Optional. The 1-based ending line number for the search.
+
+    Returns:
+        A string indicating the result of the operation, including diff and validator output,
+        or an error message.
+    """
+    return await _search_and_replace_python_logic(
+        repo_path, search_string, replace_string, file_path, ignore_case, start_line, end_line
+    )
+
+def _apply_file_edits(lines: List[str], edits: List["FileEdit"]) -> Tuple[List[str], List[Tuple[int, str]]]:
+    """
+    Applies `multi_edit` edits in order, stopping at the first edit that fails.
+
+    Args:
+        lines: The file's lines, with their line endings.
+        edits: The edits.
+
+    Returns:
+        The new lines and, for each edit attempted, the number of replacements and the search type
+        used; a failed edit has 0 replacements, or -1 and the regex error if its pattern is invalid.
+    """
+    outcomes: List[Tuple[int, str]] = []
+    for edit in edits:
+        try:
+            lines, changes_made, search_type = _replace_in_lines(
+                lines, edit.search_string, edit.replace_string, edit.ignore_case,
+                edit.start_line, edit.end_line, edit.use_regex,
+            )
+        except re.error as e:
+            outcomes.append((-1, str(e)))
+            break
+        outcomes.append((changes_made, search_type))
+        if changes_made == 0:
+            break
+    return lines, outcomes
+
+async def multi_edit_file(repo_path: str, file_path: str, edits: List[Dict[str, Any]]) -> str:
+    """
+    Applies an ordered list of search-and-replace edits to one file as a single transaction.
+    The edits are applied in memory, each to the result of the previous one (so line ranges refer to
+    the file as left by the earlier edits). If every edit matches, the file is written once,
+    atomically, and one combined diff and one run of the validators are returned; otherwise the file is left unchanged.
+
+    Args:
+        repo_path: The path to the repository's working directory.
+        file_path: The path to the file to modify, relative to the repository.
+        edits: The edits, as dictionaries with the fields of `FileEdit`.
+
+    Returns:
+        A string summarizing each edit, followed by the combined diff and validator output,
+        or an error message.
+    """
+    full_file_path = Path(repo_path) / file_path
+    if not edits:
+        return "Error: No edits were provided. AI_HINT: Pass at least one edit in `edits`."
+    try:
+        lines = _read_lines_exact(full_file_path)
+    except FileNotFoundError:
+        return f"Error: File not found at {full_file_path}"
+    except Exception as e:
+        return f"UNEXPECTED_ERROR: Failed to read '{file_path}': {e}. AI_HINT: Check file permissions and review server logs for more details."
+
+    original_content = "".join(lines)
+    parsed = [FileEdit.model_validate(raw_edit) for raw_edit in edits]
+    try:
+        lines, outcomes = await cpu_pool.run(_apply_file_edits, lines, parsed, size=len(original_content) * len(parsed))
+    except TimeoutError as e:
+        return f"TIMEOUT: The edits to {file_path} were stopped: {e}. No changes were made. AI_HINT: Simplify the patterns or restrict them with line ranges."
+    summary = []
+    for number, (edit, (changes_made, detail)) in enumerate(zip(parsed, outcomes), start=1):
+        if changes_made < 0:
+            return f"Error: Edit #{number} has an invalid regex pattern '{edit.search_string}': {detail}. No changes were made to {file_path}."
+        if changes_made == 0:
+            return (
+                f"No changes made. Edit #{number}: '{edit.search_string}' not found in {file_path} within the specified range. "
+                f"AI_HINT: None of the {len(edits)} edits were applied; fix edit #{number} (earlier edits may have changed the text it expects) and resend the whole batch."
+            )
+        summary.append(f"Edit #{number}: replaced '{edit.search_string}' with '{edit.replace_string}' using {detail} search. Changes: {changes_made}.")
+
+    modified_content = "".join(lines)
+    try:
+        _atomic_write_text(full_file_path, modified_content)
+    except Exception as e:
+        return f"UNEXPECTED_ERROR: Failed to write '{file_path}': {e}. AI_HINT: Check file permissions, disk space, and review server logs for more details."
+    _writes_finished(repo_path)
 
-async def _generate_diff_output(original_content: str, new_content: str, file_path: str) -> str:
+    result_message = f"Successfully applied {len(edits)} edits to {file_path}.\n" + "\n".join(summary)
+    result_message += await _generate_diff_output(original_content, modified_content, file_path)
+    result_message += await _validate_after_edit(repo_path, [file_path])
+    return result_message
+
+REPLACE_MAX_DIFF_BYTES = int(os.getenv("MCP_DEVTOOLS_REPLACE_MAX_DIFF_BYTES", str(64 * 1024)))
+_REPLACE_BATCH_FILES = 64
+
+def _diff_line_counts(original: bytes, new: bytes) -> Tuple[int, int]:
     """
-    Generates a unified diff string between two versions of file content.
+    Counts the lines added and removed between two versions of a file, without rendering the diff.
 
     Args:
-        original_content: The original content of the file.
-        new_content: The new content of the file.
-        file_path: The path of the file, used for diff headers.
+        original: The original content.
+        new: The new content.
 
     Returns:
-        A string containing the unified diff, or a message indicating no changes
-        or that the diff was too large.
+        The numbers of lines added and removed.
     """
-    diff_lines = list(difflib.unified_diff(
-        original_content.splitlines(keepends=True),
-        new_content.splitlines(keepends=True),
-        fromfile=f"a/{file_path}",
-        tofile=f"b/{file_path}",
-        lineterm=""
-    ))
-    
-    if len(diff_lines) > 1000:
-        return f"\nDiff was too large (over 1000 lines)."
-    else:
-        diff_output = "".join(diff_lines)
-        return f"\nDiff:\n{diff_output}" if diff_output else "\nNo changes detected (file content was identical)."
+    _, _, added, removed = _unified_diff(
+        original.decode('utf-8', errors='replace').splitlines(keepends=True),
+        new.decode('utf-8', errors='replace').splitlines(keepends=True),
+        "",
+        max_lines=0,
+    )
+    return added, removed
 
-async def _run_tsc_if_applicable(repo_path: str, file_path: str) -> str:
+def _unified_diff_text(original_content: str, new_content: str, file_path: str, first_line: int = 1) -> str:
     """
-    Runs TypeScript compiler (tsc) with --noEmit if the file has a .ts, .js, or .mjs extension.
+    Generates a git-style unified diff between two versions of a file, or of a region of it.
 
     Args:
-        repo_path: The path to the repository's working directory.
-        file_path: The path to the file that was modified.
+        original_content: The original content of the file or region.
+        new_content: The new content of the file or region.
+        file_path: The path of the file, used for diff headers.
+        first_line: The line number of the region's first line in the file, used to number hunks.
 
     Returns:
-        A string containing the TSC output, or an empty string if TSC is not applicable.
+        The diff, or an empty string if the contents are identical.
     """
-    file_extension = os.path.splitext(file_path)[1]
-    if file_extension in ['.ts', '.js', '.mjs']:
-        tsc_command = f" tsc --noEmit --allowJs {file_path}"
-        tsc_output = await execute_custom_command(repo_path, tsc_command)
-        return f"\n\nTSC Output for {file_path}:\n{tsc_output}"
-    return ""
+    diff, _, _, _ = _unified_diff(
+        original_content.splitlines(keepends=True), new_content.splitlines(keepends=True), file_path, first_line
+    )
+    return diff or ""
 
-async def _search_and_replace_python_logic(
+def _replace_in_files_worker(
     repo_path: str,
+    file_paths: List[str],
     search_string: str,
     replace_string: str,
-    file_path: str,
     ignore_case: bool,
-    start_line: Optional[int],
-    end_line: Optional[int]
-) -> str:
+    use_regex: bool,
+) -> List[Tuple[str, int, Optional[bytes], str, Optional[str]]]:
     """
-    Performs search and replace in a file using Python's re module.
-    Attempts literal search first, then falls back to regex search if no changes are made.
+    Runs one batch of a multi-file replacement in a worker process. Files are only read here;
+    the new contents are returned so the caller can write them all at once.
 
     Args:
         repo_path: The path to the repository's working directory.
+        file_paths: The files of the batch, relative to the repository.
         search_string: The string or regex pattern to search for.
         replace_string: The string to replace matches with.
-        file_path: The path to the file to modify.
         ignore_case: If True, the search is case-insensitive.
-        start_line: Optional. The 1-based starting line number for the search.
-        end_line: Optional. The 1-based ending line number for the search.
+        use_regex: If True, the search string is a regex; otherwise it is matched literally.
 
     Returns:
-        A string indicating the result of the operation, including diff and TSC output,
-        or an error message.
+        For each file, a tuple of its path, the number of replacements, its new content (None if
+        unchanged), its diff, and the reason it was skipped (None if it was searched).
     """
-    try:
-        full_file_path = Path(repo_path) / file_path
-        with open(full_file_path, 'r') as f:
-            lines = f.readlines()
-
-        flags = 0
-        if ignore_case:
-            flags |= re.IGNORECASE
-
-        literal_search_string = re.escape(search_string)
-        logging.info(f"Attempting literal search with: {literal_search_string}")
-
-        modified_lines_literal = []
-        changes_made_literal = 0
-
-        for i, line in enumerate(lines):
-            line_num = i + 1
-            if (start_line is None or line_num >= start_line) and \
-               (end_line is None or line_num <= end_line):
-                new_line, num_subs = re.subn(literal_search_string, replace_string, line, flags=flags)
-                
-                if new_line != line:
-                    changes_made_literal += num_subs
-                    modified_lines_literal.append(new_line)
-                else:
-                    modified_lines_literal.append(line)
-            else:
-                modified_lines_literal.append(line)
-
-        if changes_made_literal > 0:
-            original_content = "".join(lines)
-            with open(full_file_path, 'w') as f:
-                f.writelines(modified_lines_literal)
-            
-            result_message = f"Successfully replaced '{search_string}' with '{replace_string}' in {file_path} using literal search. Total changes: {changes_made_literal}."
-            result_message += await _generate_diff_output(original_content, "".join(modified_lines_literal), file_path)
-            result_message += await _run_tsc_if_applicable(repo_path, file_path)
-            return result_message
-        else:
-            logging.info(f"Literal search failed. Attempting regex search with: {search_string}")
-            modified_lines_regex = []
-            changes_made_regex = 0
-            
-            for i, line in enumerate(lines):
-                line_num = i + 1
-                if (start_line is None or line_num >= start_line) and \
-                   (end_line is None or line_num <= end_line):
-                    new_line, num_subs = re.subn(search_string, replace_string, line, flags=flags)
-                    
-                    if new_line != line:
-                        changes_made_regex += num_subs
-                        modified_lines_regex.append(new_line)
-                    else:
-                        modified_lines_regex.append(line)
-                else:
-                    modified_lines_regex.append(line)
-
-            if changes_made_regex > 0:
-                original_content = "".join(lines)
-                with open(full_file_path, 'w') as f:
-                    f.writelines(modified_lines_regex)
-                
-                result_message = f"Successfully replaced '{search_string}' with '{replace_string}' in {file_path} using regex search. Total changes: {changes_made_regex}."
-                result_message += await _generate_diff_output(original_content, "".join(modified_lines_regex), file_path)
-                result_message += await _run_tsc_if_applicable(repo_path, file_path)
-                return result_message
-            else:
-                return f"No changes made. '{search_string}' not found in {file_path} within the specified range using either literal or regex search."
-
-    except FileNotFoundError:
-        return f"Error: File not found at {full_file_path}"
-    except re.error as e:
-        return f"Error: Invalid regex pattern '{search_string}': {e}"
-    except Exception as e:
-        return f"UNEXPECTED_ERROR: An unexpected error occurred during search and replace: {e}. AI_HINT: Check your search/replace patterns and review server logs for more details."
-
-async def search_and_replace_in_file(
+    needle = None if ignore_case or use_regex else search_string.encode("utf-8")
+    results: List[Tuple[str, int, Optional[bytes], str, Optional[str]]] = []
+    for file_path in file_paths:
+        try:
+            data = (Path(repo_path) / file_path).read_bytes()
+        except OSError as e:
+            results.append((file_path, 0, None, "", f"unreadable: {e.strerror or e}"))
+            continue
+        if needle is not None and needle not in data:
+            results.append((file_path, 0, None, "", None))
+            continue
+        if b"\0" in data[:8192]:
+            results.append((file_path, 0, None, "", "binary"))
+            continue
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError:
+            results.append((file_path, 0, None, "", "not UTF-8"))
+            continue
+        lines, changes, _ = _replace_in_lines(
+            text.splitlines(keepends=True), search_string, replace_string, ignore_case, None, None, use_regex
+        )
+        if changes == 0:
+            results.append((file_path, 0, None, "", None))
+            continue
+        new_text = "".join(lines)
+        results.append((file_path, changes, new_text.encode("utf-8"), _unified_diff_text(text, new_text, file_path), None))
+    return results
+
+async def search_and_replace_in_files(
     repo_path: str,
     search_string: str,
     replace_string: str,
-    file_path: str,
-    ignore_case: bool,
-    start_line: Optional[int],
-    end_line: Optional[int]
+    paths: Optional[List[str]] = None,
+    ignore_case: bool = False,
+    use_regex: Optional[bool] = None,
+    max_diff_bytes: Optional[int] = None,
 ) -> str:
     """
-    Searches for a string or regex pattern in a file and replaces it with another string.
-    Attempts to use `sed` for efficiency, falling back to Python logic if `sed` fails or makes no changes.
+    Searches for a string or regex pattern in every tracked file matching the given pathspecs and
+    replaces it, as a codemod across the repository.
+
+    Candidates are listed with `git ls-files`; for literal searches they are narrowed down with
+    `git grep -F` first. The replacements run in batches on a process pool, and the new contents are
+    written only once every batch finished, through temporary files renamed over the originals, so
+    cancelling the call midway leaves no file changed or partially written.
 
     Args:
         repo_path: The path to the repository's working directory.
         search_string: The string or regex pattern to search for.
         replace_string: The string to replace matches with.
-        file_path: The path to the file to modify.
+        paths: Optional. Git pathspecs or globs selecting the files; all tracked files if not provided.
         ignore_case: If True, the search is case-insensitive.
-        start_line: Optional. The 1-based starting line number for the search.
-        end_line: Optional. The 1-based ending line number for the search.
+        use_regex: If True, the search string is a regex; if False, it is matched literally. If None,
+            it is matched literally if it occurs in any candidate file, and as a regex otherwise.
+        max_diff_bytes: Optional. The maximum bytes of the aggregated diff (default `REPLACE_MAX_DIFF_BYTES`).
 
     Returns:
-        A string indicating the result of the operation, including diff and TSC output,
+        A summary with the number of replacements per file followed by the aggregated diff,
         or an error message.
     """
-    full_file_path = Path(repo_path) / file_path
+    pathspecs = ["--", *paths] if paths else []
+    diff_limit = REPLACE_MAX_DIFF_BYTES if max_diff_bytes is None else max_diff_bytes
+    loop = asyncio.get_running_loop()
+    try:
+        if use_regex:
+            _compile_search_pattern(search_string, re.IGNORECASE if ignore_case else 0)
+        listing = await loop.run_in_executor(_git_executor, _run_git_output, repo_path, ["ls-files", "-z", *pathspecs])
+        candidates = [path for path in listing.split("\0") if path]
+        files = candidates
+        search_type = "regex" if use_regex else "literal"
+        if not use_regex and "\n" not in search_string and (not ignore_case or search_string.isascii()):
+            grep_args = ["grep", "-l", "-z", "-I", "-F", *(["-i"] if ignore_case else []), "-e", search_string, *pathspecs]
+            try:
+                matches = await loop.run_in_executor(_git_executor, _run_git_output, repo_path, grep_args)
+            except GitCommandError as e:
+                if e.status != 1:  # 1 means no match
+                    raise
+                matches = ""
+            files = [path for path in matches.split("\0") if path]
+        if not files and use_regex is None:
+            logging.info(f"Literal search failed. Attempting regex search with: {search_string}")
+            _compile_search_pattern(search_string, re.IGNORECASE if ignore_case else 0)
+            files, search_type = candidates, "regex"
+
+        batches = [files[i:i + _REPLACE_BATCH_FILES] for i in range(0, len(files), _REPLACE_BATCH_FILES)]
+        batch_results = await asyncio.gather(*(
+            cpu_pool.run(
+                _replace_in_files_worker,
+                repo_path, batch, search_string, replace_string, ignore_case, search_type == "regex",
+            )
+            for batch in batches
+        ))
+    except re.error as e:
+        return f"Error: Invalid regex pattern '{search_string}': {e}"
+    except GitCommandError as e:
+        return f"GIT_COMMAND_FAILED: Failed to list files: {e.stderr}. AI_HINT: Check that the paths are valid pathspecs."
+    except TimeoutError as e:
+        return f"TIMEOUT: Multi-file search and replace was stopped: {e}. No files were changed. AI_HINT: Narrow `paths` or simplify the pattern."
+    except Exception as e:
+        return f"UNEXPECTED_ERROR: An unexpected error occurred during multi-file search and replace: {e}. AI_HINT: Check your search/replace patterns and review server logs for more details."
 
-    sed_command_parts = ["sed", "-i"]
+    results = [result for batch in batch_results for result in batch]
+    changed = [result for result in results if result[2] is not None]
+    skipped = [f"{path} ({reason})" for path, _, _, _, reason in results if reason]
+    if not changed:
+        message = f"No changes made. '{search_string}' not found in {len(candidates)} candidate files using {search_type} search."
+        return message + (f"\nSkipped: {', '.join(skipped)}" if skipped else "")
 
-    # Escape sed special characters in search and replacement strings
-    sed_pattern = search_string.replace('#', r'\#')
-    sed_replacement = replace_string.replace('#', r'\#').replace('&', r'\&').replace('\\', r'\\\\')
+    try:
+        # Shielded so a cancellation arriving during the write still lets the batch finish renaming
+        await asyncio.shield(loop.run_in_executor(
+            None, _atomic_write_many, {Path(repo_path) / path: data for path, _, data, _, _ in changed if data is not None}
+        ))
+    except PartialWriteError as e:
+        return _partial_write_message(repo_path, e)
+    except Exception as e:
+        return f"UNEXPECTED_ERROR: Failed to write the changed files: {e}. No files were changed. AI_HINT: Check file permissions, disk space, and review server logs for more details."
+    _writes_finished(repo_path)
+
+    total = sum(result[1] for result in changed)
+    lines = [f"Successfully replaced '{search_string}' with '{replace_string}' using {search_type} search in {len(changed)} of {len(candidates)} candidate files. Total changes: {total}."]
+    lines.extend(f"{path}: {changes}" for path, changes, _, _, _ in changed)
+    if skipped:
+        lines.append(f"Skipped: {', '.join(skipped)}")
+
+    diff_parts: List[str] = []
+    diff_size = 0
+    for index, (_, _, _, diff, _) in enumerate(changed):
+        size = len(diff.encode("utf-8"))
+        if diff_size + size > diff_limit:
+            diff_parts.append(f"[... diff truncated after {diff_size} bytes; {len(changed) - index} more changed files not shown ...]\n")
+            break
+        diff_parts.append(diff)
+        diff_size += size
+    return "\n".join(lines) + "\nDiff:\n" + "".join(diff_parts)
+
+
+def _line_range_offsets(path: Path, start_line: int, end_line: int) -> Tuple[int, int]:
+    """
+    Finds the byte range covered by lines `start_line..end_line` of a file by scanning a memory map
+    for newlines, without reading the file into memory.
 
-    sed_flags = "g"
-    if ignore_case:
-        sed_flags += "i"
+    Args:
+        path: The file.
+        start_line: The 1-based first line; the line count + 1 addresses the end of the file.
+        end_line: The 1-based last line (inclusive); `start_line - 1` gives an empty range.
 
-    sed_sub_command = f"s#{sed_pattern}#{sed_replacement}#{sed_flags}"
+    Returns:
+        The offset of the first byte of `start_line` and the offset just past `end_line`.
 
-    if start_line is not None and end_line is not None:
-        sed_sub_command = f"{start_line},{end_line}{sed_sub_command}"
-    elif start_line is not None:
-        sed_sub_command = f"{start_line},${sed_sub_command}"
-    elif end_line is not None:
-        sed_sub_command = f"1,{end_line}{sed_sub_command}"
+    Raises:
+        ValueError: If the lines are outside the file.
+    """
+    if start_line < 1 or end_line < start_line - 1:
+        raise ValueError(f"invalid line range {start_line}-{end_line}")
+    size = path.stat().st_size
+    if size == 0:
+        if start_line == 1 and end_line == 0:
+            return 0, 0
+        raise ValueError(f"line range {start_line}-{end_line} is outside the file, which is empty")
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        def next_line(pos: int) -> int:
+            newline = mm.find(b"\n", pos)
+            return size if newline == -1 else newline + 1
+
+        start = 0
+        for _ in range(start_line - 1):
+            if start >= size:
+                raise ValueError(f"line {start_line} is past the end of the file")
+            start = next_line(start)
+        end = start
+        for _ in range(end_line - start_line + 1):
+            if end >= size:
+                raise ValueError(f"line {end_line} is past the end of the file")
+            end = next_line(end)
+    return start, end
+
+def _line_start(path: Path, offset: int) -> Tuple[int, int]:
+    """
+    Finds the start of the line containing byte `offset` of a file, and that line's 1-based number,
+    by scanning a memory map, without reading the file into memory.
 
-    sed_full_command = f"{' '.join(sed_command_parts)} '{sed_sub_command}' {shlex.quote(str(full_file_path))}"
+    Raises:
+        ValueError: If the offset is past the end of the file.
+    """
+    size = path.stat().st_size
+    if offset > size:
+        raise ValueError(f"byte {offset} is past the end of the file ({size} bytes)")
+    if offset == 0:
+        return 0, 1
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        line_start = mm.rfind(b"\n", 0, offset) + 1
+        newlines = sum(
+            mm[pos:min(pos + _COPY_CHUNK_BYTES, line_start)].count(b"\n")
+            for pos in range(0, line_start, _COPY_CHUNK_BYTES)
+        )
+    return line_start, newlines + 1
 
-    try:
-        with open(full_file_path, 'r') as f:
-            original_content = f.read()
+def _rewrite_file_range(path: Path, start: int, end: int, data: bytes) -> Tuple[bytes, int]:
+    """
+    Replaces bytes `start..end` of a file with `data`, streaming the unchanged prefix and suffix into
+    a temporary file that is renamed over the original (with the same fsync policy and permission
+    handling as `_atomic_write_many`). Only the replaced region is held in memory. If the range
+    already holds `data`, the file is not rewritten.
 
-        sed_result = await execute_custom_command(repo_path, sed_full_command)
-        logging.info(f"Sed command result: {sed_result}")
+    Args:
+        path: The file.
+        start: The offset of the first byte to replace.
+        end: The offset just past the last byte to replace.
+        data: The replacement bytes.
 
-        if "Command failed with exit code" in sed_result or "Error executing command" in sed_result:
-            logging.warning(f"Sed command failed: {sed_result}. Falling back to Python logic.")
-            return await _search_and_replace_python_logic(repo_path, search_string, replace_string, file_path, ignore_case, start_line, end_line)
-        
-        with open(full_file_path, 'r') as f:
-            modified_content_sed = f.read()
+    Returns:
+        The replaced bytes and the file's new size.
 
-        if original_content != modified_content_sed:
-            result_message = f"Successfully replaced '{search_string}' with '{replace_string}' in {file_path} using sed."
-            result_message += await _generate_diff_output(original_content, modified_content_sed, file_path)
-            result_message += await _run_tsc_if_applicable(repo_path, file_path)
-            return result_message
-        else:
-            logging.info(f"Sed command executed but made no changes. Falling back to Python logic.")
-            return await _search_and_replace_python_logic(repo_path, search_string, replace_string, file_path, ignore_case, start_line, end_line)
+    Raises:
+        ValueError: If the range is outside the file.
+    """
+    path = path.resolve()
+    size = path.stat().st_size
+    if not 0 <= start <= end <= size:
+        raise ValueError(f"byte range {start}-{end} is outside the file ({size} bytes)")
+    with open(path, 'rb') as src:
+        src.seek(start)
+        replaced = src.read(end - start)
+    if replaced == data:
+        return replaced, size
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with open(path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+            remaining = start
+            while remaining:
+                chunk = src.read(min(remaining, _COPY_CHUNK_BYTES))
+                if not chunk:
+                    raise OSError(f"{path} shrank while it was rewritten")
+                dst.write(chunk)
+                remaining -= len(chunk)
+            src.seek(end)
+            dst.write(data)
+            shutil.copyfileobj(src, dst, _COPY_CHUNK_BYTES)
+            dst.flush()
+            new_size = os.fstat(dst.fileno()).st_size
+            if new_size != size - (end - start) + len(data):
+                raise OSError(f"short write to {path}")
+            if WRITE_FSYNC in ("file", "always"):
+                os.fsync(dst.fileno())
+        os.chmod(tmp_name, os.stat(path).st_mode & 0o7777)
+    except BaseException:
+        with suppress(OSError):
+            os.unlink(tmp_name)
+        raise
+    _commit_temp_files([(tmp_name, path)])
+    return replaced, new_size
+
+def _write_file_range(
+    full_file_path: Path,
+    mode: "WriteMode",
+    content: str,
+    start_line: Optional[int],
+    end_line: Optional[int],
+    start_byte: Optional[int],
+    end_byte: Optional[int],
+) -> Tuple[str, str, str, int, bool]:
+    """
+    Applies a `replace_lines` or `replace_bytes` write to an existing file. The file is left
+    untouched if the range already holds the new content.
 
-    except FileNotFoundError:
-        return f"Error: File not found at {full_file_path}"
-    except Exception as e:
-        logging.error(f"An unexpected error occurred during sed attempt: {e}. Falling back to Python logic.")
-        return f"UNEXPECTED_ERROR: An unexpected error occurred during sed-based search and replace: {e}. AI_HINT: Check your search/replace patterns, file permissions, and review server logs for more details."
+    Args:
+        full_file_path: The file.
+        mode: `WriteMode.REPLACE_LINES` or `WriteMode.REPLACE_BYTES`.
+        content: The replacement text.
+        start_line: The first line to replace, for `replace_lines`.
+        end_line: The last line to replace, for `replace_lines`; defaults to `start_line`.
+        start_byte: The first byte to replace, for `replace_bytes`.
+        end_byte: The byte offset past the range, for `replace_bytes`; defaults to `start_byte`.
+
+    Returns:
+        A description of the replaced range, the old and new text of the lines around it,
+        the line number of the first of those lines (for the diff), and whether the file changed.
 
-async def write_to_file_content(repo_path: str, file_path: str, content: str) -> str:
+    Raises:
+        ValueError: If the range is missing or outside the file.
+    """
+    data = content.encode('utf-8')
+    if mode == WriteMode.REPLACE_LINES:
+        if start_line is None:
+            raise ValueError("start_line is required for mode 'replace_lines'")
+        last = start_line if end_line is None else end_line
+        start, end = _line_range_offsets(full_file_path, start_line, last)
+        size = full_file_path.stat().st_size
+        if data and not data.endswith(b"\n") and end < size:
+            data += b"\n"
+        if data and start == size and size and _read_last_byte(full_file_path) != b"\n":
+            data = b"\n" + data
+        described = f"lines {start_line}-{last}" if last >= start_line else f"nothing (inserted before line {start_line})"
+        first_line = start_line
+        prefix = suffix = b""
+    else:
+        if start_byte is None:
+            raise ValueError("start_byte is required for mode 'replace_bytes'")
+        start, end = start_byte, start_byte if end_byte is None else end_byte
+        described = f"bytes {start}-{end}"
+        # Widen the region shown in the diff to whole lines
+        try:
+            line_start, first_line = _line_start(full_file_path, start)
+        except ValueError:
+            raise ValueError(f"byte range {start}-{end} is outside the file") from None
+        with open(full_file_path, 'rb') as f:
+            f.seek(line_start)
+            prefix = f.read(start - line_start)
+            f.seek(end)
+            suffix = f.readline()
+    replaced, _ = _rewrite_file_range(full_file_path, start, end, data)
+    old_region = (prefix + replaced + suffix).decode('utf-8', errors='replace')
+    new_region = (prefix + data + suffix).decode('utf-8', errors='replace')
+    return described, old_region, new_region, first_line, replaced != data
+
+def _read_last_byte(path: Path) -> bytes:
+    """
+    Reads the last byte of a non-empty file.
+    """
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1)
+
+async def write_to_file_content(
+    repo_path: str,
+    file_path: str,
+    content: str,
+    mode: WriteMode = WriteMode.OVERWRITE,
+    start_line: Optional[int] = None,
+    end_line: Optional[int] = None,
+    start_byte: Optional[int] = None,
+    end_byte: Optional[int] = None,
+) -> str:
     """
     Writes content to a specified file, creating it if it doesn't exist or overwriting it if it does.
-    Includes a check to ensure the content was written correctly and generates a diff.
+    The content is written to a temporary file that is renamed over the target (see `_atomic_write_many`),
+    so watchers and build tools never see a half-written file. If the file already has exactly this
+    content, it is not touched, so its mtime doesn't change and no rebuilds are triggered.
+
+    The `replace_lines` and `replace_bytes` modes replace only a range of an existing file, streaming
+    the rest of it (see `_rewrite_file_range`), so small edits to large files don't require resending
+    the whole file. The `append` mode appends to the file in place, for chunked uploads.
 
     Args:
         repo_path: The path to the repository's working directory.
         file_path: The path to the file to write to, relative to the repository.
-        content: The string content to write to the file.
+        content: The string content to write to the file, or the replacement text / chunk.
+        mode: How the content is applied. Defaults to `WriteMode.OVERWRITE`.
+        start_line: The 1-based first line to replace, for `replace_lines`.
+        end_line: The 1-based last line to replace (inclusive), for `replace_lines`.
+        start_byte: The 0-based first byte to replace, for `replace_bytes`.
+        end_byte: The 0-based byte offset past the last byte to replace, for `replace_bytes`.
 
     Returns:
-        A string indicating the success of the write operation, including diff and TSC output,
+        A string indicating the success of the write operation, including diff and validator output,
         or an error message.
     """
     try:
         full_file_path = Path(repo_path) / file_path
-        
-        original_content = ""
-        file_existed = full_file_path.exists()
-        if file_existed:
-            with open(full_file_path, 'r') as f:
-                original_content = f.read()
-
-        full_file_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(full_file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-        
-        with open(full_file_path, 'rb') as f_read_back:
-            written_bytes = f_read_back.read()
-        
-        logging.debug(f"Content input to write_to_file (repr): {content!r}")
-        logging.debug(f"Raw bytes written to file: {written_bytes!r}")
-        logging.debug(f"Input content encoded (UTF-8): {content.encode('utf-8')!r}")
+        loop = asyncio.get_running_loop()
+
+        if mode == WriteMode.APPEND:
+            def append() -> int:
+                full_file_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(full_file_path, 'ab') as f:
+                    f.write(content.encode('utf-8'))
+                    return f.tell()
+            size = await loop.run_in_executor(None, append)
+            return f"Appended {len(content.encode('utf-8'))} bytes to {file_path} (now {size} bytes)."
+
+        if mode in (WriteMode.REPLACE_LINES, WriteMode.REPLACE_BYTES):
+            if not full_file_path.is_file():
+                return f"Error: File not found at {full_file_path}. AI_HINT: Mode '{mode.value}' edits an existing file; use mode 'overwrite' to create it."
+            try:
+                described, old_region, new_region, first_line, changed = await loop.run_in_executor(
+                    None, _write_file_range, full_file_path, mode, content, start_line, end_line, start_byte, end_byte
+                )
+            except ValueError as e:
+                return f"Error: Invalid range for mode '{mode.value}': {e}. AI_HINT: Check the file's current length with git_read_file and resend the range."
+            if not changed:
+                return f"No changes made: {described} of {file_path} already have this content (the file was not rewritten)."
+            _writes_finished(repo_path)
+            result_message = f"Successfully replaced {described} of {file_path}."
+            try:
+                diff = await cpu_pool.run(
+                    _unified_diff_text, old_region, new_region, file_path, first_line,
+                    size=len(old_region) + len(new_region),
+                )
+                result_message += f"\nDiff:\n{diff}"
+            except TimeoutError:
+                result_message += f"\nDiff was not computed: it took longer than {cpu_pool.timeout} seconds."
+            result_message += await _validate_after_edit(repo_path, [file_path])
+            return result_message
+
+        new_bytes = content.encode('utf-8')
 
-        if written_bytes != content.encode('utf-8'):
-            logging.error("Mismatch between input content and written bytes! File corruption detected during write.")
-            return "Mismatch between input content and written bytes! File corruption detected during write."
+        original_bytes: Optional[bytes] = None
+        if full_file_path.exists():
+            with open(full_file_path, 'rb') as f:
+                original_bytes = f.read()
+
+        if original_bytes == new_bytes:
+            return f"No changes made: {file_path} already has this content (the file was not rewritten)."
+
+        logging.debug(f"Content input to write_to_file (repr): {content!r}")
+        await loop.run_in_executor(None, _atomic_write_many, {full_file_path: new_bytes})
+        _writes_finished(repo_path)
 
         result_message = ""
-        if not file_existed:
+        if original_bytes is None:
             result_message = f"Successfully created new file: {file_path}."
         else:
+            original_content = original_bytes.decode('utf-8', errors='replace')
             result_message += await _generate_diff_output(original_content, content, file_path)
 
-        result_message += await _run_tsc_if_applicable(repo_path, file_path)
+        result_message += await _validate_after_edit(repo_path, [file_path])
 
         return result_message
     except Exception as e:
         return f"UNEXPECTED_ERROR: Failed to write to file '{file_path}': {e}. AI_HINT: Check file permissions, disk space, and review server logs for more details."
 
-async def execute_custom_command(repo_path: str, command: str) -> str:
+async def write_files_content(repo_path: str, files: List[Dict[str, Any]]) -> str:
+    """
+    Writes many files in one call. The new contents are staged as temporary files concurrently,
+    and once all of them were written they are renamed over their targets together, so a failure
+    leaves every file unchanged. Files that already have their content are not touched, and the
+    post-edit validators run once for the whole set.
+
+    Args:
+        repo_path: The path to the repository's working directory.
+        files: The files, as dictionaries with the fields of `FileWrite`.
+
+    Returns:
+        A one-line summary per file followed by the validator output, or an error message.
+    """
+    if not files:
+        return "Error: No files were provided. AI_HINT: Pass at least one entry in `files`."
+    writes: Dict[str, bytes] = {}
+    for raw_file in files:
+        entry = FileWrite.model_validate(raw_file)
+        if entry.file_path in writes:
+            return f"Error: {entry.file_path} appears more than once. AI_HINT: Send each file once per call."
+        writes[entry.file_path] = entry.content.encode('utf-8')
+
+    loop = asyncio.get_running_loop()
+
+    def read_original(file_path: str) -> Optional[bytes]:
+        with suppress(FileNotFoundError):
+            return (Path(repo_path) / file_path).read_bytes()
+        return None
+
+    try:
+        originals = await asyncio.gather(*(loop.run_in_executor(None, read_original, path) for path in writes))
+        changed = [path for path, original in zip(writes, originals) if original != writes[path]]
+        staged_results = await asyncio.gather(
+            *(loop.run_in_executor(None, _stage_temp_file, Path(repo_path) / path, writes[path]) for path in changed),
+            return_exceptions=True,
+        )
+        staged = [
+            (tmp_name, Path(repo_path) / path)
+            for path, tmp_name in zip(changed, staged_results)
+            if isinstance(tmp_name, str)
+        ]
+        errors = [result for result in staged_results if isinstance(result, BaseException)]
+        if errors:
+            _discard_temp_files(staged)
+            raise errors[0]
+        await loop.run_in_executor(None, _commit_temp_files, staged)
+    except PartialWriteError as e:
+        return _partial_write_message(repo_path, e)
+    except Exception as e:
+        return f"UNEXPECTED_ERROR: Failed to write files: {e}. No files were changed. AI_HINT: Check file permissions, disk space, and review server logs for more details."
+    _writes_finished(repo_path)
+
+    async def line_counts(original: bytes, data: bytes) -> Optional[Tuple[int, int]]:
+        try:
+            return await cpu_pool.run(_diff_line_counts, original, data, size=len(original) + len(data))
+        except TimeoutError:
+            return None
+
+    counts = await asyncio.gather(*(
+        line_counts(original, data)
+        for (path, data), original in zip(writes.items(), originals)
+        if original is not None and original != data
+    ))
+    updated = iter(counts)
+    summary = []
+    for (path, data), original in zip(writes.items(), originals):
+        if original is None:
+            summary.append(f"{path}: created ({len(data)} bytes)")
+        elif original == data:
+            summary.append(f"{path}: unchanged")
+        else:
+            count = next(updated)
+            summary.append(f"{path}: updated (+{count[0]} -{count[1]} lines)" if count else f"{path}: updated")
+    result_message = f"Successfully wrote {len(changed)} of {len(writes)} files.\n" + "\n".join(summary)
+    result_message += await _validate_after_edit(repo_path, changed)
+    return result_message
+
+COMMAND_OUTPUT_MAX_BYTES = int(os.getenv("MCP_DEVTOOLS_COMMAND_OUTPUT_BYTES", str(256 * 1024)))
+PROGRESS_INTERVAL = float(os.getenv("MCP_DEVTOOLS_PROGRESS_INTERVAL", "0.5"))
+PROGRESS_MAX_BYTES = int(os.getenv("MCP_DEVTOOLS_PROGRESS_BYTES", str(8 * 1024)))
+
+class _OutputCapture:
+    """
+    The output of one stream of a command, bounded in memory: the first half of `max_bytes` of lines
+    is kept, then the most recent lines fit in the other half, and lines in between are only counted.
+    Sizes are UTF-8 bytes.
+    """
+
+    def __init__(self, max_bytes: int = COMMAND_OUTPUT_MAX_BYTES):
+        self.half = max(1, max_bytes // 2)
+        self.head: List[str] = []
+        self.head_bytes = 0
+        self.tail: "deque[Tuple[str, int]]" = deque()
+        self.tail_bytes = 0
+        self.omitted_lines = 0
+        self.omitted_bytes = 0
+
+    def add(self, line: str) -> None:
+        size = len(line.encode("utf-8"))
+        if not self.tail and self.head_bytes + size <= self.half:
+            self.head.append(line)
+            self.head_bytes += size
+            return
+        self.tail.append((line, size))
+        self.tail_bytes += size
+        while self.tail_bytes > self.half and len(self.tail) > 1:
+            _, dropped = self.tail.popleft()
+            self.tail_bytes -= dropped
+            self.omitted_lines += 1
+            self.omitted_bytes += dropped
+
+    def text(self) -> str:
+        parts = ["".join(self.head)]
+        if self.omitted_lines:
+            parts.append(f"\n... [{self.omitted_lines} lines ({self.omitted_bytes} bytes) omitted] ...\n")
+        parts.append("".join(line for line, _ in self.tail))
+        return "".join(parts).strip()
+
+class _ProgressReporter:
+    """
+    Streams command output lines to the client as MCP progress notifications, batched to at most one
+    notification per `interval` seconds and `max_bytes` of UTF-8 text (older lines of a larger batch are
+    skipped; the final result still has them). A failed notification stops the stream.
+    """
+
+    def __init__(self, session: ServerSession, progress_token: str | int, request_id: Any = None,
+                 interval: float = PROGRESS_INTERVAL, max_bytes: int = PROGRESS_MAX_BYTES):
+        self.session = session
+        self.progress_token = progress_token
+        self.request_id = request_id
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.lines = 0
+        self.notifications = 0
+        self._pending: "deque[str]" = deque()
+        self._pending_bytes = 0
+        self._skipped = 0
+        self._failed = False
+
+    def add(self, line: str) -> None:
+        self.lines += 1
+        if self._failed:
+            return
+        self._pending.append(line)
+        self._pending_bytes += len(line.encode("utf-8"))
+        while self._pending_bytes > self.max_bytes and len(self._pending) > 1:
+            self._pending_bytes -= len(self._pending.popleft().encode("utf-8"))
+            self._skipped += 1
+
+    async def flush(self) -> None:
+        if self._failed or not self._pending:
+            return
+        message = "".join(self._pending).rstrip("\n")
+        if self._skipped:
+            message = f"[{self._skipped} lines skipped]\n{message}"
+        self._pending.clear()
+        self._pending_bytes = 0
+        self._skipped = 0
+        try:
+            await self.session.send_progress_notification(
+                progress_token=self.progress_token,
+                progress=self.lines,
+                message=message,
+                related_request_id=self.request_id,
+            )
+            self.notifications += 1
+        except Exception as e:
+            logger.debug(f"Stopped streaming command output: {e}")
+            self._failed = True
+
+    async def run(self) -> None:
+        """
+        Flushes pending lines every `interval` seconds until cancelled.
+        """
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+async def _read_lines(stream: asyncio.StreamReader, capture: _OutputCapture,
+                      reporter: Optional[_ProgressReporter], prefix: str) -> None:
+    """
+    Reads a stream to its end line by line, without a line length limit, feeding each line to the
+    capture and, if streaming, the progress reporter.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer = ""
+    while True:
+        chunk = await stream.read(65536)
+        buffer += decoder.decode(chunk, final=not chunk)
+        lines = [line + "\n" for line in buffer.split("\n")]
+        buffer = lines.pop()[:-1]
+        # A last line without a newline is kept unless the stream ended or it grew too long (e.g. \r progress bars)
+        if buffer and (not chunk or len(buffer) >= 65536):
+            lines.append(buffer)
+            buffer = ""
+        for line in lines:
+            capture.add(line)
+            if reporter is not None:
+                reporter.add(prefix + line)
+        if not chunk:
+            return
+
+async def execute_custom_command(
+    repo_path: str,
+    command: str,
+    session: Optional[ServerSession] = None,
+    progress_token: Optional[str | int] = None,
+    request_id: Any = None,
+) -> str:
     """
-    Executes a custom shell command within the specified repository path.
+    Executes a custom shell command within the specified repository path. Output is read line by
+    line as it is produced; with a session and progress token it is streamed to the client as
+    progress notifications while the command runs. Only the beginning and end of very long output
+    are kept for the result (see `_OutputCapture`).
 
     Args:
         repo_path: The path to the directory where the command should be executed.
         command: The shell command string to execute.
+        session: The client session to stream output to, if any.
+        progress_token: The progress token of the client's request; output is streamed only if set.
+        request_id: The ID of the client's request, to relate the notifications to it.
 
     Returns:
         A string containing the stdout and stderr of the command, and an indication
@@ -983,13 +6290,33 @@ async def execute_custom_command(repo_path: str, command: str) -> str:
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE
         )
-        stdout, stderr = await process.communicate()
+        assert process.stdout is not None and process.stderr is not None
+        reporter = None
+        if session is not None and progress_token is not None:
+            reporter = _ProgressReporter(session, progress_token, request_id, PROGRESS_INTERVAL, PROGRESS_MAX_BYTES)
+        stdout, stderr = _OutputCapture(COMMAND_OUTPUT_MAX_BYTES), _OutputCapture(COMMAND_OUTPUT_MAX_BYTES)
+        ticker = asyncio.create_task(reporter.run()) if reporter is not None else None
+        try:
+            await asyncio.gather(
+                _read_lines(process.stdout, stdout, reporter, ""),
+                _read_lines(process.stderr, stderr, reporter, "STDERR: "),
+            )
+            await process.wait()
+        finally:
+            if ticker is not None:
+                ticker.cancel()
+            if process.returncode is None:
+                with suppress(ProcessLookupError):
+                    process.kill()
+        if reporter is not None:
+            await reporter.flush()
 
         output = ""
-        if stdout:
-            output += f"STDOUT:\n{stdout.decode().strip()}\n"
-        if stderr:
-            output += f"STDERR:\n{stderr.decode().strip()}\n"
+        stdout_text, stderr_text = stdout.text(), stderr.text()
+        if stdout_text:
+            output += f"STDOUT:\n{stdout_text}\n"
+        if stderr_text:
+            output += f"STDERR:\n{stderr_text}\n"
         if process.returncode != 0:
             output += f"Command failed with exit code {process.returncode}"
         
@@ -1089,29 +6416,29 @@ async def ai_edit_files(
     try:
         # Capture the current HEAD commit hash before Aider runs
         try:
-            repo = git.Repo(directory_path)
-            try:
-                if repo.head.is_valid():
-                    try:
-                        pre_aider_commit_hash = repo.head.commit.hexsha
-                        logger.debug(f"Pre-Aider HEAD commit: {pre_aider_commit_hash}")
-                    except (ValueError, AttributeError, IndexError):
-                        # Fallback: use git_log to get last commit hash
-                        log_entries = git_log(repo, max_count=1)
-                        if log_entries:
-                            # Parse hash from "Commit: <hash>" line
-                            first_line = log_entries[0].splitlines()[0]
-                            if first_line.startswith("Commit: "):
-                                pre_aider_commit_hash = first_line.split("Commit: ")[1].strip()
-                                logger.debug(f"Pre-Aider HEAD commit (from git_log): {pre_aider_commit_hash}")
+            with repo_pool.lease(directory_path) as repo:
+                try:
+                    if repo.head.is_valid():
+                        try:
+                            pre_aider_commit_hash = repo.head.commit.hexsha
+                            logger.debug(f"Pre-Aider HEAD commit: {pre_aider_commit_hash}")
+                        except (ValueError, AttributeError, IndexError):
+                            # Fallback: use git_log to get last commit hash
+                            log_entries = git_log(repo, max_count=1)
+                            if log_entries:
+                                # Parse hash from "Commit: <hash>" line
+                                first_line = log_entries[0].splitlines()[0]
+                                if first_line.startswith("Commit: "):
+                                    pre_aider_commit_hash = first_line.split("Commit: ")[1].strip()
+                                    logger.debug(f"Pre-Aider HEAD commit (from git_log): {pre_aider_commit_hash}")
+                                else:
+                                    logger.debug("git_log did not return a commit hash line.")
                             else:
-                                logger.debug("git_log did not return a commit hash line.")
-                        else:
-                            logger.debug("git_log returned no entries; repository may be empty.")
-                else:
-                    logger.debug("Repository has no commits yet or detached HEAD before Aider.")
-            except Exception as e:
-                logger.debug(f"Error retrieving pre-Aider HEAD commit: {e}")
+                                logger.debug("git_log returned no entries; repository may be empty.")
+                    else:
+                        logger.debug("Repository has no commits yet or detached HEAD before Aider.")
+                except Exception as e:
+                    logger.debug(f"Error retrieving pre-Aider HEAD commit: {e}")
         except git.InvalidGitRepositoryError:
             logger.warning(f"Directory {directory_path} is not a valid Git repository. Cannot capture pre-Aider commit hash.")
         except Exception as e:
@@ -1168,48 +6495,48 @@ async def ai_edit_files(
                 result_message = "Code changes completed and committed successfully."
                 
                 try:
-                    # Re-initialize repo object to get latest state after Aider potentially made changes
-                    repo = git.Repo(directory_path)
+                    # Lease a repo handle to read the latest state after Aider potentially made changes
+                    with repo_pool.lease(directory_path) as repo:
                     
-                    post_aider_commit_hash = None
-                    try:
-                        if repo.head.is_valid():
-                            try:
-                                post_aider_commit_hash = repo.head.commit.hexsha
-                                logger.debug(f"Post-Aider HEAD commit: {post_aider_commit_hash}")
-                            except (ValueError, AttributeError, IndexError):
-                                # Fallback: use git_log to get last commit hash
-                                log_entries = git_log(repo, max_count=1)
-                                if log_entries:
-                                    first_line = log_entries[0].splitlines()[0]
-                                    if first_line.startswith("Commit: "):
-                                        post_aider_commit_hash = first_line.split("Commit: ")[1].strip()
-                                        logger.debug(f"Post-Aider HEAD commit (from git_log): {post_aider_commit_hash}")
+                        post_aider_commit_hash = None
+                        try:
+                            if repo.head.is_valid():
+                                try:
+                                    post_aider_commit_hash = repo.head.commit.hexsha
+                                    logger.debug(f"Post-Aider HEAD commit: {post_aider_commit_hash}")
+                                except (ValueError, AttributeError, IndexError):
+                                    # Fallback: use git_log to get last commit hash
+                                    log_entries = git_log(repo, max_count=1)
+                                    if log_entries:
+                                        first_line = log_entries[0].splitlines()[0]
+                                        if first_line.startswith("Commit: "):
+                                            post_aider_commit_hash = first_line.split("Commit: ")[1].strip()
+                                            logger.debug(f"Post-Aider HEAD commit (from git_log): {post_aider_commit_hash}")
+                                        else:
+                                            logger.debug("git_log did not return a commit hash line.")
                                     else:
-                                        logger.debug("git_log did not return a commit hash line.")
-                                else:
-                                    logger.debug("git_log returned no entries; repository may be empty.")
-                        else:
-                            logger.debug("Repository has no commits or detached HEAD after Aider.")
-                    except Exception as e:
-                        logger.debug(f"Error retrieving post-Aider HEAD commit: {e}")
-
-                    if pre_aider_commit_hash and post_aider_commit_hash and pre_aider_commit_hash != post_aider_commit_hash:
-                        # Generate diff between the two commit hashes
-                        diff_output = repo.git.diff(pre_aider_commit_hash, post_aider_commit_hash)
-                        if diff_output:
-                            result_message += f"\n\nDiff of changes made by Aider:\n```diff\n{diff_output}\n```"
-                        else:
-                            result_message += "\n\nNo diff generated between pre and post Aider commits (perhaps no changes were made or it's an empty commit)."
-                    elif not pre_aider_commit_hash and post_aider_commit_hash:
-                        # Case: Repo was empty before, now has commits. Diff against NULL_TREE.
-                        diff_output = repo.git.diff(git.NULL_TREE, post_aider_commit_hash)
-                        if diff_output:
-                            result_message += f"\n\nDiff of changes made by Aider (initial commit):\n```diff\n{diff_output}\n```"
+                                        logger.debug("git_log returned no entries; repository may be empty.")
+                            else:
+                                logger.debug("Repository has no commits or detached HEAD after Aider.")
+                        except Exception as e:
+                            logger.debug(f"Error retrieving post-Aider HEAD commit: {e}")
+
+                        if pre_aider_commit_hash and post_aider_commit_hash and pre_aider_commit_hash != post_aider_commit_hash:
+                            # Generate diff between the two commit hashes
+                            diff_output = repo.git.diff(pre_aider_commit_hash, post_aider_commit_hash)
+                            if diff_output:
+                                result_message += f"\n\nDiff of changes made by Aider:\n```diff\n{diff_output}\n```"
+                            else:
+                                result_message += "\n\nNo diff generated between pre and post Aider commits (perhaps no changes were made or it's an empty commit)."
+                        elif not pre_aider_commit_hash and post_aider_commit_hash:
+                            # Case: Repo was empty before, now has commits. Diff against NULL_TREE.
+                            diff_output = repo.git.diff(git.NULL_TREE, post_aider_commit_hash)
+                            if diff_output:
+                                result_message += f"\n\nDiff of changes made by Aider (initial commit):\n```diff\n{diff_output}\n```"
+                            else:
+                                result_message += "\n\nNo diff generated for the initial commit (perhaps no changes were made or it's an empty commit)."
                         else:
-                            result_message += "\n\nNo diff generated for the initial commit (perhaps no changes were made or it's an empty commit)."
-                    else:
-                        result_message += "\n\nNo new commit detected or no changes made by Aider."
+                            result_message += "\n\nNo new commit detected or no changes made by Aider."
 
                 except git.InvalidGitRepositoryError:
                     result_message += "\n\nCould not access Git repository to get diff after Aider run."
@@ -1337,12 +6664,12 @@ async def list_tools() -> list[Tool]:
         ),
         Tool(
             name=GitTools.DIFF_ALL,
-            description="Shows all changes in the working directory, including both staged and unstaged modifications, compared to the HEAD commit. This provides a comprehensive view of all local changes.",
+            description="Shows all changes in the working directory, including both staged and unstaged modifications, compared to the HEAD commit. This provides a comprehensive view of all local changes. Output can be limited to some paths, summarized with mode 'stat' or 'name-only', and is paged by file: when more files remain, the output ends with a 'Next cursor' value to pass back as `cursor`.",
             inputSchema=GitDiffAll.model_json_schema(),
         ),
         Tool(
             name=GitTools.DIFF,
-            description="Shows differences between the current working directory and a specified Git target (e.g., another branch, a specific commit hash, or a tag).",
+            description="Shows differences between the current working directory and a specified Git target (e.g., another branch, a specific commit hash, or a tag), or between two revisions ('A..B'). Output can be limited to some paths, summarized with mode 'stat' or 'name-only', and is paged by file: when more files remain, the output ends with a 'Next cursor' value to pass back as `cursor`.",
             inputSchema=GitDiff.model_json_schema(),
         ),
         Tool(
@@ -1357,7 +6684,7 @@ async def list_tools() -> list[Tool]:
         ),
         Tool(
             name=GitTools.LOG,
-            description="Shows the commit history for the repository, listing recent commits with their hash, author, date, and message. The number of commits can be limited.",
+            description="Shows the commit history for the repository, listing recent commits with their hash, author, date, and message. The number of commits can be limited, and results can be filtered by path, author or date. When more commits are available, the output ends with a 'Next cursor' value that can be passed back as `cursor` to fetch the next page.",
             inputSchema=GitLog.model_json_schema(),
         ),
         Tool(
@@ -1372,32 +6699,52 @@ async def list_tools() -> list[Tool]:
         ),
         Tool(
             name=GitTools.SHOW,
-            description="Shows the metadata (author, date, message) and the diff of a specific commit. This allows inspection of changes introduced by a particular commit.",
+            description="Shows the metadata (author, date, message) and the diff of a specific commit, with renames and copies detected. This allows inspection of changes introduced by a particular commit. Large patches are truncated per file and in total with clear markers; use `paths` to focus on some files or `stat_only` for a summary.",
             inputSchema=GitShow.model_json_schema(),
         ),
         Tool(
             name=GitTools.APPLY_DIFF,
-            description="Applies a given diff content (in unified diff format) to the working directory of the repository. This can be used to programmatically apply patches or changes.",
+            description="Applies a given diff content (in unified diff format, one or many files) to the working directory of the repository. This can be used to programmatically apply patches or changes. The result includes the new diff of every touched file. Set `dry_run` to only check that the diff applies.",
             inputSchema=GitApplyDiff.model_json_schema(),
         ),
         Tool(
             name=GitTools.READ_FILE,
-            description="Reads and returns the entire content of a specified file within the Git repository's working directory. The file path must be relative to the repository root.",
+            description="Reads and returns the entire content of a specified file within the Git repository's working directory, or at a given revision if `revision` is provided. The file path must be relative to the repository root.",
             inputSchema=GitReadFile.model_json_schema(),
         ),
         Tool(
             name=GitTools.SEARCH_AND_REPLACE,
-            description="Searches for a specified string or regex pattern within a file and replaces all occurrences with a new string. Supports case-insensitive search and line-range restrictions. It attempts to use `sed` for efficiency, falling back to Python logic if `sed` fails or makes no changes.",
+            description="Searches for a specified string or regex pattern within a file and replaces all occurrences with a new string. Supports case-insensitive search and line-range restrictions. The search string is treated literally when it occurs in the line range and as a regex otherwise; the replacement runs in-process without spawning `sed`.",
             inputSchema=SearchAndReplace.model_json_schema(),
         ),
+        Tool(
+            name=GitTools.MULTI_EDIT,
+            description="Applies an ordered list of search-and-replace edits (literal or regex, with optional line ranges) to one file as a single transaction. Each edit sees the result of the previous ones. The file is written once, atomically, only if every edit matches; the result is one combined diff and one run of the post-edit validators. Prefer this over several `search_and_replace` calls on the same file.",
+            inputSchema=MultiEdit.model_json_schema(),
+        ),
+        Tool(
+            name=GitTools.SEARCH_AND_REPLACE_FILES,
+            description="Searches for a string or regex pattern in every tracked file matching the given paths or globs and replaces all occurrences, as a codemod across the repository. Returns the number of changes per file and an aggregated, size-capped diff. Files are written together only after every replacement finished, so an interrupted call leaves no file changed.",
+            inputSchema=SearchAndReplaceFiles.model_json_schema(),
+        ),
         Tool(
             name=GitTools.WRITE_TO_FILE,
-            description="Writes the provided content to a specified file within the repository. If the file does not exist, it will be created. If it exists, its content will be completely overwritten. Includes a check to ensure content was written correctly and generates a diff.",
+            description="Writes the provided content to a specified file within the repository. If the file does not exist, it will be created. If it exists, its content will be completely overwritten. The file is replaced atomically (written to a temporary file and renamed over the target), is left untouched if it already has the content, and a diff is generated. Set `mode` to replace only a line or byte range of an existing file, or to append chunks when uploading a large new file.",
             inputSchema=WriteToFile.model_json_schema(),
         ),
+        Tool(
+            name=GitTools.WRITE_FILES,
+            description="Writes many files in one call, e.g. when scaffolding. Files are created or completely overwritten; they are written concurrently and renamed into place together, so a failure while writing leaves every file unchanged (if renaming fails partway, the response lists the files that were replaced). Returns one summary line per file (created, updated with line counts, or unchanged) and runs the post-edit validators once for the whole set.",
+            inputSchema=WriteFiles.model_json_schema(),
+        ),
+        Tool(
+            name=GitTools.GET_VALIDATION_RESULTS,
+            description="Returns the post-edit validation results (TSC, syntax checks and configured validators) of recent edits when the server runs in deferred validation mode (MCP_DEVTOOLS_VALIDATION_MODE=deferred). In that mode edits return without validating; the repository's edited files are validated together once edits pause, and this tool waits for and returns the latest results.",
+            inputSchema=GetValidationResults.model_json_schema(),
+        ),
         Tool(
             name=GitTools.EXECUTE_COMMAND,
-            description="Executes an arbitrary shell command within the context of the specified repository's working directory. This tool can be used for tasks not covered by other specific Git tools, such as running build scripts, linters, or other system commands.",
+            description="Executes an arbitrary shell command within the context of the specified repository's working directory. This tool can be used for tasks not covered by other specific Git tools, such as running build scripts, linters, or other system commands. If the request carries a progress token, output lines are streamed as progress notifications while the command runs; the result keeps the beginning and end of very long output.",
             inputSchema=ExecuteCommand.model_json_schema(),
         ),
         Tool(
@@ -1496,154 +6843,247 @@ async def call_tool(name: str, arguments: dict) -> list[Content]:
                 )
             ]
         repo_path = Path(repo_path_arg)
-        
-        repo = None
+
         try:
-            match name:
-                case GitTools.STATUS:
-                    repo = git.Repo(repo_path)
-                    status = git_status(repo)
-                    return [TextContent(
-                        type="text",
-                        text=f"Repository status:\n{status}"
-                    )]
-                case GitTools.DIFF_ALL:
-                    repo = git.Repo(repo_path)
-                    diff = git_diff_all(repo)
-                    return [TextContent(
-                        type="text",
-                        text=f"All changes (staged and unstaged):\n{diff}"
-                    )]
-                case GitTools.DIFF:
-                    repo = git.Repo(repo_path)
-                    diff = git_diff(repo, arguments["target"])
-                    return [TextContent(
-                        type="text",
-                        text=f"Diff with {arguments['target']}:\n{diff}"
-                    )]
-                case GitTools.STAGE_AND_COMMIT:
-                    repo = git.Repo(repo_path)
-                    result = git_stage_and_commit(repo, arguments["message"], arguments.get("files"))
-                    return [TextContent(
-                        type="text",
-                        text=result
-                    )]
-                case GitTools.RESET:
-                    repo = git.Repo(repo_path)
-                    result = git_reset(repo)
-                    return [TextContent(
-                        type="text",
-                        text=result
-                    )]
-                case GitTools.LOG:
-                    repo = git.Repo(repo_path)
-                    log = git_log(repo, arguments.get("max_count", 10))
-                    return [TextContent(
-                        type="text",
-                        text="Commit history:\n" + "\n".join(log)
-                    )]
-                case GitTools.CREATE_BRANCH:
-                    repo = git.Repo(repo_path)
-                    result = git_create_branch(
-                        repo,
-                        arguments["branch_name"],
-                        arguments.get("base_branch")
-                    )
-                    return [TextContent(
-                        type="text",
-                        text=result
-                    )]
-                case GitTools.CHECKOUT:
-                    repo = git.Repo(repo_path)
-                    result = git_checkout(repo, arguments["branch_name"])
-                    return [TextContent(
-                        type="text",
-                        text=result
-                    )]
-                case GitTools.SHOW:
-                    repo = git.Repo(repo_path)
-                    result = git_show(repo, arguments["revision"])
-                    return [TextContent(
-                        type="text",
-                        text=result
-                    )]
-                case GitTools.APPLY_DIFF:
-                    repo = git.Repo(repo_path)
-                    result = await git_apply_diff(repo, arguments["diff_content"])
-                    return [TextContent(
-                        type="text",
-                        text=result
-                    )]
-                case GitTools.READ_FILE:
-                    repo = git.Repo(repo_path)
-                    result = git_read_file(repo, arguments["file_path"])
-                    return [TextContent(
-                        type="text",
-                        text=result
-                    )]
-                case GitTools.SEARCH_AND_REPLACE:
-                    result = await search_and_replace_in_file(
-                        repo_path=str(repo_path),
-                        file_path=arguments["file_path"],
-                        search_string=arguments["search_string"],
-                        replace_string=arguments["replace_string"],
-                        ignore_case=arguments.get("ignore_case", False),
-                        start_line=arguments.get("start_line"),
-                        end_line=arguments.get("end_line")
-                    )
-                    return [TextContent(
-                        type="text",
-                        text=result
-                    )]
-                case GitTools.WRITE_TO_FILE:
-                    logging.debug(f"Content input to write_to_file: {arguments['content']}")
-                    result = await write_to_file_content(
-                        repo_path=str(repo_path),
-                        file_path=arguments["file_path"],
-                        content=arguments["content"]
-                    )
-                    logging.debug(f"Content before TextContent: {result}")
-                    return [TextContent(
-                        type="text",
-                        text=result
-                    )]
-                case GitTools.EXECUTE_COMMAND:
-                    result = await execute_custom_command(
-                        repo_path=str(repo_path),
-                        command=arguments["command"]
-                    )
-                    return [TextContent(
-                        type="text",
-                        text=result
-                    )]
-                case GitTools.AI_EDIT:
-                    message = arguments.get("message", "")
-                    files = arguments["files"] # files is now mandatory
-                    options = arguments.get("options", [])
-                    result = await ai_edit_files(
-                        repo_path=str(repo_path),
-                        message=message,
-                        session=mcp_server.request_context.session,
-                        files=files,
-                        options=options,
-                        edit_format=EditFormat(arguments.get("edit_format", EditFormat.DIFF.value)),
-                    )
-                    return [TextContent(
-                        type="text",
-                        text=result
-                    )]
-                case GitTools.AIDER_STATUS:
-                    check_environment = arguments.get("check_environment", True)
-                    result = await aider_status_tool(
-                        repo_path=str(repo_path),
-                        check_environment=check_environment
-                    )
-                    return [TextContent(
-                        type="text",
-                        text=result
-                    )]
-                case _:
-                    raise ValueError(f"Unknown tool: {name}")
+            async with tool_scheduler.access(repo_path, name), state_cache.invalidating(repo_path, name):
+                match name:
+                    case GitTools.STATUS:
+                        status = await _run_state_tool(repo_path, GitTools.STATUS, git_status)
+                        return [TextContent(
+                            type="text",
+                            text=f"Repository status:\n{status}"
+                        )]
+                    case GitTools.DIFF_ALL:
+                        diff, next_cursor = await _run_state_tool(
+                            repo_path,
+                            GitTools.DIFF_ALL,
+                            git_diff_all_page,
+                            arguments.get("paths"),
+                            DiffMode(arguments.get("mode", DiffMode.PATCH.value)),
+                            arguments.get("cursor"),
+                            arguments.get("max_files", DIFF_PAGE_MAX_FILES)
+                        )
+                        text = f"All changes (staged and unstaged):\n{diff}"
+                        if next_cursor:
+                            text += f"\nNext cursor: {next_cursor}"
+                        return [TextContent(
+                            type="text",
+                            text=text
+                        )]
+                    case GitTools.DIFF:
+                        diff, next_cursor = await _run_git_tool(
+                            repo_path,
+                            git_diff_page,
+                            arguments["target"],
+                            arguments.get("paths"),
+                            DiffMode(arguments.get("mode", DiffMode.PATCH.value)),
+                            arguments.get("cursor"),
+                            arguments.get("max_files", DIFF_PAGE_MAX_FILES)
+                        )
+                        text = f"Diff with {arguments['target']}:\n{diff}"
+                        if next_cursor:
+                            text += f"\nNext cursor: {next_cursor}"
+                        return [TextContent(
+                            type="text",
+                            text=text
+                        )]
+                    case GitTools.STAGE_AND_COMMIT:
+                        result = await _run_git_tool(
+                            repo_path, git_stage_and_commit, arguments["message"], arguments.get("files")
+                        )
+                        return [TextContent(
+                            type="text",
+                            text=result
+                        )]
+                    case GitTools.RESET:
+                        result = await _run_git_tool(repo_path, git_reset)
+                        return [TextContent(
+                            type="text",
+                            text=result
+                        )]
+                    case GitTools.LOG:
+                        log, next_cursor = await _run_git_tool(
+                            repo_path,
+                            git_log_page,
+                            arguments.get("max_count", 10),
+                            arguments.get("cursor"),
+                            arguments.get("path"),
+                            arguments.get("author"),
+                            arguments.get("since")
+                        )
+                        commit_index.schedule(repo_path)
+                        text = "Commit history:\n" + "\n".join(log)
+                        if next_cursor:
+                            text += f"\nNext cursor: {next_cursor}"
+                        return [TextContent(
+                            type="text",
+                            text=text
+                        )]
+                    case GitTools.CREATE_BRANCH:
+                        result = await _run_git_tool(
+                            repo_path,
+                            git_create_branch,
+                            arguments["branch_name"],
+                            arguments.get("base_branch")
+                        )
+                        return [TextContent(
+                            type="text",
+                            text=result
+                        )]
+                    case GitTools.CHECKOUT:
+                        result = await _run_git_tool(repo_path, git_checkout, arguments["branch_name"])
+                        return [TextContent(
+                            type="text",
+                            text=result
+                        )]
+                    case GitTools.SHOW:
+                        result = await _run_git_tool(
+                            repo_path,
+                            git_show,
+                            arguments["revision"],
+                            arguments.get("paths"),
+                            arguments.get("stat_only", False),
+                            arguments.get("max_file_bytes"),
+                            arguments.get("max_total_bytes")
+                        )
+                        return [TextContent(
+                            type="text",
+                            text=result
+                        )]
+                    case GitTools.APPLY_DIFF:
+                        with repo_pool.lease(repo_path) as repo:
+                            result = await git_apply_diff(repo, arguments["diff_content"], arguments.get("dry_run", False))
+                        return [TextContent(
+                            type="text",
+                            text=result
+                        )]
+                    case GitTools.READ_FILE:
+                        result = await _run_git_tool(repo_path, git_read_file, arguments["file_path"], arguments.get("revision"))
+                        return [TextContent(
+                            type="text",
+                            text=result
+                        )]
+                    case GitTools.SEARCH_AND_REPLACE:
+                        result = await search_and_replace_in_file(
+                            repo_path=str(repo_path),
+                            file_path=arguments["file_path"],
+                            search_string=arguments["search_string"],
+                            replace_string=arguments["replace_string"],
+                            ignore_case=arguments.get("ignore_case", False),
+                            start_line=arguments.get("start_line"),
+                            end_line=arguments.get("end_line")
+                        )
+                        return [TextContent(
+                            type="text",
+                            text=result
+                        )]
+                    case GitTools.MULTI_EDIT:
+                        result = await multi_edit_file(
+                            repo_path=str(repo_path),
+                            file_path=arguments["file_path"],
+                            edits=arguments["edits"]
+                        )
+                        return [TextContent(
+                            type="text",
+                            text=result
+                        )]
+                    case GitTools.SEARCH_AND_REPLACE_FILES:
+                        result = await search_and_replace_in_files(
+                            repo_path=str(repo_path),
+                            search_string=arguments["search_string"],
+                            replace_string=arguments["replace_string"],
+                            paths=arguments.get("paths"),
+                            ignore_case=arguments.get("ignore_case", False),
+                            use_regex=arguments.get("use_regex"),
+                            max_diff_bytes=arguments.get("max_diff_bytes")
+                        )
+                        return [TextContent(
+                            type="text",
+                            text=result
+                        )]
+                    case GitTools.WRITE_TO_FILE:
+                        logging.debug(f"Content input to write_to_file: {arguments['content']}")
+                        result = await write_to_file_content(
+                            repo_path=str(repo_path),
+                            file_path=arguments["file_path"],
+                            content=arguments["content"],
+                            mode=WriteMode(arguments.get("mode", WriteMode.OVERWRITE)),
+                            start_line=arguments.get("start_line"),
+                            end_line=arguments.get("end_line"),
+                            start_byte=arguments.get("start_byte"),
+                            end_byte=arguments.get("end_byte")
+                        )
+                        logging.debug(f"Content before TextContent: {result}")
+                        return [TextContent(
+                            type="text",
+                            text=result
+                        )]
+                    case GitTools.WRITE_FILES:
+                        result = await write_files_content(
+                            repo_path=str(repo_path),
+                            files=arguments["files"]
+                        )
+                        return [TextContent(
+                            type="text",
+                            text=result
+                        )]
+                    case GitTools.GET_VALIDATION_RESULTS:
+                        result = await validation_scheduler.results(
+                            repo_path=str(repo_path),
+                            wait=arguments.get("wait", True),
+                            timeout=arguments.get("timeout", 30.0)
+                        )
+                        return [TextContent(
+                            type="text",
+                            text=result
+                        )]
+                    case GitTools.EXECUTE_COMMAND:
+                        # Output is streamed when the client asked for progress notifications
+                        session, progress_token, request_id = None, None, None
+                        with suppress(LookupError):
+                            request_context = mcp_server.request_context
+                            session = request_context.session
+                            progress_token = request_context.meta.progressToken if request_context.meta else None
+                            request_id = request_context.request_id
+                        result = await execute_custom_command(
+                            repo_path=str(repo_path),
+                            command=arguments["command"],
+                            session=session,
+                            progress_token=progress_token,
+                            request_id=request_id,
+                        )
+                        return [TextContent(
+                            type="text",
+                            text=result
+                        )]
+                    case GitTools.AI_EDIT:
+                        message = arguments.get("message", "")
+                        files = arguments["files"] # files is now mandatory
+                        options = arguments.get("options", [])
+                        result = await ai_edit_files(
+                            repo_path=str(repo_path),
+                            message=message,
+                            session=mcp_server.request_context.session,
+                            files=files,
+                            options=options,
+                            edit_format=EditFormat(arguments.get("edit_format", EditFormat.DIFF.value)),
+                        )
+                        return [TextContent(
+                            type="text",
+                            text=result
+                        )]
+                    case GitTools.AIDER_STATUS:
+                        check_environment = arguments.get("check_environment", True)
+                        result = await aider_status_tool(
+                            repo_path=str(repo_path),
+                            check_environment=check_environment
+                        )
+                        return [TextContent(
+                            type="text",
+                            text=result
+                        )]
+                    case _:
+                        raise ValueError(f"Unknown tool: {name}")
 
         except git.InvalidGitRepositoryError:
             # If the path is the user's home directory, return the specific warning
@@ -1713,12 +7153,85 @@ async def handle_post_message(scope, receive, send):
     """
     await sse_transport.handle_post_message(scope, receive, send)
 
+async def handle_stats(request):
+    """
+    Returns the server's internal resource counters as JSON, for monitoring.
+
+    Args:
+        request: The Starlette Request object.
+
+    Returns:
+        A Starlette JSONResponse with the counters of each shared resource.
+    """
+    return JSONResponse({
+        "repo_pool": repo_pool.stats(),
+        "git_workers": {"max_workers": GIT_WORKERS, **_git_tool_stats},
+        "scheduler": tool_scheduler.stats(),
+        "blob_store": blob_store.stats(),
+        "commit_index": commit_index.stats(),
+        "result_cache": result_cache.stats(),
+        "state_cache": state_cache.stats(),
+        "watchers": worktree_watchers.stats(),
+        "cpu_pool": cpu_pool.stats(),
+        "tsserver": tsserver_pool.stats(),
+        "validation_cache": validation_cache.stats(),
+        "validation": validation_scheduler.stats(),
+    })
+
+async def _housekeeping() -> None:
+    """
+    Periodically releases idle resources held by the server.
+    """
+    while True:
+        await asyncio.sleep(HOUSEKEEPING_INTERVAL)
+        try:
+            trimmed = repo_pool.close_idle()
+            if trimmed:
+                logger.debug(f"Closed git helper processes of {trimmed} idle repo handles")
+            stopped_watchers = worktree_watchers.close_idle()
+            if stopped_watchers:
+                logger.debug(f"Stopped {stopped_watchers} idle working tree watchers")
+            closed_readers = blob_store.close_idle()
+            if closed_readers:
+                logger.debug(f"Closed {closed_readers} idle cat-file blob readers")
+            stopped_tsservers = tsserver_pool.close_idle()
+            if stopped_tsservers:
+                logger.debug(f"Stopped {stopped_tsservers} idle tsserver processes")
+        except Exception as e:
+            logger.warning(f"Error during housekeeping: {e}")
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    """
+    Starts the housekeeping task for the lifetime of the application and releases
+    pooled resources on shutdown.
+
+    Args:
+        app: The Starlette application.
+    """
+    housekeeping_task = asyncio.create_task(_housekeeping())
+    try:
+        yield
+    finally:
+        housekeeping_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await housekeeping_task
+        _git_executor.shutdown(wait=False, cancel_futures=True)
+        cpu_pool.shutdown()
+        commit_index.shutdown()
+        worktree_watchers.clear()
+        validation_scheduler.clear()
+        tsserver_pool.clear()
+        repo_pool.clear()
+        blob_store.clear()
+
 routes = [
     Route("/sse", endpoint=handle_sse, methods=["GET"]),
+    Route("/stats", endpoint=handle_stats, methods=["GET"]),
     Mount(POST_MESSAGE_ENDPOINT, app=handle_post_message),
 ]
 
-app = Starlette(routes=routes)
+app = Starlette(routes=routes, lifespan=lifespan)
 
 if __name__ == "__main__":
     # To run the server, you would typically use uvicorn:
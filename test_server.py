@@ -236,6 +236,7 @@ async def test_generate_diff_output_empty_diff():
     assert "\nNo changes detected (file content was identical)." in result
 
 @pytest.mark.asyncio
+@patch('server.TSSERVER', 'off')
 @patch('server.execute_custom_command')
 async def test_run_tsc_if_applicable(mock_execute_custom_command):
     mock_execute_custom_command.return_value = "TSC ran successfully."
@@ -297,45 +298,48 @@ async def test_execute_custom_command(temp_git_repo):
     assert (repo_path / "no_output.txt").exists()
 
 @pytest.mark.asyncio
-async def test_write_to_file_content_bytes_mismatch_and_exception(tmp_path, monkeypatch):
+async def test_write_to_file_content_atomic_and_noop(tmp_path, monkeypatch):
+    import server
     from server import write_to_file_content
 
-    # Simulate written_bytes != content.encode('utf-8')
-    file_path = "mismatch.txt"
-    content = "abc"
-    full_path = tmp_path / file_path
-
-    # Patch open to simulate mismatch on read-back
-    import builtins
-    real_open = builtins.open
-
-    class FakeFile:
-        def __init__(self, *a, **kw):
-            self.lines = []
-            self.mode = a[1] if len(a) > 1 else ""
-            self.closed = False
-        def __enter__(self): return self
-        def __exit__(self, *a): return False
-        def write(self, data): self.lines.append(data)
-        def read(self): return b"xyz" if "b" in self.mode else "xyz"
-        def writelines(self, lines): self.lines.extend(lines)
-        def close(self): self.closed = True
-
-    def fake_open(path, mode="r", *a, **kw):
-        if "mismatch.txt" in str(path) and "rb" in mode:
-            return FakeFile(path, mode)
-        if "mismatch.txt" in str(path) and "w" in mode:
-            return FakeFile(path, mode)
-        return real_open(path, mode, *a, **kw)
-
-    monkeypatch.setattr(builtins, "open", fake_open)
-    result = await write_to_file_content(str(tmp_path), file_path, content)
-    assert "Mismatch between input content and written bytes!" in result or "Diff:" in result
+    target = tmp_path / "atomic.txt"
+    target.write_text("old\n")
+    target.chmod(0o600)
+    os.utime(target, ns=(1_000_000_000, 1_000_000_000))
+
+    # Identical content is a no-op that keeps the mtime
+    result = await write_to_file_content(str(tmp_path), "atomic.txt", "old\n")
+    assert result == "No changes made: atomic.txt already has this content (the file was not rewritten)."
+    assert target.stat().st_mtime_ns == 1_000_000_000
+
+    # Changed content is renamed into place, keeping permissions, and fsynced per the policy
+    fsynced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: (fsynced.append(fd), real_fsync(fd)))
+    monkeypatch.setattr(server, "WRITE_FSYNC", "always")
+    inode = target.stat().st_ino
+    result = await write_to_file_content(str(tmp_path), "atomic.txt", "new\n")
+    assert "-old" in result and "+new" in result
+    assert target.read_text() == "new\n"
+    assert target.stat().st_ino != inode and target.stat().st_mode & 0o777 == 0o600
+    assert len(fsynced) == 2  # the temporary file and the directory
+    assert not list(tmp_path.glob(".*.tmp"))
+
+    # A short write is detected without reading the file back and leaves the target untouched
+    real_fstat = os.fstat
+    class ShortStat:
+        st_size = 1
+    monkeypatch.setattr(os, "fstat", lambda fd: ShortStat())
+    result = await write_to_file_content(str(tmp_path), "atomic.txt", "newer\n")
+    assert "UNEXPECTED_ERROR: Failed to write to file 'atomic.txt': short write to" in result
+    assert target.read_text() == "new\n"
+    assert not list(tmp_path.glob(".*.tmp"))
+    monkeypatch.setattr(os, "fstat", real_fstat)
 
     # Simulate Exception during file writing
-    def raise_exc_open(*a, **kw):
+    def raise_exc(*a, **kw):
         raise Exception("write error")
-    monkeypatch.setattr(builtins, "open", raise_exc_open)
+    monkeypatch.setattr(tempfile, "mkstemp", raise_exc)
     result_exc = await write_to_file_content(str(tmp_path), "fail.txt", "fail")
     assert (
         "UNEXPECTED_ERROR: Failed to write to file 'fail.txt': write error. AI_HINT: Check file permissions, disk space, and review server logs for more details."
@@ -357,65 +361,71 @@ async def test_execute_custom_command_exception(monkeypatch, tmp_path):
     )
 
 @patch('server._generate_diff_output', new_callable=AsyncMock)
-@patch('server._run_tsc_if_applicable', new_callable=AsyncMock)
+@patch('server._run_validators', new_callable=AsyncMock)
 @patch('server.execute_custom_command', new_callable=AsyncMock)
 @pytest.mark.asyncio
-async def test_search_and_replace_in_file_sed_success(
-    mock_execute_custom_command, mock_run_tsc_if_applicable, mock_generate_diff_output, temp_git_repo
+async def test_search_and_replace_in_file_in_process(
+    mock_execute_custom_command, mock_run_validators, mock_generate_diff_output, temp_git_repo
 ):
     repo, repo_path = temp_git_repo
-    file_path = "test_sed.txt"
+    file_path = "test_replace.txt"
     (repo_path / file_path).write_text("line1\nsearch_term\nline3")
 
-    # Simulate sed success with no output, which will cause fallback to Python logic
-    mock_execute_custom_command.return_value = "" 
     mock_generate_diff_output.return_value = "\nDiff:\n-search_term\n+replace_term"
-    mock_run_tsc_if_applicable.return_value = ""
+    mock_run_validators.return_value = ""
 
     result = await search_and_replace_in_file(
         str(repo_path), "search_term", "replace_term", file_path, False, None, None
     )
-    # The assertion should now expect the fallback message
-    assert "Successfully replaced 'search_term' with 'replace_term' in test_sed.txt using literal search." in result
+    assert "Successfully replaced 'search_term' with 'replace_term' in test_replace.txt using literal search. Total changes: 1." in result
     assert (repo_path / file_path).read_text() == "line1\nreplace_term\nline3"
-    mock_execute_custom_command.assert_called_once()
-    assert "sed -i 's#search_term#replace_term#g'" in mock_execute_custom_command.call_args[0][1]
+    # No shell command is spawned for the replacement
+    mock_execute_custom_command.assert_not_called()
+    mock_generate_diff_output.assert_awaited_once_with("line1\nsearch_term\nline3", "line1\nreplace_term\nline3", file_path)
 
 @pytest.mark.asyncio
 @patch('server._generate_diff_output', new_callable=AsyncMock)
-@patch('server._run_tsc_if_applicable', new_callable=AsyncMock)
-@patch('server.execute_custom_command', new_callable=AsyncMock)
-async def test_search_and_replace_in_file_sed_fallback_to_python_failure(
-    mock_execute_custom_command, mock_run_tsc_if_applicable, mock_generate_diff_output, temp_git_repo
+@patch('server._run_validators', new_callable=AsyncMock)
+async def test_search_and_replace_compiled_pattern_cache(
+    mock_run_validators, mock_generate_diff_output, temp_git_repo
 ):
+    from server import _compile_search_pattern
+
     repo, repo_path = temp_git_repo
-    file_path = "test_fallback.txt"
-    (repo_path / file_path).write_text("line1\nsearch_term\nline3")
+    file_path = "test_cache.txt"
+    mock_generate_diff_output.return_value = ""
+    mock_run_validators.return_value = ""
+    _compile_search_pattern.cache_clear()
+
+    for i in range(3):
+        (repo_path / file_path).write_text("a1 b2\nc3 [x]\n")
+        result = await search_and_replace_in_file(
+            str(repo_path), r"[a-c](\d)", r"<\1>", file_path, False, None, None
+        )
+        assert "using regex search. Total changes: 3." in result
+        assert (repo_path / file_path).read_text() == "<1> <2>\n<3> [x]\n"
 
-    # Simulate sed failure
-    mock_execute_custom_command.return_value = "Command failed with exit code 1"
-    mock_generate_diff_output.return_value = "\nDiff:\n-search_term\n+replace_term"
-    mock_run_tsc_if_applicable.return_value = ""
+    # The literal and regex forms are each compiled once
+    info = _compile_search_pattern.cache_info()
+    assert info.misses == 2 and info.hits == 4
 
-    result = await search_and_replace_in_file(
-        str(repo_path), "search_term", "replace_term", file_path, False, None, None
-    )
-    assert "Successfully replaced 'search_term' with 'replace_term' in test_fallback.txt using literal search." in result
-    assert (repo_path / file_path).read_text() == "line1\nreplace_term\nline3"
-    mock_execute_custom_command.assert_called_once() # Sed was attempted
+    # A literal match inside the range wins over the regex reading of the same string
+    result = await search_and_replace_in_file(str(repo_path), "[x]", "[y]", file_path, False, 2, 2)
+    assert "using literal search. Total changes: 1." in result
+    assert (repo_path / file_path).read_text() == "<1> <2>\n<3> [y]\n"
 
 @pytest.mark.asyncio
 @patch('server._generate_diff_output', new_callable=AsyncMock)
-@patch('server._run_tsc_if_applicable', new_callable=AsyncMock)
+@patch('server._run_validators', new_callable=AsyncMock)
 async def test_search_and_replace_python_literal(
-    mock_run_tsc_if_applicable, mock_generate_diff_output, temp_git_repo
+    mock_run_validators, mock_generate_diff_output, temp_git_repo
 ):
     repo, repo_path = temp_git_repo
     file_path = "test_literal.txt"
     (repo_path / file_path).write_text("Hello World\nhello world\nGoodbye World")
 
     mock_generate_diff_output.return_value = "\nDiff:\n-Hello World\n+Hi World"
-    mock_run_tsc_if_applicable.return_value = ""
+    mock_run_validators.return_value = ""
 
     result = await _search_and_replace_python_logic(
         str(repo_path), "Hello World", "Hi World", file_path, False, None, None
@@ -431,18 +441,23 @@ async def test_search_and_replace_python_literal(
     assert "Successfully replaced 'hello world' with 'hi there' in test_literal.txt using literal search." in result_case_insensitive
     assert (repo_path / file_path).read_text() == "hi there\nhi there\nGoodbye World"
 
+    # Line endings are kept as they are in the file
+    (repo_path / file_path).write_bytes(b"a\r\nfoo\r\nc\r\nmixed\n")
+    await _search_and_replace_python_logic(str(repo_path), "foo", "bar", file_path, False, None, None)
+    assert (repo_path / file_path).read_bytes() == b"a\r\nbar\r\nc\r\nmixed\n"
+
 @pytest.mark.asyncio
 @patch('server._generate_diff_output', new_callable=AsyncMock)
-@patch('server._run_tsc_if_applicable', new_callable=AsyncMock)
+@patch('server._run_validators', new_callable=AsyncMock)
 async def test_search_and_replace_python_regex(
-    mock_run_tsc_if_applicable, mock_generate_diff_output, temp_git_repo
+    mock_run_validators, mock_generate_diff_output, temp_git_repo
 ):
     repo, repo_path = temp_git_repo
     file_path = "test_regex.txt"
     (repo_path / file_path).write_text("apple 123 banana 456")
 
     mock_generate_diff_output.return_value = "\nDiff:\n-123\n+XXX"
-    mock_run_tsc_if_applicable.return_value = ""
+    mock_run_validators.return_value = ""
 
     result = await _search_and_replace_python_logic(
         str(repo_path), r"\d+", "XXX", file_path, False, None, None
@@ -481,9 +496,9 @@ async def test_search_and_replace_python_regex(
 
 @pytest.mark.asyncio
 @patch('server._generate_diff_output', new_callable=AsyncMock)
-@patch('server._run_tsc_if_applicable', new_callable=AsyncMock)
+@patch('server._run_validators', new_callable=AsyncMock)
 async def test_search_and_replace_python_line_range(
-    mock_run_tsc_if_applicable, mock_generate_diff_output, temp_git_repo
+    mock_run_validators, mock_generate_diff_output, temp_git_repo
 ):
     repo, repo_path = temp_git_repo
     file_path = "test_range.txt"
@@ -491,7 +506,7 @@ async def test_search_and_replace_python_line_range(
     (repo_path / file_path).write_text(content)
 
     mock_generate_diff_output.return_value = "\nDiff:\n-line2 search\n+line2 replaced"
-    mock_run_tsc_if_applicable.return_value = ""
+    mock_run_validators.return_value = ""
 
     # Test start_line and end_line
     result = await _search_and_replace_python_logic(
@@ -520,7 +535,7 @@ async def test_search_and_replace_python_line_range(
     assert (repo_path / file_path).read_text() == expected_content_end
 
 @pytest.mark.asyncio
-async def test_search_and_replace_in_file_fallback_on_exception(tmp_path, monkeypatch):
+async def test_search_and_replace_in_file_read_error(tmp_path, monkeypatch):
     from server import search_and_replace_in_file
     import builtins
 
@@ -528,22 +543,21 @@ async def test_search_and_replace_in_file_fallback_on_exception(tmp_path, monkey
     file_path = tmp_path / "exc_file.txt"
     file_path.write_text("foo bar baz")
 
-    # Monkeypatch open to raise Exception only on the first call (sed attempt)
+    # Monkeypatch open to raise Exception only on the first call (the read)
     real_open = builtins.open
     call_count = {"n": 0}
     def raise_once(*a, **kw):
         if call_count["n"] == 0:
             call_count["n"] += 1
-            raise Exception("sed open error")
+            raise Exception("open error")
         return real_open(*a, **kw)
     monkeypatch.setattr(builtins, "open", raise_once)
 
-    # Should fallback to Python logic and succeed
     result = await search_and_replace_in_file(
         str(tmp_path), "foo", "qux", "exc_file.txt", False, None, None
     )
     assert (
-        "UNEXPECTED_ERROR: An unexpected error occurred during sed-based search and replace: sed open error. AI_HINT: Check your search/replace patterns, file permissions, and review server logs for more details."
+        "UNEXPECTED_ERROR: An unexpected error occurred during search and replace: open error. AI_HINT: Check your search/replace patterns and review server logs for more details."
         in result
     )
     # The file should remain unchanged due to the error
@@ -562,11 +576,11 @@ async def test_list_tools():
 @pytest.mark.asyncio
 @patch('server.git.Repo')
 @patch('server.git_status')
-@patch('server.git_diff_all')
-@patch('server.git_diff')
+@patch('server.git_diff_all_page')
+@patch('server.git_diff_page')
 @patch('server.git_stage_and_commit')
 @patch('server.git_reset')
-@patch('server.git_log')
+@patch('server.git_log_page')
 @patch('server.git_create_branch')
 @patch('server.git_checkout')
 @patch('server.git_show')
@@ -578,9 +592,11 @@ async def test_list_tools():
 async def test_call_tool(
     mock_execute_custom_command, mock_write_to_file_content, mock_search_and_replace_in_file,
     mock_git_read_file, mock_git_apply_diff, mock_git_show,
-    mock_git_checkout, mock_git_create_branch, mock_git_log, mock_git_reset,
+    mock_git_checkout, mock_git_create_branch, mock_git_log_page, mock_git_reset,
     mock_git_stage_and_commit, mock_git_diff, mock_git_diff_all, mock_git_status, mock_git_repo
 ):
+    from server import DiffMode, repo_pool
+    repo_pool.clear()
     mock_repo_instance = MagicMock()
     mock_git_repo.return_value = mock_repo_instance
 
@@ -591,14 +607,18 @@ async def test_call_tool(
     mock_git_status.assert_called_with(mock_repo_instance)
 
     # Test GitTools.DIFF_ALL
-    mock_git_diff_all.return_value = "diff_all_output"
+    mock_git_diff_all.return_value = ("diff_all_output", None)
     result = list(await call_tool(GitTools.DIFF_ALL.value, {"repo_path": "/tmp/repo"})) # Cast to list
     assert result[0].text == "All changes (staged and unstaged):\ndiff_all_output"
+    mock_git_diff_all.return_value = ("page_output", "abc")
+    result = list(await call_tool(GitTools.DIFF_ALL.value, {"repo_path": "/tmp/repo", "mode": "stat", "max_files": 1}))
+    assert result[0].text == "All changes (staged and unstaged):\npage_output\nNext cursor: abc"
+    assert mock_git_diff_all.call_args[0][1:] == (None, DiffMode.STAT, None, 1)
 
     # Removed test for GitTools.DIFF_STAGED as the tool no longer exists
 
     # Test GitTools.DIFF
-    mock_git_diff.return_value = "diff_target_output"
+    mock_git_diff.return_value = ("diff_target_output", None)
     result = list(await call_tool(GitTools.DIFF.value, {"repo_path": "/tmp/repo", "target": "main"})) # Cast to list
     assert result[0].text == "Diff with main:\ndiff_target_output"
 
@@ -621,9 +641,12 @@ async def test_call_tool(
     assert result[0].text == "Reset done"
 
     # Test GitTools.LOG
-    mock_git_log.return_value = ["log1", "log2"]
+    mock_git_log_page.return_value = (["log1", "log2"], None)
     result = list(await call_tool(GitTools.LOG.value, {"repo_path": "/tmp/repo", "max_count": 1})) # Cast to list
     assert result[0].text == "Commit history:\nlog1\nlog2"
+    mock_git_log_page.return_value = (["log1"], "abc")
+    result = list(await call_tool(GitTools.LOG.value, {"repo_path": "/tmp/repo", "max_count": 1}))
+    assert result[0].text == "Commit history:\nlog1\nNext cursor: abc"
 
     # Test GitTools.CREATE_BRANCH
     mock_git_create_branch.return_value = "Branch created"
@@ -1033,40 +1056,24 @@ def test_prepare_aider_command_various_cases():
     cmd = prepare_aider_command([])
     assert cmd == []
 @pytest.mark.asyncio
-async def test_git_apply_diff_cases(monkeypatch, tmp_path):
+async def test_git_apply_diff_cases(monkeypatch, temp_git_repo):
     from server import git_apply_diff
-    import types
 
-    class DummyRepo:
-        def __init__(self, working_dir):
-            self.working_dir = working_dir
-            self.git = types.SimpleNamespace()
-            self.git.apply = self.apply
-
-        def apply(self, *args, **kwargs):
-            if "--fail" in args:
-                raise Exception("fail")
-            if "--giterr" in args:
-                from git.exc import GitCommandError
-                raise GitCommandError("apply", 1, stderr="git error")
-            return
-
-    # Patch _generate_diff_output and _run_tsc_if_applicable to avoid side effects
-    async def fake_generate_diff_output(*a, **kw):
+    # Patch _run_validators to avoid side effects
+    async def fake_run_validators(*a, **kw):
         return ""
-    async def fake_run_tsc_if_applicable(*a, **kw):
-        return ""
-    monkeypatch.setattr("server._generate_diff_output", fake_generate_diff_output)
-    monkeypatch.setattr("server._run_tsc_if_applicable", fake_run_tsc_if_applicable)
+    monkeypatch.setattr("server._run_validators", fake_run_validators)
 
-    repo = DummyRepo(str(tmp_path))
+    repo, repo_path = temp_git_repo
 
     # Case 1: Successful diff application with affected file
-    file_path = tmp_path / "file.txt"
-    file_path.write_text("old")
+    file_path = repo_path / "file.txt"
+    file_path.write_text("old\n")
     diff_content = "--- a/file.txt\n+++ b/file.txt\n@@ -1 +1 @@\n-old\n+new\n"
     result = await git_apply_diff(repo, diff_content)
     assert "Diff applied successfully" in result
+    assert file_path.read_text() == "new\n"
+    assert "-old" in result and "+new" in result
 
     # Case 2: Diff content without a/ or b/ paths (should not fail)
     result = await git_apply_diff(repo, "random diff content")
@@ -1074,16 +1081,12 @@ async def test_git_apply_diff_cases(monkeypatch, tmp_path):
 
     # Case 3: full_affected_path.exists() is False
     result = await git_apply_diff(repo, "--- a/nonexistent.txt\n+++ b/nonexistent.txt\n@@ -1 +1 @@\n-old\n+new\n")
-    assert (
-        "Diff applied successfully" in result
-        or "Error applying diff" in result
-        or "An unexpected error occurred" in result
-    )
+    assert result.startswith("GIT_COMMAND_FAILED: Failed to apply diff.") and "nonexistent.txt" in result
 
     # Case 4: GitCommandError
-    repo.git.apply = lambda *a, **kw: (_ for _ in ()).throw(
-        __import__("git").exc.GitCommandError("apply", 1, stderr="git error")
-    )
+    async def failing_apply(*a, **kw):
+        raise __import__("git").exc.GitCommandError("apply", 1, stderr="git error")
+    monkeypatch.setattr("server._run_git_apply", failing_apply)
     result = await git_apply_diff(repo, diff_content)
     assert (
         "GIT_COMMAND_FAILED: Failed to apply diff. Details: \n  stderr: 'git error'. AI_HINT: Check if the diff is valid and applies cleanly to the current state of the repository."
@@ -1091,12 +1094,50 @@ async def test_git_apply_diff_cases(monkeypatch, tmp_path):
     )
 
     # Case 5: Other Exception
-    repo.git.apply = lambda *a, **kw: (_ for _ in ()).throw(Exception("fail"))
+    async def broken_apply(*a, **kw):
+        raise Exception("fail")
+    monkeypatch.setattr("server._run_git_apply", broken_apply)
     result = await git_apply_diff(repo, diff_content)
     assert (
         "UNEXPECTED_ERROR: An unexpected error occurred while applying diff: fail. AI_HINT: Check the server logs for more details or review your input."
         in result
     )
+
+@pytest.mark.asyncio
+async def test_git_apply_diff_multi_file_and_dry_run(monkeypatch, temp_git_repo):
+    from server import git_apply_diff
+
+    mock_run_validators = AsyncMock(return_value="")
+    monkeypatch.setattr("server._run_validators", mock_run_validators)
+    repo, repo_path = temp_git_repo
+    (repo_path / "a.txt").write_text("one\ntwo\n")
+    (repo_path / "gone.txt").write_text("bye\n")
+    repo.index.add(["a.txt", "gone.txt"])
+    repo.index.commit("Add files")
+    diff_content = (
+        "diff --git a/a.txt b/a.txt\n--- a/a.txt\n+++ b/a.txt\n@@ -1,2 +1,2 @@\n one\n-two\n+TWO\n"
+        "diff --git a/gone.txt b/gone.txt\ndeleted file mode 100644\n--- a/gone.txt\n+++ /dev/null\n@@ -1 +0,0 @@\n-bye\n"
+        "diff --git a/new.txt b/new.txt\nnew file mode 100644\n--- /dev/null\n+++ b/new.txt\n@@ -0,0 +1 @@\n+hello\n"
+    )
+
+    result = await git_apply_diff(repo, diff_content, dry_run=True)
+    assert result.startswith("Dry run: diff applies cleanly")
+    assert "a.txt: modify, 1 hunk(s), +1 -1" in result and "gone.txt: delete" in result and "new.txt: create" in result
+    assert (repo_path / "a.txt").read_text() == "one\ntwo\n" and not (repo_path / "new.txt").exists()
+
+    result = await git_apply_diff(repo, diff_content)
+    assert result.startswith("Diff applied successfully")
+    assert (repo_path / "a.txt").read_text() == "one\nTWO\n"
+    assert not (repo_path / "gone.txt").exists() and (repo_path / "new.txt").read_text() == "hello\n"
+    assert "+TWO" in result and "Deleted gone.txt." in result and "+hello" in result
+    assert result.index("+TWO") < result.index("Deleted gone.txt.") < result.index("+hello")
+    # One validator run for all the touched files
+    mock_run_validators.assert_awaited_once_with(str(repo_path), ["a.txt", "new.txt"])
+
+    # A patch that no longer applies leaves the tree untouched
+    result = await git_apply_diff(repo, diff_content, dry_run=True)
+    assert result.startswith("GIT_COMMAND_FAILED")
+
 def test_git_read_file_error_cases(monkeypatch):
     from server import git_read_file
     import types
@@ -1125,4 +1166,1538 @@ def test_git_read_file_error_cases(monkeypatch):
     assert (
         "UNEXPECTED_ERROR: Failed to read file 'nofile.txt': fail. AI_HINT: Check if the file exists, is accessible, and not corrupted. Review server logs for more details."
         in result
-    )
\ No newline at end of file
+    )
+
+def test_repo_pool_reuse_invalidation_and_eviction(temp_git_repo, tmp_path):
+    from server import RepoPool
+
+    repo, repo_path = temp_git_repo
+    pool = RepoPool(max_size=1, idle_timeout=0)
+
+    # Miss, then hit on the same handle
+    with pool.lease(repo_path) as first:
+        assert first.working_dir == str(repo_path.resolve())
+    with pool.lease(repo_path) as second:
+        assert second is first
+    assert pool.stats()["hits"] == 1
+    assert pool.stats()["misses"] == 1
+
+    # Concurrent leases never share a handle
+    a = pool.acquire(repo_path)
+    b = pool.acquire(repo_path)
+    assert a is not b
+    pool.release(repo_path, a)
+    pool.release(repo_path, b)
+    assert pool.stats()["idle_handles"] == 1
+    assert pool.stats()["evictions"] == 1
+
+    # Idle handles have their cat-file helpers closed but stay pooled
+    with pool.lease(repo_path) as handle:
+        handle.head.commit.message  # starts the persistent cat-file process
+        assert handle.git.cat_file_all is not None
+    assert pool.close_idle() == 1
+    assert handle.git.cat_file_all is None
+    with pool.lease(repo_path) as again:
+        assert again is handle
+
+    # Replacing .git invalidates pooled handles
+    shutil.move(str(repo_path / ".git"), str(tmp_path / "old_git"))
+    shutil.copytree(str(tmp_path / "old_git"), str(repo_path / ".git"))
+    with pool.lease(repo_path) as fresh:
+        assert fresh is not handle
+    assert pool.stats()["invalidations"] == 1
+
+    pool.clear()
+    assert pool.stats()["idle_handles"] == 0
+
+
+@pytest.mark.asyncio
+async def test_run_git_tool_offloads_blocking_calls(temp_git_repo):
+    from server import _run_git_tool
+    import threading
+    import time
+
+    repo, repo_path = temp_git_repo
+    main_thread = threading.get_ident()
+    active = {"now": 0, "max": 0}
+    lock = threading.Lock()
+
+    def slow_tool(leased_repo, delay):
+        assert threading.get_ident() != main_thread
+        assert leased_repo.working_dir == str(repo_path.resolve())
+        with lock:
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+        time.sleep(delay)
+        with lock:
+            active["now"] -= 1
+        return delay
+
+    # Read-only calls run in parallel and leave the event loop responsive
+    ticks = []
+    async def ticker():
+        for _ in range(5):
+            ticks.append(1)
+            await asyncio.sleep(0.01)
+    results = await asyncio.gather(
+        _run_git_tool(repo_path, slow_tool, 0.2),
+        _run_git_tool(repo_path, slow_tool, 0.2),
+        ticker(),
+    )
+    assert results[:2] == [0.2, 0.2]
+    assert active["max"] == 2
+    assert len(ticks) == 5
+
+    # Calls that raise are counted as failed, not completed
+    from server import _git_tool_stats
+    before = dict(_git_tool_stats)
+
+    def broken_tool(leased_repo):
+        raise GitCommandError(["git", "status"], 128)
+
+    with pytest.raises(GitCommandError):
+        await _run_git_tool(repo_path, broken_tool)
+    await _run_git_tool(repo_path, slow_tool, 0)
+    assert _git_tool_stats["failed"] == before["failed"] + 1
+    assert _git_tool_stats["completed"] == before["completed"] + 1
+    assert _git_tool_stats["pending"] == before["pending"]
+
+@pytest.mark.asyncio
+async def test_tool_scheduler_readers_share_writers_exclusive(tmp_path):
+    from server import ToolScheduler, TOOL_ACCESS, ToolAccess
+
+    assert set(TOOL_ACCESS) == set(GitTools)
+    assert TOOL_ACCESS[GitTools.STATUS] == ToolAccess.READ
+    assert TOOL_ACCESS[GitTools.WRITE_TO_FILE] == ToolAccess.WRITE
+    assert TOOL_ACCESS[GitTools.EXECUTE_COMMAND] == ToolAccess.UNLOCKED
+
+    scheduler = ToolScheduler()
+    events = []
+
+    async def call(tool, label, delay=0.05):
+        async with scheduler.access(tmp_path, tool.value):
+            events.append(("start", label))
+            await asyncio.sleep(delay)
+            events.append(("end", label))
+
+    # Two readers overlap, the writer waits for both, the reader queued behind the writer waits for it
+    tasks = [
+        asyncio.create_task(call(GitTools.STATUS, "r1")),
+        asyncio.create_task(call(GitTools.DIFF_ALL, "r2")),
+    ]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(call(GitTools.WRITE_TO_FILE, "w1")))
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(call(GitTools.LOG, "r3")))
+    await asyncio.sleep(0.01)
+    stats = scheduler.stats()[str(tmp_path.resolve())]
+    assert stats["active_readers"] == 2
+    assert stats["queue_depth"] == 2
+    await asyncio.gather(*tasks)
+
+    assert events[:2] == [("start", "r1"), ("start", "r2")]
+    w_start = events.index(("start", "w1"))
+    assert events.index(("end", "r1")) < w_start and events.index(("end", "r2")) < w_start
+    assert events[w_start + 1] == ("end", "w1")
+    assert events[-2:] == [("start", "r3"), ("end", "r3")]
+
+    stats = scheduler.stats()[str(tmp_path.resolve())]
+    assert stats["queue_depth"] == 0
+    assert stats["contended"] == 2
+    assert stats["max_wait_seconds"] > 0
+
+    # Unlocked tools don't wait for a writer
+    events.clear()
+    writer = asyncio.create_task(call(GitTools.WRITE_TO_FILE, "w2"))
+    await asyncio.sleep(0)
+    await call(GitTools.EXECUTE_COMMAND, "c1", delay=0)
+    await writer
+    assert events == [("start", "w2"), ("start", "c1"), ("end", "c1"), ("end", "w2")]
+    assert scheduler.stats()[str(tmp_path.resolve())]["acquisitions"] == 5
+
+@pytest.mark.asyncio
+async def test_apply_diff_releases_write_lock_before_validation(temp_git_repo, monkeypatch):
+    from server import call_tool, tool_scheduler
+
+    repo, repo_path = temp_git_repo
+    (repo_path / "a.txt").write_text("one\n")
+    repo.index.add(["a.txt"])
+    repo.index.commit("Add a")
+    validating = asyncio.Event()
+    finish = asyncio.Event()
+
+    async def slow_validators(repo_path_arg, file_paths):
+        validating.set()
+        await finish.wait()
+        return "\n\nSLOW Output for a.txt:\nok"
+
+    monkeypatch.setattr("server._run_validators", slow_validators)
+    diff_content = "--- a/a.txt\n+++ b/a.txt\n@@ -1 +1 @@\n-one\n+two\n"
+    apply_task = asyncio.create_task(call_tool(GitTools.APPLY_DIFF.value, {"repo_path": str(repo_path), "diff_content": diff_content}))
+    await asyncio.wait_for(validating.wait(), 5)
+
+    # Other tools run while the validators check the patched files, and see the new content
+    stats = tool_scheduler.stats()[str(repo_path.resolve())]
+    assert not stats["writer_active"]
+    status = await asyncio.wait_for(call_tool(GitTools.STATUS.value, {"repo_path": str(repo_path)}), 5)
+    assert "a.txt" in status[0].text
+    assert not apply_task.done()
+
+    finish.set()
+    result = (await apply_task)[0].text
+    assert result.startswith("Diff applied successfully") and "+two" in result and "SLOW Output for a.txt" in result
+    assert tool_scheduler.stats()[str(repo_path.resolve())]["active_readers"] == 0
+
+@pytest.mark.asyncio
+async def test_edit_tools_release_write_lock_before_validation(temp_git_repo, monkeypatch):
+    from server import call_tool, tool_scheduler
+
+    repo, repo_path = temp_git_repo
+    (repo_path / "a.txt").write_text("one\n")
+    validating = asyncio.Event()
+    finish = asyncio.Event()
+
+    async def slow_validators(repo_path_arg, file_paths):
+        validating.set()
+        await finish.wait()
+        return "\n\nSLOW Output"
+
+    monkeypatch.setattr("server._run_validators", slow_validators)
+    calls = [
+        (GitTools.WRITE_TO_FILE, {"file_path": "a.txt", "content": "two\n"}, "two"),
+        (GitTools.SEARCH_AND_REPLACE, {"file_path": "a.txt", "search_string": "two", "replace_string": "three"}, "three"),
+        (GitTools.MULTI_EDIT, {"file_path": "a.txt", "edits": [{"search_string": "three", "replace_string": "four"}]}, "four"),
+        (GitTools.WRITE_FILES, {"files": [{"file_path": "a.txt", "content": "five\n"}]}, "five"),
+    ]
+    for tool, arguments, expected in calls:
+        validating.clear()
+        finish.clear()
+        edit_task = asyncio.create_task(call_tool(tool.value, {"repo_path": str(repo_path), **arguments}))
+        await asyncio.wait_for(validating.wait(), 5)
+
+        # Readers see the written file while the validators run
+        assert not tool_scheduler.stats()[str(repo_path.resolve())]["writer_active"]
+        content = await asyncio.wait_for(call_tool(GitTools.READ_FILE.value, {"repo_path": str(repo_path), "file_path": "a.txt"}), 5)
+        assert content[0].text == f"Content of a.txt:\n{expected}\n"
+        assert not edit_task.done()
+
+        finish.set()
+        assert "SLOW Output" in (await edit_task)[0].text
+    assert (repo_path / "a.txt").read_text() == "five\n"
+
+def test_git_read_file_at_revision_uses_blob_cache(temp_git_repo):
+    from server import BlobStore
+    import server
+
+    repo, repo_path = temp_git_repo
+    store = BlobStore(max_bytes=1024)
+    original_store = server.blob_store
+    server.blob_store = store
+    try:
+        (repo_path / "initial_file.txt").write_text("second content")
+        repo.index.add(["initial_file.txt"])
+        repo.index.commit("Second commit")
+        (repo_path / "other.txt").write_text("unrelated")
+        repo.index.add(["other.txt"])
+        repo.index.commit("Third commit")
+
+        result = git_read_file(repo, "initial_file.txt", revision="HEAD~2")
+        assert result == "Content of initial_file.txt at HEAD~2:\ninitial content"
+        result = git_read_file(repo, "initial_file.txt", revision="HEAD~1")
+        assert result.endswith("second content")
+
+        # Unchanged blob at another revision is served from the content-addressed cache
+        result = git_read_file(repo, "initial_file.txt", revision="HEAD")
+        assert result.endswith("second content")
+        stats = store.stats()
+        assert stats["misses"] == 2
+        assert stats["hits"] == 1
+        assert stats["readers"] == 1
+
+        # The working tree is still read when no revision is given
+        (repo_path / "initial_file.txt").write_text("uncommitted")
+        assert git_read_file(repo, "initial_file.txt").endswith("uncommitted")
+
+        result = git_read_file(repo, "missing.txt", revision="HEAD")
+        assert "Error: file wasn't found at revision HEAD: missing.txt" in result
+
+        # Readers restart transparently after being closed for idleness
+        store.idle_timeout = 0
+        assert store.close_idle() == 1
+        assert git_read_file(repo, "other.txt", revision="HEAD").endswith("unrelated")
+    finally:
+        store.clear()
+        server.blob_store = original_store
+
+def test_git_log_page_cursor_pagination_and_filters(temp_git_repo):
+    from server import _decode_cursor, git_log_page
+
+    repo, repo_path = temp_git_repo
+    base = repo.active_branch.name
+    dates = iter(f"2030-01-01T00:00:{second:02d}" for second in range(10, 60))
+    # Build a history with a merge so pages must resume from a multi-parent frontier
+    repo.git.checkout("-b", "side")
+    for i in range(3):
+        (repo_path / f"side{i}.txt").write_text(str(i))
+        repo.index.add([f"side{i}.txt"])
+        date = next(dates)
+        repo.index.commit(f"Side commit {i}", author_date=date, commit_date=date)
+    repo.git.checkout(base)
+    for i in range(3):
+        (repo_path / "docs").mkdir(exist_ok=True)
+        (repo_path / "docs" / f"main{i}.txt").write_text(str(i))
+        repo.index.add([f"docs/main{i}.txt"])
+        date = next(dates)
+        repo.index.commit(
+            f"Main commit {i}", author=git.Actor("Other Person", "other@example.com"),
+            author_date=date, commit_date=date
+        )
+    repo.git.merge("side", "--no-ff", "-m", "Merge side")
+
+    expected = repo.git.log("--format=%H").split()
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        entries, cursor = git_log_page(repo, max_count=3, cursor=cursor)
+        seen += [entry.splitlines()[0].split("Commit: ")[1] for entry in entries]
+        pages += 1
+        if cursor is None:
+            break
+    assert seen == expected
+    assert pages == 3
+
+    # Filtered pages resume from the walk's frontier too, without re-walking from HEAD
+    entries, cursor = git_log_page(repo, max_count=2, author="other@example.com")
+    assert repo.head.commit.hexsha not in _decode_cursor(cursor)["frontier"]
+    assert len(entries) == 2 and all("Author: Other Person" in e for e in entries)
+    more, cursor = git_log_page(repo, max_count=2, cursor=cursor, author="other@example.com")
+    assert len(more) == 1 and cursor is None
+
+    entries, _ = git_log_page(repo, max_count=10, path="docs")
+    assert [e.split("Message: ")[1].strip() for e in entries] == ["Main commit 2", "Main commit 1", "Main commit 0"]
+    entries, cursor = git_log_page(repo, max_count=1, path="side1.txt")
+    assert [e.split("Message: ")[1].strip() for e in entries] == ["Side commit 1"] and cursor is None
+
+    entries, _ = git_log_page(repo, max_count=10, since="2000-01-01")
+    assert len(entries) == len(expected)
+
+    with pytest.raises(ValueError):
+        git_log_page(repo, max_count=2, cursor="not-a-cursor")
+    _, cursor = git_log_page(repo, max_count=1)
+    with pytest.raises(ValueError):
+        git_log_page(repo, max_count=1, cursor=cursor, path="docs")
+
+def test_commit_index_incremental_refresh_and_log_queries(temp_git_repo, monkeypatch):
+    import server
+    from server import CommitIndex, git_log_page
+
+    repo, repo_path = temp_git_repo
+    index = CommitIndex(enabled=True)
+    monkeypatch.setattr(server, "commit_index", index)
+    dates = iter(f"2030-01-01T00:00:{second:02d}" for second in range(10, 60))
+
+    def commit(name, message, actor=None):
+        (repo_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (repo_path / name).write_text(message)
+        repo.index.add([name])
+        date = next(dates)
+        repo.index.commit(message, author=actor, author_date=date, commit_date=date)
+
+    other = git.Actor("Other Person", "other@example.com")
+    commit("src/a.py", "Add a", other)
+    commit("src/ab.py", "Add ab")
+    commit("docs/readme.md", "Add docs", other)
+
+    head = repo.head.commit.hexsha
+    # Missing index: fall back to git and build it in the background
+    assert index.query(repo_path, head, 10, path="src") is None
+    index._executor.submit(lambda: None).result()
+    assert index.stats()["rebuilds"] == 1 and index.stats()["indexed_commits"] == 4
+    assert index.refresh(repo_path) == 0
+
+    def messages(entries):
+        return [e.split("Message: ")[1].strip() for e in entries]
+
+    for kwargs in ({"path": "src"}, {"path": "src/a.py"}, {"author": "other@example.com"}, {"path": "docs", "author": "Other"}):
+        from_index, _ = git_log_page(repo, max_count=10, **kwargs)
+        hits = index.stats()["hits"]
+        assert hits > 0
+        monkeypatch.setattr(index, "enabled", False)
+        from_git, _ = git_log_page(repo, max_count=10, **kwargs)
+        monkeypatch.setattr(index, "enabled", True)
+        assert from_index == from_git
+
+    entries, cursor = git_log_page(repo, max_count=1, path="src")
+    assert messages(entries) == ["Add ab"]
+    entries, cursor = git_log_page(repo, max_count=1, cursor=cursor, path="src")
+    assert messages(entries) == ["Add a"] and cursor is None
+
+    # New commits are indexed incrementally
+    commit("src/c.py", "Add c", other)
+    assert index.refresh(repo_path) == 1
+    assert index.stats()["incremental_updates"] == 1
+    entries, _ = git_log_page(repo, max_count=10, author="Other Person")
+    assert messages(entries) == ["Add c", "Add docs", "Add a"]
+
+    # Rewritten history triggers a rebuild
+    repo.git.reset("--hard", "HEAD~2")
+    assert index.refresh(repo_path) == 3
+    assert index.stats()["rebuilds"] == 2
+
+    # The index is persisted in the git directory and survives a restart
+    restarted = CommitIndex(enabled=True)
+    rows = restarted.query(repo_path, repo.head.commit.hexsha, 10, path="src")
+    assert [row[3].strip() for row in rows] == ["Add ab", "Add a"]
+    assert (repo_path / ".git" / "mcp-devtools" / "commit-index.sqlite3").exists()
+    index.shutdown()
+    restarted.shutdown()
+
+def test_commit_index_pages_match_git_log(temp_git_repo, monkeypatch):
+    import server
+    from server import CommitIndex, git_log_page
+
+    repo, repo_path = temp_git_repo
+    index = CommitIndex(enabled=True)
+    monkeypatch.setattr(server, "commit_index", index)
+    base = repo.active_branch.name
+    other = git.Actor("Other Person", "other@example.com")
+
+    def commit(name, second, actor=None):
+        (repo_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (repo_path / name).write_text(f"{name} {second}")
+        repo.index.add([name])
+        date = f"2030-01-01T00:{second // 60:02d}:{second % 60:02d}"
+        repo.index.commit(f"{name} at {second}", author=actor, author_date=date, commit_date=date)
+
+    # Interleaved branches with skewed dates, so the walk order isn't the commit date order
+    for i in range(4):
+        commit(f"src/main{i}.py", 100 + i, other if i % 2 else None)
+    repo.git.checkout("-b", "side", "HEAD~2")
+    for i, second in enumerate((50, 500, 60)):
+        commit(f"src/side{i}.py", second, other)
+    repo.git.checkout(base)
+    repo.git.merge("side", "--no-ff", "-m", "Merge side")
+
+    def pages(use_index, **kwargs):
+        shas, cursor = [], None
+        for page in range(20):
+            monkeypatch.setattr(index, "enabled", use_index(page))
+            entries, cursor = git_log_page(repo, max_count=2, cursor=cursor, **kwargs)
+            shas += [entry.splitlines()[0].split("Commit: ")[1] for entry in entries]
+            if cursor is None:
+                return shas
+        raise AssertionError("too many pages")
+
+    def check():
+        index.refresh(repo_path)
+        for kwargs, expected, indexed in (
+            ({}, repo.git.log("--format=%H").split(), False),
+            # Path queries on a history with merges are left to git's history simplification
+            ({"path": "src"}, repo.git.log("--format=%H", "--", "src").split(), False),
+            ({"author": "other@example.com"}, repo.git.log("--author=other@example.com", "--format=%H").split(), True),
+        ):
+            hits = index.stats()["hits"]
+            assert pages(lambda page: True, **kwargs) == expected
+            assert (index.stats()["hits"] > hits) == indexed
+            assert pages(lambda page: False, **kwargs) == expected
+            # Cursors carry over between index and git pages
+            assert pages(lambda page: page % 2 == 0, **kwargs) == expected
+
+    check()
+    assert index.stats()["rebuilds"] == 1
+    # Linear new commits are added incrementally, a new merge rebuilds the index
+    commit("src/late.py", 30, other)
+    check()
+    assert index.stats()["incremental_updates"] == 1
+    repo.git.checkout("side")
+    commit("src/side3.py", 10, other)
+    repo.git.checkout(base)
+    repo.git.merge("side", "--no-ff", "-m", "Merge side again")
+    check()
+    assert index.stats()["rebuilds"] == 2
+    index.shutdown()
+
+def test_result_cache_lru_and_disk_spill(tmp_path):
+    from server import ResultCache
+
+    # Files in the spill directory that the cache didn't write are never adopted or evicted
+    (tmp_path / "spill").mkdir()
+    (tmp_path / "spill" / "notes.txt").write_text("keep me\n")
+    (tmp_path / "spill" / ("0" * 64 + ".txt.bak")).write_text("keep me too\n")
+    cache = ResultCache(max_bytes=10, spill_dir=str(tmp_path / "spill"), max_disk_bytes=12)
+    assert cache.stats()["disk_entries"] == 0
+    cache.put(("a",), "aaaaa")
+    cache.put(("b",), "bbbbb")
+    assert cache.get(("a",)) == "aaaaa"
+    cache.put(("c",), "ccccc")  # Evicts "b", the least recently used entry, to disk
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["spills"] == 1 and stats["bytes"] == 10
+
+    assert cache.get(("b",)) == "bbbbb"  # Promoted back from disk
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.get(("missing",)) is None
+    assert cache.stats()["misses"] == 1
+
+    cache.put(("d",), "ddddd")
+    cache.put(("e",), "eeeee")
+    assert cache.stats()["disk_bytes"] <= 12 and cache.stats()["disk_evictions"] >= 1
+
+    # Spilled entries outlive the process
+    restarted = ResultCache(max_bytes=10, spill_dir=str(tmp_path / "spill"), max_disk_bytes=12)
+    assert restarted.stats()["disk_entries"] == cache.stats()["disk_entries"]
+    assert ResultCache(max_bytes=4).get(("a",)) is None
+    assert (tmp_path / "spill" / "notes.txt").read_text() == "keep me\n"
+    assert (tmp_path / "spill" / ("0" * 64 + ".txt.bak")).exists()
+
+def test_git_show_and_revision_range_diff_are_cached(temp_git_repo, monkeypatch):
+    import server
+    from server import ResultCache, git_diff, git_show
+
+    repo, repo_path = temp_git_repo
+    cache = ResultCache(max_bytes=1024 * 1024)
+    monkeypatch.setattr(server, "result_cache", cache)
+    first = repo.head.commit.hexsha
+    (repo_path / "initial_file.txt").write_text("changed content")
+    repo.index.add(["initial_file.txt"])
+    repo.index.commit("Change file")
+
+    shown = git_show(repo, "HEAD")
+    assert git_show(repo, repo.head.commit.hexsha) == shown
+    assert cache.stats()["hits"] == 1
+
+    diff = git_diff(repo, f"{first}..HEAD")
+    assert "+changed content" in diff
+    assert git_diff(repo, f"{first[:10]}..{repo.head.commit.hexsha}") == diff
+    assert cache.stats()["hits"] == 2
+
+    # Diffs against the working tree are never cached
+    (repo_path / "initial_file.txt").write_text("working tree content")
+    assert "+working tree content" in git_diff(repo, "HEAD")
+    assert cache.stats()["entries"] == 2
+
+@pytest.mark.asyncio
+async def test_state_cache_reuses_status_until_repo_state_changes(temp_git_repo, monkeypatch):
+    import server
+    from server import StateCache, call_tool
+
+    repo, repo_path = temp_git_repo
+    cache = StateCache(ttl=60)
+    monkeypatch.setattr(server, "state_cache", cache)
+    monkeypatch.setattr(server, "_run_validators", AsyncMock(return_value=""))
+
+    async def status():
+        result = await call_tool("git_status", {"repo_path": str(repo_path)})
+        return result[0].text
+
+    first = await status()
+    assert await status() == first
+    assert cache.stats()["hits"] == 1
+
+    # Writer tools of this server invalidate the cache
+    await call_tool("write_to_file", {"repo_path": str(repo_path), "file_path": "new.txt", "content": "x"})
+    assert cache.stats()["invalidations"] == 1
+    assert "new.txt" in await status()
+
+    # Staging or committing outside the server changes the HEAD/index fingerprint
+    repo.index.add(["new.txt"])
+    staged = await status()
+    assert "Changes to be committed" in staged
+    repo.index.commit("Add new file")
+    assert "new.txt" not in await status()
+    assert cache.stats()["hits"] == 1
+
+def _wait_for(predicate, timeout=5.0):
+    import time
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+@pytest.mark.parametrize("mode", ["inotify", "poll"])
+def test_worktree_watcher_tracks_dirty_paths(temp_git_repo, monkeypatch, mode):
+    import server
+    from server import WorktreeWatcher, _Inotify
+
+    if mode == "inotify" and not _Inotify.available():
+        pytest.skip("inotify is not available")
+    monkeypatch.setattr(server, "WATCH_POLL_INTERVAL", 0.05)
+    repo, repo_path = temp_git_repo
+    (repo_path / ".gitignore").write_text("*.log\nbuild/\n")
+    repo.index.add([".gitignore"])
+    repo.index.commit("Ignore logs")
+    (repo_path / "build").mkdir()
+
+    watcher = WorktreeWatcher(str(repo_path), mode)
+    try:
+        assert watcher.ready.wait(5) and watcher.mode == mode
+        start = watcher.generation
+
+        (repo_path / "debug.log").write_text("ignored")
+        (repo_path / "build" / "out.o").write_text("ignored")
+        (repo_path / "initial_file.txt").write_text("changed")
+        assert _wait_for(lambda: watcher.changed_since(start))
+        assert watcher.changed_since(start) == {"initial_file.txt"}
+
+        middle = watcher.generation
+        (repo_path / "src").mkdir()
+        (repo_path / "src" / "new.py").write_text("print()")
+        assert _wait_for(lambda: watcher.changed_since(middle))
+        changed = watcher.changed_since(middle)
+        assert changed and all(p in ("src", "src/new.py") for p in changed)
+        assert "initial_file.txt" in watcher.changed_since(start)
+
+        # Changing ignore rules loses track of which paths matter
+        (repo_path / ".gitignore").write_text("*.log\n")
+        assert _wait_for(lambda: watcher.changed_since(start) is None)
+    finally:
+        watcher.stop()
+
+@pytest.mark.asyncio
+async def test_diff_all_is_spliced_from_watcher_dirty_paths(temp_git_repo, monkeypatch):
+    import server
+    from server import StateCache, WorktreeWatchers, call_tool, git_diff_all
+
+    repo, repo_path = temp_git_repo
+    for name in ("a.txt", "b.txt", "c.txt"):
+        (repo_path / name).write_text(f"{name}\n")
+    repo.index.add(["a.txt", "b.txt", "c.txt"])
+    repo.index.commit("Add files")
+    monkeypatch.setattr(server, "WATCH_POLL_INTERVAL", 0.05)
+    watchers = WorktreeWatchers(mode="poll")
+    monkeypatch.setattr(server, "worktree_watchers", watchers)
+    monkeypatch.setattr(server, "state_cache", StateCache(ttl=60))
+    update = MagicMock(wraps=server.git_diff_all_update)
+    monkeypatch.setattr(server, "git_diff_all_update", update)
+
+    async def diff_all():
+        result = await call_tool("git_diff_all", {"repo_path": str(repo_path)})
+        return result[0].text
+
+    try:
+        assert _wait_for(lambda: watchers.get(repo_path) is not None)
+        (repo_path / "a.txt").write_text("a changed\n")
+        (repo_path / "c.txt").write_text("c changed\n")
+        watcher = watchers.get(repo_path)
+        generation = watcher.generation
+        assert _wait_for(lambda: watcher.generation > generation)
+        await diff_all()
+
+        # Only b.txt changes: its section is diffed alone and spliced between a.txt and c.txt
+        generation = watcher.generation
+        (repo_path / "b.txt").write_text("b changed\n")
+        (repo_path / "c.txt").write_text("c.txt\n")
+        assert _wait_for(lambda: watcher.generation > generation)
+        spliced = await diff_all()
+        assert update.call_count == 1 and update.call_args[0][2] == ["b.txt", "c.txt"]
+        assert spliced == "All changes (staged and unstaged):\n" + git_diff_all(repo)
+        assert "c.txt" not in spliced and spliced.index("a.txt") < spliced.index("b.txt")
+    finally:
+        watchers.clear()
+
+def test_git_diff_page_paths_modes_and_pagination(temp_git_repo):
+    from server import DiffMode, _run_git_output, git_diff_all, git_diff_all_page, git_diff_page
+
+    repo, repo_path = temp_git_repo
+    names = ["a.txt", "b.txt", "dir/c.txt", "dir/d.txt", "e.txt"]
+    for name in names:
+        (repo_path / name).parent.mkdir(exist_ok=True)
+        (repo_path / name).write_text("old\n")
+    repo.index.add(names)
+    repo.index.commit("Add files")
+    base = repo.head.commit.hexsha
+    for name in names:
+        (repo_path / name).write_text("new\n")
+
+    # A single page is exactly the full diff
+    text, cursor = git_diff_all_page(repo)
+    assert cursor is None and text == git_diff_all(repo)
+
+    seen = []
+    cursor = None
+    while True:
+        text, cursor = git_diff_all_page(repo, max_files=2, cursor=cursor)
+        seen.append([line.split(" b/")[1] for line in text.splitlines() if line.startswith("diff --git")])
+        if cursor is None:
+            break
+    assert seen == [["a.txt", "b.txt"], ["dir/c.txt", "dir/d.txt"], ["e.txt"]]
+
+    text, cursor = git_diff_all_page(repo, paths=["dir"], mode=DiffMode.NAME_ONLY)
+    assert text == "dir/c.txt\ndir/d.txt" and cursor is None
+    text, _ = git_diff_all_page(repo, mode=DiffMode.STAT, max_files=1)
+    assert "a.txt" in text and "b.txt" not in text and "1 file changed" in text
+
+    with pytest.raises(ValueError):
+        git_diff_all_page(repo, max_files=2, cursor=cursor or git_diff_all_page(repo, max_files=2)[1], mode=DiffMode.STAT)
+
+    # Pages of a diff between two commits are cached
+    repo.git.add(A=True)
+    repo.index.commit("Change files")
+    first = git_diff_page(repo, f"{base}..HEAD", max_files=3)
+    assert git_diff_page(repo, f"{base}..HEAD", max_files=3) == first
+    assert first[1] is not None and "dir/d.txt" not in first[0]
+    assert git_diff_page(repo, f"{base}..HEAD", max_files=3, cursor=first[1])[0].count("diff --git") == 2
+
+    # Renames are listed and shown the same way, as a deletion and an addition
+    repo.git.mv("e.txt", "0.txt")
+    pages, cursor = [], None
+    while True:
+        text, cursor = git_diff_all_page(repo, max_files=1, cursor=cursor)
+        pages.append(text)
+        if cursor is None:
+            break
+    assert len(pages) == 2 and all(page.count("diff --git") == 1 for page in pages)
+    assert "deleted file mode" in pages[1] and "new file mode" in pages[0] and "rename" not in "".join(pages)
+    text, cursor = git_diff_all_page(repo)
+    assert cursor is None and text.count("diff --git") == 2 and "rename" not in text
+
+    # The patch is read only up to the requested number of files
+    full = _run_git_output(str(repo_path), ["diff", "--no-renames", base])
+    assert full.count("diff --git") == 6
+    first_file = _run_git_output(str(repo_path), ["diff", "--no-renames", base], max_files=1)
+    assert first_file.count("diff --git") == 1 and full.startswith(first_file + "\n")
+
+def test_git_show_caps_stat_only_paths_and_renames(temp_git_repo):
+    from server import git_show
+
+    repo, repo_path = temp_git_repo
+    (repo_path / "big.txt").write_text("".join(f"line {i}\n" for i in range(2000)))
+    (repo_path / "small.txt").write_text("small\n")
+    repo.index.add(["big.txt", "small.txt"])
+    added = repo.index.commit("Add files")
+
+    result = git_show(repo, added.hexsha, max_file_bytes=500)
+    assert result.startswith(f"Commit: {added.hexsha}\nAuthor: Test User\n")
+    assert "diff --git a/big.txt b/big.txt" in result and "+line 1\n" in result
+    assert "+line 1999" not in result
+    assert "more bytes of this file's diff truncated" in result
+    assert "+small" in result  # Later files are still shown
+
+    result = git_show(repo, added.hexsha, max_total_bytes=300)
+    assert "output truncated after" in result and "small.txt" not in result
+
+    result = git_show(repo, added.hexsha, paths=["small.txt"])
+    assert "+small" in result and "big.txt" not in result
+
+    result = git_show(repo, added.hexsha, stat_only=True)
+    assert "big.txt   | 2000 +" in result and "2 files changed" in result and "+line" not in result
+
+    repo.git.mv("small.txt", "renamed.txt")
+    renamed = repo.index.commit("Rename")
+    result = git_show(repo, renamed.hexsha)
+    assert "rename from small.txt" in result and "rename to renamed.txt" in result
+
+@pytest.mark.asyncio
+async def test_git_apply_diff_fuzzy_fallback(monkeypatch, temp_git_repo):
+    from server import git_apply_diff
+
+    monkeypatch.setattr("server._run_validators", AsyncMock(return_value=""))
+    repo, repo_path = temp_git_repo
+    code = repo_path / "code.py"
+    code.write_text("# header\n" * 5 + "def f():\n    x = 1\n    y = 2\n    return x + y\n")
+
+    # Drifted line numbers and tab/space differences in the context
+    diff_content = (
+        "--- a/code.py\n+++ b/code.py\n@@ -1,4 +1,4 @@\n"
+        " def f():\n-\tx = 1\n+    x = 10\n \ty = 2\n \treturn x + y\n"
+    )
+    result = await git_apply_diff(repo, diff_content, dry_run=True)
+    assert result.startswith("Dry run: diff applies with the fuzzy hunk applier")
+    assert "x = 1\n" in code.read_text()
+    result = await git_apply_diff(repo, diff_content)
+    assert result.startswith("Diff applied successfully with the fuzzy hunk applier")
+    assert "code.py: hunk #1 applied with offset +5 lines, whitespace ignored" in result
+    assert code.read_text().endswith("def f():\n    x = 10\n    y = 2\n    return x + y\n")
+
+    # An outer context line that no longer matches is fuzzed away
+    diff_content = (
+        "--- a/code.py\n+++ b/code.py\n@@ -6,3 +6,3 @@\n"
+        " def renamed():\n     x = 10\n-    y = 2\n+    y = 20\n"
+    )
+    result = await git_apply_diff(repo, diff_content)
+    assert "hunk #1 applied with fuzz 1" in result and "    y = 20\n" in code.read_text()
+
+    # Context changed in the middle of a hunk: three-way merge against the staged version
+    merged = repo_path / "merged.txt"
+    merged.write_text("".join(f"l{i}\n" for i in range(1, 11)))
+    repo.index.add(["merged.txt"])
+    merged.write_text(merged.read_text().replace("l6\n", "L6\n"))
+    diff_content = (
+        "--- a/merged.txt\n+++ b/merged.txt\n@@ -1,11 +1,11 @@\n"
+        " l1\n l2\n l3\n-l4\n+X4\n l5\n l6\n l7\n-l8\n+X8\n l9\n l10\n"
+    )
+    result = await git_apply_diff(repo, diff_content)
+    assert "merged.txt: three-way merged with the staged version" in result
+    assert merged.read_text() == "l1\nl2\nl3\nX4\nl5\nL6\nl7\nX8\nl9\nl10\n"
+
+    # Nothing is written when a hunk cannot be placed anywhere
+    before = code.read_text()
+    result = await git_apply_diff(repo, "--- a/code.py\n+++ b/code.py\n@@ -1,2 +1,2 @@\n-nothing\n+like this\n")
+    assert "The fuzzy hunk applier also failed: code.py: hunk #1" in result
+    assert code.read_text() == before
+
+@pytest.mark.asyncio
+async def test_git_apply_diff_refuses_paths_outside_and_reports_conflicts(monkeypatch, temp_git_repo):
+    from server import PatchApplyError, _fuzzy_apply_patch, _parse_patch, git_apply_diff
+
+    monkeypatch.setattr("server._run_validators", AsyncMock(return_value=""))
+    repo, repo_path = temp_git_repo
+    outside = repo_path.parent / f"{repo_path.name}-outside.txt"
+    outside.write_text("secret\n")
+    try:
+        for diff_content in (
+            f"--- a/../{outside.name}\n+++ b/../{outside.name}\n@@ -1 +1 @@\n-secret\n+changed\n",
+            f"--- {outside}\n+++ {outside}\n@@ -1 +1 @@\n-secret\n+changed\n",
+            f"--- a/../{outside.name}\n+++ /dev/null\n@@ -1 +0,0 @@\n-secret\n",
+            "--- /dev/null\n+++ b/.git/hooks/pre-commit\n@@ -0,0 +1 @@\n+echo hi\n",
+        ):
+            for dry_run in (True, False):
+                result = await git_apply_diff(repo, diff_content, dry_run=dry_run)
+                assert result.startswith("INVALID_DIFF") and "outside the working tree" in result
+            # The fuzzy applier checks the paths itself too
+            with pytest.raises(PatchApplyError, match="outside the working tree"):
+                _fuzzy_apply_patch(repo_path, _parse_patch(diff_content))
+        (repo_path / "link").symlink_to(outside)
+        with pytest.raises(PatchApplyError, match="outside the working tree"):
+            _fuzzy_apply_patch(repo_path, _parse_patch("--- a/link\n+++ b/link\n@@ -1 +1 @@\n-secret\n+changed\n"))
+        assert outside.read_text() == "secret\n"
+        assert not (repo_path / ".git" / "hooks" / "pre-commit").exists()
+    finally:
+        outside.unlink()
+
+    # A three-way merge that conflicts is reported as such, not as a success
+    merged = repo_path / "merged.txt"
+    merged.write_text("".join(f"l{i}\n" for i in range(1, 11)))
+    repo.index.add(["merged.txt"])
+    merged.write_text(merged.read_text().replace("l6\n", "L6\n").replace("l4\n", "Y4\n"))
+    diff_content = (
+        "--- a/merged.txt\n+++ b/merged.txt\n@@ -1,10 +1,10 @@\n"
+        " l1\n l2\n l3\n-l4\n+X4\n l5\n l6\n l7\n l8\n l9\n l10\n"
+    )
+    result = await git_apply_diff(repo, diff_content, dry_run=True)
+    assert result.startswith("MERGE_CONFLICT: Dry run: the diff applies only with 1 merge conflict(s)")
+    result = await git_apply_diff(repo, diff_content)
+    assert result.startswith("MERGE_CONFLICT: The diff was applied with 1 merge conflict(s)")
+    assert "successfully" not in result
+    assert "<<<<<<< current" in merged.read_text()
+
+@pytest.mark.asyncio
+@patch('server._run_validators', new_callable=AsyncMock)
+async def test_multi_edit_file(mock_run_validators, temp_git_repo):
+    from server import multi_edit_file
+
+    mock_run_validators.return_value = ""
+    repo, repo_path = temp_git_repo
+    target = repo_path / "edit.py"
+    original = "def f(a):\n    return a + 1\n\ndef g(b):\n    return b + 1\n"
+    target.write_text(original)
+    target.chmod(0o755)
+
+    edits = [
+        {"search_string": "return", "replace_string": "yield", "start_line": 4},
+        {"search_string": r"(\w) \+ 1", "replace_string": r"\1 + 2", "use_regex": True},
+        {"search_string": "DEF F", "replace_string": "def h", "ignore_case": True, "use_regex": False},
+    ]
+    result = await multi_edit_file(str(repo_path), "edit.py", edits)
+    assert result.startswith("Successfully applied 3 edits to edit.py.")
+    assert "Edit #1: replaced 'return' with 'yield' using literal search. Changes: 1." in result
+    assert "Edit #2: replaced '(\\w) \\+ 1' with '\\1 + 2' using regex search. Changes: 2." in result
+    assert target.read_text() == "def h(a):\n    return a + 2\n\ndef g(b):\n    yield b + 2\n"
+    assert target.stat().st_mode & 0o777 == 0o755
+    # One combined diff and one validation run
+    assert result.count("--- a/edit.py") == 1
+    mock_run_validators.assert_awaited_once()
+    assert not [p for p in repo_path.iterdir() if p.name.endswith(".tmp")]
+
+    # A failing edit leaves the file untouched
+    before = target.read_text()
+    result = await multi_edit_file(str(repo_path), "edit.py", [
+        {"search_string": "def h", "replace_string": "def k"},
+        {"search_string": "missing", "replace_string": "x", "use_regex": False},
+    ])
+    assert result.startswith("No changes made. Edit #2: 'missing' not found in edit.py")
+    assert target.read_text() == before
+    result = await multi_edit_file(str(repo_path), "edit.py", [{"search_string": "[", "replace_string": "x", "use_regex": True}])
+    assert "Error: Edit #1 has an invalid regex pattern '['" in result
+    assert "Error: No edits were provided" in await multi_edit_file(str(repo_path), "edit.py", [])
+    assert "Error: File not found" in await multi_edit_file(str(repo_path), "nope.py", edits)
+
+    result = list(await call_tool(GitTools.MULTI_EDIT.value, {
+        "repo_path": str(repo_path), "file_path": "edit.py",
+        "edits": [{"search_string": "def g", "replace_string": "def g2"}],
+    }))
+    assert result[0].text.startswith("Successfully applied 1 edits to edit.py.")
+    assert "def g2(b):" in target.read_text()
+
+    # Line endings are kept as they are in the file
+    crlf = repo_path / "crlf.txt"
+    crlf.write_bytes(b"a\r\nfoo\r\nc\r\n")
+    result = await multi_edit_file(str(repo_path), "crlf.txt", [
+        {"search_string": "foo", "replace_string": "bar"},
+        {"search_string": "a", "replace_string": "A", "start_line": 1, "end_line": 1},
+    ])
+    assert result.startswith("Successfully applied 2 edits to crlf.txt.")
+    assert crlf.read_bytes() == b"A\r\nbar\r\nc\r\n"
+
+@pytest.mark.asyncio
+async def test_search_and_replace_in_files(monkeypatch, temp_git_repo):
+    from server import search_and_replace_in_files
+
+    repo, repo_path = temp_git_repo
+    (repo_path / "pkg").mkdir()
+    for i in range(5):
+        (repo_path / "pkg" / f"mod{i}.py").write_text(f"import old_name\nold_name.run({i})\n")
+    (repo_path / "pkg" / "notes.txt").write_text("old_name\n")
+    (repo_path / "pkg" / "crlf.py").write_bytes(b"x = old_name\r\n")
+    (repo_path / "blob.py").write_bytes(b"old_name\0\xff")
+    (repo_path / "untracked.py").write_text("old_name\n")
+    repo.index.add([f"pkg/mod{i}.py" for i in range(5)] + ["pkg/notes.txt", "pkg/crlf.py", "blob.py"])
+
+    result = await search_and_replace_in_files(str(repo_path), "old_name", "new_name", paths=["*.py"])
+    assert result.startswith(
+        "Successfully replaced 'old_name' with 'new_name' using literal search in 6 of 7 candidate files. Total changes: 11."
+    )
+    assert "pkg/mod3.py: 2" in result and "pkg/crlf.py: 1" in result
+    assert "--- a/pkg/mod0.py\n+++ b/pkg/mod0.py\n" in result
+    assert (repo_path / "pkg" / "mod4.py").read_text() == "import new_name\nnew_name.run(4)\n"
+    assert (repo_path / "pkg" / "crlf.py").read_bytes() == b"x = new_name\r\n"
+    # Files outside the pathspec, untracked or binary files are left alone
+    assert (repo_path / "pkg" / "notes.txt").read_text() == "old_name\n"
+    assert (repo_path / "untracked.py").read_text() == "old_name\n"
+    assert (repo_path / "blob.py").read_bytes() == b"old_name\0\xff"
+
+    # Regex search, with a capped diff
+    result = await search_and_replace_in_files(
+        str(repo_path), r"run\((\d)\)", r"run(\1, fast=True)", paths=["pkg"], max_diff_bytes=200
+    )
+    assert "using regex search in 5 of 7 candidate files. Total changes: 5." in result
+    assert "[... diff truncated after" in result and "more changed files not shown ...]" in result
+    assert (repo_path / "pkg" / "mod2.py").read_text() == "import new_name\nnew_name.run(2, fast=True)\n"
+
+    assert "No changes made. 'missing' not found in 7 candidate files using literal search." in (
+        await search_and_replace_in_files(str(repo_path), "missing", "x", paths=["pkg"], use_regex=False)
+    )
+    assert "Error: Invalid regex pattern '['" in await search_and_replace_in_files(str(repo_path), "[", "x", use_regex=True)
+
+    # A failed write leaves every file unchanged and no temporary files behind
+    import server
+    calls = []
+    def failing_write(files):
+        calls.append(len(files))
+        raise OSError("disk full")
+    monkeypatch.setattr(server, "_atomic_write_many", failing_write)
+    result = await search_and_replace_in_files(str(repo_path), "new_name", "other", paths=["pkg"])
+    assert "Failed to write the changed files: disk full. No files were changed." in result
+    assert calls == [6] and "new_name" in (repo_path / "pkg" / "mod0.py").read_text()
+
+@pytest.mark.asyncio
+async def test_atomic_write_many_cleans_up_on_error(tmp_path, monkeypatch):
+    from server import _atomic_write_many
+
+    first, second = tmp_path / "a.txt", tmp_path / "b.txt"
+    first.write_text("a")
+    first.chmod(0o640)
+    _atomic_write_many({first: b"A", second: b"B"})
+    assert first.read_text() == "A" and second.read_text() == "B"
+    assert first.stat().st_mode & 0o777 == 0o640
+
+    real_fdopen = os.fdopen
+    def failing_fdopen(fd, *args, **kwargs):
+        handle = real_fdopen(fd, *args, **kwargs)
+        if len(list(tmp_path.glob(".*.tmp"))) == 2:
+            handle.close()
+            raise OSError("no space left")
+        return handle
+    monkeypatch.setattr(os, "fdopen", failing_fdopen)
+    with pytest.raises(OSError):
+        _atomic_write_many({first: b"1", second: b"2"})
+    assert first.read_text() == "A" and second.read_text() == "B"
+    assert not list(tmp_path.glob(".*.tmp"))
+    monkeypatch.setattr(os, "fdopen", real_fdopen)
+
+    # A rename failing partway reports the replaced files and leaves no temporary files behind
+    from server import PartialWriteError, write_files_content
+    real_replace = os.replace
+    def failing_replace(src, dst):
+        if Path(dst).name == "b.txt":
+            raise OSError("read-only file system")
+        return real_replace(src, dst)
+    monkeypatch.setattr(os, "replace", failing_replace)
+    third = tmp_path / "c.txt"
+    with pytest.raises(PartialWriteError) as excinfo:
+        _atomic_write_many({first: b"1", second: b"2", third: b"3"})
+    assert excinfo.value.written == [first] and excinfo.value.failed == second
+    assert first.read_text() == "1" and second.read_text() == "B" and not third.exists()
+    assert not list(tmp_path.glob(".*.tmp"))
+
+    result = await write_files_content(str(tmp_path), [
+        {"file_path": "a.txt", "content": "x"}, {"file_path": "b.txt", "content": "y"},
+    ])
+    assert result.startswith("UNEXPECTED_ERROR: Failed to write b.txt: read-only file system. Only some files were changed: a.txt were written;")
+    assert "No files were changed" not in result and first.read_text() == "x"
+    assert not list(tmp_path.glob(".*.tmp"))
+
+@pytest.mark.asyncio
+@patch('server._run_validators', new_callable=AsyncMock)
+async def test_write_to_file_content_ranges_and_append(mock_run_validators, tmp_path):
+    from server import WriteMode, write_to_file_content
+
+    mock_run_validators.return_value = ""
+    target = tmp_path / "big.txt"
+    target.write_text("".join(f"line {i}\n" for i in range(1, 101)))
+    target.chmod(0o640)
+
+    result = await write_to_file_content(str(tmp_path), "big.txt", "LINE 50", WriteMode.REPLACE_LINES, start_line=50)
+    assert result.startswith("Successfully replaced lines 50-50 of big.txt.")
+    assert "@@ -50 +50 @@\n-line 50\n+LINE 50\n" in result
+    lines = target.read_text().splitlines()
+    assert len(lines) == 100 and lines[48:51] == ["line 49", "LINE 50", "line 51"]
+    assert target.stat().st_mode & 0o777 == 0o640
+
+    # Insertion before a line, replacement of several lines, and insertion at the end
+    await write_to_file_content(str(tmp_path), "big.txt", "inserted\n", WriteMode.REPLACE_LINES, start_line=2, end_line=1)
+    await write_to_file_content(str(tmp_path), "big.txt", "", WriteMode.REPLACE_LINES, start_line=90, end_line=101)
+    result = await write_to_file_content(str(tmp_path), "big.txt", "tail\n", WriteMode.REPLACE_LINES, start_line=90)
+    assert "Invalid range for mode 'replace_lines': line 90 is past the end of the file" in result
+    await write_to_file_content(str(tmp_path), "big.txt", "tail\n", WriteMode.REPLACE_LINES, start_line=90, end_line=89)
+    lines = target.read_text().splitlines()
+    assert lines[:3] == ["line 1", "inserted", "line 2"] and lines[-2:] == ["line 88", "tail"]
+
+    # Byte ranges are relative to the start of the file; the diff shows whole lines
+    data = target.read_bytes()
+    offset = data.index(b"line 10\n") + len(b"line ")
+    result = await write_to_file_content(str(tmp_path), "big.txt", "ten", WriteMode.REPLACE_BYTES, start_byte=offset, end_byte=offset + 2)
+    assert result.startswith(f"Successfully replaced bytes {offset}-{offset + 2} of big.txt.")
+    assert "@@ -11 +11 @@\n-line 10\n+line ten\n" in result
+    assert target.read_bytes() == data.replace(b"line 10\n", b"line ten\n", 1)
+    assert "Invalid range for mode 'replace_bytes'" in await write_to_file_content(
+        str(tmp_path), "big.txt", "x", WriteMode.REPLACE_BYTES, start_byte=10**6
+    )
+
+    # A range that already holds the content is not rewritten
+    mock_run_validators.reset_mock()
+    inode, mtime = target.stat().st_ino, target.stat().st_mtime_ns
+    result = await write_to_file_content(str(tmp_path), "big.txt", "ten", WriteMode.REPLACE_BYTES, start_byte=offset, end_byte=offset + 3)
+    assert result == f"No changes made: bytes {offset}-{offset + 3} of big.txt already have this content (the file was not rewritten)."
+    result = await write_to_file_content(str(tmp_path), "big.txt", "line 1\n", WriteMode.REPLACE_LINES, start_line=1)
+    assert result.startswith("No changes made: lines 1-1 of big.txt")
+    assert (target.stat().st_ino, target.stat().st_mtime_ns) == (inode, mtime)
+    mock_run_validators.assert_not_awaited()
+    assert "start_line is required" in await write_to_file_content(str(tmp_path), "big.txt", "x", WriteMode.REPLACE_LINES)
+    assert "Error: File not found" in await write_to_file_content(str(tmp_path), "none.txt", "x", WriteMode.REPLACE_LINES, start_line=1)
+    assert not list(tmp_path.glob(".*.tmp"))
+
+    # Chunked upload of a new file
+    for chunk in ("part one, ", "part two, ", "part three\n"):
+        result = await write_to_file_content(str(tmp_path), "upload/new.txt", chunk, WriteMode.APPEND)
+    assert result == "Appended 11 bytes to upload/new.txt (now 31 bytes)."
+    assert (tmp_path / "upload" / "new.txt").read_text() == "part one, part two, part three\n"
+
+@pytest.mark.asyncio
+@patch('server.execute_custom_command', new_callable=AsyncMock)
+async def test_write_files_content(mock_execute_custom_command, tmp_path, monkeypatch):
+    import server
+    from server import write_files_content
+
+    mock_execute_custom_command.return_value = "Command executed successfully with no output."
+    (tmp_path / "keep.md").write_text("same\n")
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "index.ts").write_text("export const a = 1;\n")
+
+    files = [
+        {"file_path": "keep.md", "content": "same\n"},
+        {"file_path": "src/index.ts", "content": "export const a = 2;\nexport const b = 3;\n"},
+        *({"file_path": f"src/components/c{i}.js", "content": f"export default {i};\n"} for i in range(10)),
+    ]
+    result = await write_files_content(str(tmp_path), files)
+    assert result.startswith("Successfully wrote 11 of 12 files.")
+    assert "keep.md: unchanged" in result
+    assert "src/index.ts: updated (+2 -1 lines)" in result
+    assert "src/components/c7.js: created (18 bytes)" in result
+    assert (tmp_path / "src" / "components" / "c9.js").read_text() == "export default 9;\n"
+    # One TSC run for every changed script
+    mock_execute_custom_command.assert_awaited_once()
+    command = mock_execute_custom_command.call_args[0][1]
+    assert command.lstrip().startswith("tsc --noEmit --allowJs src/index.ts src/components/c0.js")
+    assert "keep.md" not in command
+    assert not list(tmp_path.rglob(".*.tmp"))
+
+    assert "appears more than once" in await write_files_content(str(tmp_path), files[:1] * 2)
+    assert "No files were provided" in await write_files_content(str(tmp_path), [])
+
+    # A failure staging any file leaves every file unchanged
+    real_stage = server._stage_temp_file
+    def failing_stage(path, data):
+        if path.name == "c3.js":
+            raise OSError("disk full")
+        return real_stage(path, data)
+    monkeypatch.setattr(server, "_stage_temp_file", failing_stage)
+    result = await write_files_content(str(tmp_path), [
+        {"file_path": f"src/components/c{i}.js", "content": "changed\n"} for i in range(5)
+    ])
+    assert "UNEXPECTED_ERROR: Failed to write files: disk full. No files were changed." in result
+    assert (tmp_path / "src" / "components" / "c0.js").read_text() == "export default 0;\n"
+    assert not list(tmp_path.rglob(".*.tmp"))
+
+@pytest.mark.asyncio
+async def test_generate_diff_output_histogram_engine():
+    import difflib
+    import random
+    from server import _diff_opcodes, _generate_diff_output, _unified_diff
+
+    # Matches difflib's output for ordinary edits, with proper header lines
+    original = "".join(f"line {i}\n" for i in range(100))
+    new = original.replace("line 50\n", "changed\n").replace("line 10\n", "new\nline 10\n")
+    result = await _generate_diff_output(original, new, "test.txt")
+    expected = "".join(difflib.unified_diff(
+        original.splitlines(keepends=True), new.splitlines(keepends=True), "a/test.txt", "b/test.txt"
+    ))
+    assert result == "\nDiff:\n" + expected
+    assert "--- a/test.txt\n+++ b/test.txt\n@@ -8,6 +8,7 @@\n" in result
+    assert (await _generate_diff_output("a\nb", "a\nc", "eof.txt")).endswith("-b\n\\ No newline at end of file\n+c\n\\ No newline at end of file\n")
+
+    # The opcodes always rebuild the new text, including with a zero time budget
+    random.seed(7)
+    for _ in range(300):
+        a = [random.choice("abcde") + "\n" for _ in range(random.randint(0, 25))]
+        b = [random.choice("abcde") + "\n" for _ in range(random.randint(0, 25))]
+        for budget in (1.0, 0.0):
+            rebuilt = []
+            for tag, i1, i2, j1, j2 in _diff_opcodes(a, b, budget):
+                if tag == "equal":
+                    assert a[i1:i2] == b[j1:j2]
+                rebuilt.extend(b[j1:j2])
+            assert rebuilt == b
+
+    # Too large diffs are summarized without being rendered
+    large_original = "\n".join(f"line{i}" for i in range(1001))
+    large_new = "\n".join(f"modified_line{i}" for i in range(1001))
+    assert await _generate_diff_output(large_original, large_new, "big.txt") == (
+        "\nDiff was too large (over 1000 lines): 1 hunks, +1001 -1001 lines."
+    )
+    lines = [f"row {i}\n" for i in range(50000)]
+    changed = [line if i % 40 else "x\n" for i, line in enumerate(lines)]
+    diff, hunks, added, removed = _unified_diff(lines, changed, "rows.txt", max_lines=1000)
+    assert diff is None and hunks == added == removed == 1250
+
+@pytest.mark.asyncio
+@patch('server._run_validators', new_callable=AsyncMock)
+async def test_cpu_pool_offloads_large_inputs(mock_run_validators, tmp_path, monkeypatch):
+    import time as time_module
+    from server import (
+        CpuPool, WriteMode, _generate_diff_output, _search_and_replace_python_logic, multi_edit_file,
+        write_files_content, write_to_file_content,
+    )
+
+    mock_run_validators.return_value = ""
+    pool = CpuPool(max_workers=2, min_bytes=100, timeout=30)
+    monkeypatch.setattr("server.cpu_pool", pool)
+    try:
+        # Small inputs stay inline, large ones go to a worker with identical results
+        small = await _generate_diff_output("a\n", "b\n", "f.txt")
+        assert pool.stats()["inline"] == 1 and pool.stats()["offloaded"] == 0
+        original = "".join(f"line {i}\n" for i in range(200))
+        new = original.replace("line 7\n", "line seven\n")
+        large = await _generate_diff_output(original, new, "f.txt")
+        assert "-line 7\n+line seven\n" in large and "-a\n+b\n" in small
+        stats = pool.stats()
+        assert stats["offloaded"] == 1 and stats["pending"] == 0
+        assert stats["total_compute_seconds"] > 0 and stats["max_wait_seconds"] >= 0
+
+        target = tmp_path / "big.txt"
+        target.write_text(original)
+        result = await _search_and_replace_python_logic(str(tmp_path), r"line (\d)\b", r"LINE \1", "big.txt", False, None, None)
+        assert "using regex search. Total changes: 10." in result
+        assert "Error: Invalid regex pattern" in await _search_and_replace_python_logic(str(tmp_path), "(", "x", "big.txt", False, None, None)
+        result = await multi_edit_file(str(tmp_path), "big.txt", [
+            {"search_string": "LINE 1\n", "replace_string": "first\n"},
+            {"search_string": "[", "replace_string": "x", "use_regex": True},
+        ])
+        assert "Error: Edit #2 has an invalid regex pattern '['" in result
+        assert "LINE 1\n" in target.read_text()
+        assert pool.stats()["offloaded"] >= 5
+
+        # write_files' line counts and ranged writes' diffs are computed in the pool too
+        offloaded = pool.stats()["offloaded"]
+        result = await write_files_content(str(tmp_path), [{"file_path": "big.txt", "content": original}])
+        assert "big.txt: updated (+10 -10 lines)" in result
+        result = await write_to_file_content(
+            str(tmp_path), "big.txt", "".join(f"row {i}\n" for i in range(20)), WriteMode.REPLACE_LINES, start_line=1, end_line=20
+        )
+        assert "-line 19\n" in result and "+row 19\n" in result
+        assert pool.stats()["offloaded"] == offloaded + 2
+
+        # A task over its time limit raises and the pool is replaced
+        with pytest.raises(TimeoutError):
+            await pool.run(time_module.sleep, 5, timeout=0.5)
+        assert pool.stats()["timeouts"] == 1 and pool.stats()["restarts"] == 1
+        assert await pool.run(abs, -3) == 3
+    finally:
+        pool.shutdown()
+
+_FAKE_TSSERVER = r"""
+import json, os, sys
+def send(message):
+    data = json.dumps(message).encode()
+    sys.stdout.buffer.write(b"Content-Length: %d\r\n\r\n" % len(data) + data)
+    sys.stdout.buffer.flush()
+for line in sys.stdin:
+    request = json.loads(line)
+    if request["command"] == "exit":
+        break
+    if request["command"] in ("open", "close"):
+        continue
+    send({"type": "event", "event": "typingsInstallerPid", "body": {"pid": os.getpid()}})
+    body = []
+    text = open(request["arguments"]["file"]).read()
+    if request["command"] == "semanticDiagnosticsSync" and "ERROR" in text:
+        line_number = text[:text.index("ERROR")].count("\n") + 1
+        body = [{"start": {"line": line_number, "offset": 1}, "text": "Bad " + str(os.getpid()), "code": 2304, "category": "error"}]
+    send({"type": "response", "request_seq": request["seq"], "command": request["command"], "success": True, "body": body})
+"""
+
+@pytest.mark.asyncio
+async def test_tsserver_pool_reuses_process(tmp_path):
+    import sys
+    from server import TsServerPool, _run_validators
+    script = tmp_path / "fake_tsserver.py"
+    script.write_text(_FAKE_TSSERVER)
+    (tmp_path / "a.ts").write_text("const a = 1;\n")
+    pool = TsServerPool(idle_timeout=60, timeout=10)
+    try:
+        with patch('server.TSSERVER', f"{sys.executable} {script}"), patch('server.tsserver_pool', pool), \
+                patch('server.execute_custom_command') as mock_execute_custom_command:
+            assert await pool.check(str(tmp_path), ["a.ts"]) == "No errors reported by tsserver."
+            (tmp_path / "a.ts").write_text("const a = 1;\nERROR\n")
+            result = await _run_validators(str(tmp_path), ["a.ts", "notes.md"])
+            mock_execute_custom_command.assert_not_called()
+        assert "TSC Output for a.ts:" in result
+        assert "a.ts(2,1): error TS2304: Bad" in result
+        stats = pool.stats()
+        assert stats["starts"] == 1 and stats["fallbacks"] == 0
+        assert list(stats["servers"].values())[0]["checks"] == 2
+
+        pool.idle_timeout = 0
+        assert pool.close_idle() == 1
+        assert pool.stats()["servers"] == {}
+
+        # A server that dies is discarded and the caller falls back to tsc
+        with patch('server.TSSERVER', f"{sys.executable} -c pass"):
+            assert await pool.check(str(tmp_path), ["a.ts"]) is None
+        assert pool.stats()["fallbacks"] == 1 and pool.stats()["servers"] == {}
+    finally:
+        pool.clear()
+
+@pytest.mark.asyncio
+async def test_run_validators_registry_and_cache(tmp_path, monkeypatch):
+    from server import ResultCache, _run_validators, load_validators
+    cache = ResultCache(max_bytes=1024 * 1024, spill_dir=None)
+    monkeypatch.setattr("server.validation_cache", cache)
+    (tmp_path / "good.py").write_text("x = 1\n")
+    (tmp_path / "bad.py").write_text("def f(:\n")
+    (tmp_path / "data.json").write_text('{"a": }')
+    (tmp_path / "conf.yml").write_text("a: [1\n")
+    (tmp_path / "notes.txt").write_text("hi\n")
+
+    # Without a config file only tsc runs, with plain tsc when the project has no tsconfig.json
+    files = ["good.py", "bad.py", "data.json", "conf.yml", "notes.txt"]
+    assert [v.name for v in load_validators(str(tmp_path))] == ["tsc"]
+    assert await _run_validators(str(tmp_path), files) == ""
+    (tmp_path / "app.ts").write_text("const a = 1;\n")
+    with patch('server.TSSERVER', "off"), \
+         patch('server.execute_custom_command', new_callable=AsyncMock, return_value="ok") as mock_tsc:
+        result = await _run_validators(str(tmp_path), files + ["app.ts"])
+    mock_tsc.assert_awaited_once_with(str(tmp_path), " tsc --noEmit --allowJs app.ts")
+    assert result == "\n\nTSC Output for app.ts:\nok"
+
+    (tmp_path / ".mcp-devtools.yml").write_text("validators: [python, json, yaml]\n")
+    result = await _run_validators(str(tmp_path), files)
+    assert "PYTHON Output for good.py:\nNo problems found." in result
+    assert "PYTHON Output for bad.py:\nbad.py(1,7): error SyntaxError:" in result
+    assert "JSON Output for data.json:\ndata.json(1,7): error: Expecting value" in result
+    assert "YAML Output for conf.yml:\nconf.yml(" in result
+    assert "notes.txt" not in result
+    assert await _run_validators(str(tmp_path), ["notes.txt"]) == ""
+
+    (tmp_path / ".mcp-devtools.yml").write_text(
+        "validators:\n"
+        "  - python\n"
+        "  - name: lines\n"
+        "    extensions: [py, .txt]\n"
+        "    command: wc -l {files}\n"
+        "  - name: broken\n"
+    )
+    assert [v.name for v in load_validators(str(tmp_path))] == ["python", "lines"]
+    with patch('server.execute_custom_command', new_callable=AsyncMock) as mock_execute_custom_command:
+        mock_execute_custom_command.return_value = "STDOUT:\n3 total"
+        result = await _run_validators(str(tmp_path), files)
+        # One batched run for the command validator, with every matching file
+        mock_execute_custom_command.assert_awaited_once_with(str(tmp_path), "wc -l good.py bad.py notes.txt")
+        assert "LINES Output for good.py, bad.py, notes.txt:\nSTDOUT:\n3 total" in result
+        assert "JSON Output" not in result and "YAML Output" not in result
+
+        # Unchanged files are served from the cache by the in-process built-ins; commands
+        # can depend on other files, so they always run
+        misses = cache.stats()["misses"]
+        assert await _run_validators(str(tmp_path), files) == result
+        assert cache.stats()["misses"] == misses
+        assert mock_execute_custom_command.await_count == 2
+
+        (tmp_path / "bad.py").write_text("def f():\n    pass\n")
+        result = await _run_validators(str(tmp_path), files)
+        assert "PYTHON Output for bad.py:\nNo problems found." in result
+        assert mock_execute_custom_command.await_count == 3
+        assert cache.stats()["misses"] == misses + 1
+
+@pytest.mark.asyncio
+async def test_deferred_validation_coalesces_edits(temp_git_repo, monkeypatch):
+    import asyncio
+    from server import ValidationScheduler, call_tool
+    repo, repo_path = temp_git_repo
+    scheduler = ValidationScheduler(debounce=0.1, max_delay=5)
+    monkeypatch.setattr("server.validation_scheduler", scheduler)
+    monkeypatch.setattr("server.VALIDATION_MODE", "deferred")
+    checked = []
+
+    async def fake_run_validators(repo_path, file_paths):
+        checked.append(list(file_paths))
+        return "".join(f"\n\nPYTHON Output for {path}:\nNo problems found." for path in file_paths)
+    monkeypatch.setattr("server._run_validators", fake_run_validators)
+
+    async def write(path, content):
+        result = await call_tool("write_to_file", {"repo_path": str(repo_path), "file_path": path, "content": content})
+        return result[0].text
+
+    # A burst of edits returns immediately and is validated once
+    for i in range(3):
+        result = await write("a.py", f"x = {i}\n")
+        assert "Validation of a.py is deferred; call get_validation_results" in result
+    result = await write("b.py", "y = 1\n")
+    assert checked == []
+    result = (await call_tool("get_validation_results", {"repo_path": str(repo_path)}))[0].text
+    assert checked == [["a.py", "b.py"]]
+    assert result.startswith("Validation results for a.py, b.py (checked ")
+    assert "PYTHON Output for a.py:" in result and "PYTHON Output for b.py:" in result
+    assert scheduler.stats()["scheduled"] == 4 and scheduler.stats()["runs"] == 1
+
+    # Results of a finished run are attached to the next edit's response, once
+    await write("c.py", "z = 1\n")
+    await asyncio.sleep(0.3)
+    result = await write("c.py", "z = 2\n")
+    assert checked[-1] == ["c.py"]
+    assert "Earlier edits: Validation results for c.py" in result
+    result = await scheduler.results(str(repo_path), wait=False)
+    assert result == "Validation is still pending for: c.py."
+    assert (await scheduler.results(str(repo_path))).startswith("Validation results for c.py")
+    assert checked == [["a.py", "b.py"], ["c.py"], ["c.py"]]
+    scheduler.clear()
+
+@pytest.mark.asyncio
+async def test_deferred_validation_edit_during_run(monkeypatch):
+    import asyncio
+    from server import ValidationScheduler
+    scheduler = ValidationScheduler(debounce=0.01, max_delay=5)
+    calls = []
+    started = asyncio.Queue()
+    release = asyncio.Queue()
+
+    async def fake_run_validators(repo_path, file_paths):
+        calls.append(list(file_paths))
+        await started.put(None)
+        await release.get()
+        return f"\n{len(calls)} ok"
+
+    monkeypatch.setattr("server._run_validators", fake_run_validators)
+    try:
+        scheduler.schedule("/repo", ["a.py"])
+        await started.get()
+        await release.put(None)
+        while scheduler.stats()["pending_repos"]:
+            await asyncio.sleep(0.01)
+
+        scheduler.schedule("/repo", ["b.py"])
+        await started.get()
+        # While b.py is validated, the earlier results are taken and c.py is edited
+        assert "Validation results for a.py" in scheduler.take_unreported("/repo")
+        scheduler.schedule("/repo", ["c.py"])
+        await asyncio.sleep(0.05)
+        await release.put(None)
+
+        # The rerun covers the files not yet reported; taking the results meanwhile leaves nothing to rerun
+        await started.get()
+        assert "Validation results for a.py, b.py" in scheduler.take_unreported("/repo")
+        await release.put(None)
+        result = await scheduler.results("/repo", wait=True, timeout=5)
+        assert calls == [["a.py"], ["a.py", "b.py"], ["b.py", "c.py"]]
+        assert result.startswith("Validation results for b.py, c.py") and "3 ok" in result
+        assert "pending" not in result and started.empty()
+    finally:
+        scheduler.clear()
+
+@pytest.mark.asyncio
+async def test_execute_custom_command_streams_progress(tmp_path, monkeypatch):
+    import sys
+    from server import _OutputCapture, _ProgressReporter, execute_custom_command
+    monkeypatch.setattr("server.PROGRESS_INTERVAL", 0.05)
+    monkeypatch.setattr("server.COMMAND_OUTPUT_MAX_BYTES", 2000)
+    notifications = []
+
+    class FakeSession:
+        async def send_progress_notification(self, **kwargs):
+            notifications.append(kwargs)
+
+    script = tmp_path / "build.py"
+    script.write_text(
+        "import sys, time\n"
+        "for i in range(4):\n"
+        "    print(f'line {i}', flush=True)\n"
+        "    time.sleep(0.15)\n"
+        "print('warn', file=sys.stderr, flush=True)\n"
+        "time.sleep(0.15)\n"
+        "for i in range(500):\n"
+        "    print(f'x {i:03d} ' + 'x' * 20)\n"
+        "sys.stdout.write('no newline')\n"
+        "sys.exit(3)\n"
+    )
+    result = await execute_custom_command(str(tmp_path), f"{sys.executable} build.py", FakeSession(), "token-1", 7)
+
+    # Output arrives in several rate-limited notifications while the command runs
+    assert len(notifications) >= 3
+    assert all(n["progress_token"] == "token-1" and n["related_request_id"] == 7 for n in notifications)
+    progress = [n["progress"] for n in notifications]
+    assert progress == sorted(progress) and progress[-1] == 506
+    assert notifications[0]["message"].startswith("line 0")
+    streamed = "\n".join(n["message"] for n in notifications)
+    assert "STDERR: warn" in streamed and streamed.endswith("no newline")
+
+    # The result keeps the beginning and end of long output
+    assert result.startswith("STDOUT:\nline 0\nline 1\n")
+    assert "lines (" in result and "bytes) omitted] ..." in result
+    assert "x 499 " in result and "no newline\nSTDERR:\nwarn\nCommand failed with exit code 3" in result
+    assert "x 100 " not in result
+
+    # Batches over the size limit skip their oldest lines
+    reporter = _ProgressReporter(FakeSession(), "t", interval=1, max_bytes=10)
+    for line in ("aaaa\n", "bbbb\n", "cccc\n"):
+        reporter.add(line)
+    await reporter.flush()
+    assert notifications[-1]["message"] == "[1 lines skipped]\nbbbb\ncccc" and notifications[-1]["progress"] == 3
+
+    # Limits count UTF-8 bytes, not characters
+    capture = _OutputCapture(max_bytes=12)
+    capture.add("\u00e9\u00e9\u00e9\n")
+    capture.add("a\n")
+    assert capture.head == [] and capture.text() == "... [1 lines (7 bytes) omitted] ...\na"
+
+@pytest.mark.asyncio
+async def test_cpu_pool_timeout_spares_other_tasks():
+    import asyncio
+    import time as time_module
+    from server import CpuPool
+    pool = CpuPool(max_workers=1, min_bytes=0, timeout=1)
+    try:
+        assert await pool.run(abs, -1) == 1
+        # Both tasks queue behind one worker; the second's limit starts only when it is picked up
+        began = time_module.monotonic()
+        first, second = await asyncio.gather(
+            pool.run(time_module.sleep, 0.7), pool.run(time_module.sleep, 0.7), return_exceptions=True
+        )
+        assert first is None and second is None
+        assert pool.stats()["timeouts"] == 0 and time_module.monotonic() - began >= 1.4
+
+        # A task over its limit has its worker killed; a task queued behind it still completes
+        began = time_module.monotonic()
+        stuck, queued = await asyncio.gather(
+            pool.run(time_module.sleep, 30, timeout=0.5), pool.run(pow, 2, 10), return_exceptions=True
+        )
+        assert isinstance(stuck, TimeoutError) and queued == 1024
+        assert time_module.monotonic() - began < 10
+        stats = pool.stats()
+        assert stats["timeouts"] == 1 and stats["restarts"] == 1 and stats["errors"] == 0
+        assert stats["resubmitted"] == 1 and stats["pending"] == 0
+    finally:
+        pool.shutdown()
+
+@pytest.mark.asyncio
+@patch('server._run_validators', new_callable=AsyncMock)
+async def test_writes_follow_symlinks_and_keep_hard_links(mock_run_validators, tmp_path):
+    from server import WriteMode, search_and_replace_in_file, write_files_content, write_to_file_content
+    mock_run_validators.return_value = ""
+    real = tmp_path / "shared" / "config.txt"
+    real.parent.mkdir()
+    real.write_text("alpha\nbeta\n")
+    (tmp_path / "link.txt").symlink_to(real)
+    link = tmp_path / "link.txt"
+
+    result = await write_to_file_content(str(tmp_path), "link.txt", "gamma\nbeta\n")
+    assert "-alpha\n+gamma\n" in result
+    assert link.is_symlink() and real.read_text() == "gamma\nbeta\n"
+    await search_and_replace_in_file(str(tmp_path), "beta", "delta", "link.txt", False, None, None)
+    await write_to_file_content(str(tmp_path), "link.txt", "omega\n", mode=WriteMode.REPLACE_LINES, start_line=1)
+    await write_files_content(str(tmp_path), [{"file_path": "link.txt", "content": "zeta\n"}])
+    assert link.is_symlink() and real.read_text() == "zeta\n"
+    assert not list(tmp_path.glob(".*.tmp")) and not list(real.parent.glob(".*.tmp"))
+
+    # A hard-linked file is updated in place, so every name sees the new content
+    hard = tmp_path / "hard.txt"
+    os.link(real, hard)
+    await write_to_file_content(str(tmp_path), "hard.txt", "eta\n")
+    assert real.read_text() == "eta\n" and os.stat(real).st_ino == os.stat(hard).st_ino
+
+@pytest.mark.asyncio
+async def test_git_apply_diff_fuzzy_keeps_bytes(monkeypatch, temp_git_repo):
+    from server import git_apply_diff
+
+    monkeypatch.setattr("server._run_validators", AsyncMock(return_value=""))
+    repo, repo_path = temp_git_repo
+    # Drifted by two lines with tab/space differences, so git apply rejects it
+    diff_content = (
+        "--- a/data.txt\n+++ b/data.txt\n@@ -1,3 +1,3 @@\n"
+        " \tfirst\n-\tsecond\n+\tSECOND\n \tthird\n"
+    )
+
+    # A file that is not valid UTF-8 is refused instead of having its bytes replaced
+    latin = repo_path / "data.txt"
+    original = b"caf\xe9\ncaf\xe9\n    first\n    second\n    third\n"
+    latin.write_bytes(original)
+    result = await git_apply_diff(repo, diff_content)
+    assert "data.txt: the file is not valid UTF-8 (byte 3), so it can only be patched by git apply" in result
+    assert latin.read_bytes() == original
+
+    # Line endings and multi-byte characters survive a fuzzy apply, which writes atomically
+    latin.write_bytes("é\r\nü\r\n    first\r\n    second\r\n    third\r\n".encode("utf-8"))
+    result = await git_apply_diff(repo, diff_content)
+    assert "with the fuzzy hunk applier" in result
+    assert latin.read_bytes() == "é\r\nü\r\n    first\r\n\tSECOND\n    third\r\n".encode("utf-8")
+    assert not list(repo_path.glob(".*.tmp"))
+
+@pytest.mark.asyncio
+async def test_state_cache_sees_external_edits_without_watcher(temp_git_repo, monkeypatch):
+    import server
+    from server import StateCache, call_tool
+
+    repo, repo_path = temp_git_repo
+    cache = StateCache(ttl=60)
+    monkeypatch.setattr(server, "state_cache", cache)
+    tracked = repo_path / "initial_file.txt"
+    original = tracked.read_text()
+
+    async def status():
+        result = await call_tool("git_status", {"repo_path": str(repo_path)})
+        return result[0].text
+
+    # An external edit to a file the cached status lists is seen within the TTL
+    tracked.write_text("edited outside the server\n")
+    assert "modified:   initial_file.txt" in await status()
+    assert "modified:   initial_file.txt" in await status()
+    assert cache.stats()["hits"] == 1
+    tracked.write_text(original)
+    assert "initial_file.txt" not in await status()
+
+    # So is a new untracked file in the top directory
+    await status()
+    (repo_path / "untracked.txt").write_text("new\n")
+    assert "untracked.txt" in await status()
+    assert cache.stats()["hits"] == 2